@@ -1,54 +1,223 @@
 import os
-import google.generativeai as genai
+import time
+from llm_backends import get_backend, estimate_tokens
+from answer_cache import get_answer_cache
+from telemetry import get_metrics, get_tracer
+from model_router import classify_question, route_model
 
-# Initialize Google AI client
-api_key = os.getenv("GOOGLE_API_KEY", "")
-genai.configure(api_key=api_key)
+# Upper bound for everything sent with a question: instructions, lesson
+# context, conversation summary, previous turns and the question itself
+PROMPT_TOKEN_CEILING = int(os.getenv("TUTOR_PROMPT_TOKEN_CEILING", "3000"))
 
-def get_ai_response(question, lesson_context, chat_history):
+# Seconds a tutor answer may take before the student gets an error instead
+TUTOR_DEADLINE_SECONDS = float(os.getenv("TUTOR_DEADLINE_SECONDS", "45"))
+
+# Send a second request when the first is slower than usual to start (see hedging.py)
+HEDGE_REQUESTS = os.getenv("TUTOR_HEDGE_REQUESTS", "0") != "0"
+
+# Instructions in front of the lesson titles (see build_lesson_context)
+SYSTEM_PROMPT = """You are an AI tutor specializing in teaching about the current topic.
+You are helping the student with a specific lesson.
+Respond to the student's question in a helpful, educational manner.
+Provide clear explanations with examples when appropriate.
+Keep responses concise but thorough.
+If you don't know the answer, say so instead of making up information.
+
+Here's the context of the current lesson:
+
+"""
+
+def build_lesson_context(module, lesson):
+    """
+    Build the lesson context used as the stable part of tutor prompts
+
+    The lesson text itself is not part of it; the passages relevant to each
+    question are retrieved and sent with the question (see _tutor_request).
+
+    Args:
+        module: Module dictionary of the current lesson
+        lesson: Lesson dictionary
+
+    Returns:
+        The module and lesson titles
+    """
+    return f"Module: {module['title']}\nLesson: {lesson['title']}"
+
+def _tutor_request(question, lesson_context, chat_history, summary="", related_context=""):
+    """
+    Build the system instruction, history and prompt for a tutor question
+
+    The instructions and lesson context form the system instruction, which
+    stays the same for every question about the lesson. Everything that
+    changes per question (summary of earlier turns, passages of the lesson
+    and its neighbours relevant to the question, the question) goes into
+    the prompt, and previous turns
+    are passed as history, so each question is a single generation request.
+    The summary, passages and newest turns are added while they fit
+    under PROMPT_TOKEN_CEILING.
+
+    Args:
+        question: User's question
+        lesson_context: Titles of the current module and lesson (see build_lesson_context)
+        chat_history: Previous conversation history
+        summary: Summary of the turns no longer in chat_history
+        related_context: Passages of the current and nearby lessons relevant to the question
+
+    Returns:
+        Tuple of the system instruction, the history messages and the prompt
+    """
+    system_prompt = SYSTEM_PROMPT + lesson_context
+    budget = PROMPT_TOKEN_CEILING - estimate_tokens(system_prompt) - estimate_tokens(question)
+    
+    # Add the summary of earlier turns and the related passages if they fit
+    sections = []
+    for heading, text in (("Summary of the earlier conversation with the student", summary),
+                          ("Relevant material from this and nearby lessons", related_context)):
+        section = f"{heading}:\n{text}"
+        if text and estimate_tokens(section) <= budget:
+            sections.append(section)
+            budget -= estimate_tokens(section)
+    prompt = "\n\n".join(sections + [f"Question: {question}"]) if sections else question
+    
+    # Keep both sides of the most recent turns that fit
+    history = []
+    for msg in reversed(chat_history):
+        tokens = estimate_tokens(msg["content"])
+        if tokens > budget:
+            break
+        history.insert(0, {"role": msg["role"], "content": msg["content"]})
+        budget -= tokens
+    
+    # The conversation has to start with a user turn
+    while history and history[0]["role"] != "user":
+        history.pop(0)
+
+    return system_prompt, history, prompt
+
+def tutor_deadline():
+    """
+    Deadline for a tutor answer asked now, as a time.monotonic() value
+    """
+    return time.monotonic() + TUTOR_DEADLINE_SECONDS
+
+def _cached_answer(lesson_key, question):
+    """
+    Look up a standalone question in the answer cache, counting hits and misses
+    """
+    answer = get_answer_cache().get(lesson_key, question)
+    get_metrics().inc("cache_lookups_total", cache="answer", result="miss" if answer is None else "hit")
+    return answer
+
+def get_ai_response(question, lesson_context, chat_history, summary="", lesson_key=None, related_context="",
+                    deadline=None):
     """
     Generate AI tutor response based on user question and lesson context
     
     Args:
         question: User's question
-        lesson_context: The current lesson content for context
+        lesson_context: Titles of the current module and lesson (see build_lesson_context)
         chat_history: Previous conversation history
+        summary: Summary of the turns no longer in chat_history
+        lesson_key: Lesson identity from answer_cache.lesson_cache_key; standalone
+            questions (no earlier turns) are answered from the answer cache
+        related_context: Passages of the current and nearby lessons relevant to the question
+        deadline: time.monotonic() value by which the answer is needed
+            (defaults to TUTOR_DEADLINE_SECONDS from now)
     
     Returns:
         AI-generated response
     """
-    try:
-        # Setup the model
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Create system message
-        system_prompt = f"""You are an AI tutor specializing in teaching about the current topic.
-        You are helping the student with a specific lesson. Here's the context of the current lesson:
+    deadline = deadline or tutor_deadline()
+    cacheable = lesson_key is not None and not chat_history and not summary
+    task = classify_question(question)
+    with get_tracer().span("tutor.answer", standalone=cacheable, route=task) as span:
+        if cacheable:
+            cached = _cached_answer(lesson_key, question)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
         
-        {lesson_context}
-        
-        Respond to the student's question in a helpful, educational manner.
-        Provide clear explanations with examples when appropriate.
-        Keep responses concise but thorough.
-        If you don't know the answer, say so instead of making up information.
-        """
-        
-        # Format conversation history for Google AI
-        chat = model.start_chat(history=[])
-        
-        # Add system prompt first
-        chat.send_message(system_prompt)
-        
-        # Add chat history (last 5 messages max to avoid token limits)
-        for msg in chat_history[-5:]:
-            role = "user" if msg["role"] == "user" else "model"
-            if role == "user":
-                chat.send_message(msg["content"])
+        try:
+            system_prompt, history, prompt = _tutor_request(question, lesson_context, chat_history, summary, related_context)
             
-        # Send the current question
-        response = chat.send_message(question)
+            # Send the current question to the model routed for it
+            backend = get_backend()
+            response = backend.generate(prompt, system_instruction=system_prompt, history=history,
+                                        model=route_model(task, backend), deadline=deadline, hedge=HEDGE_REQUESTS,
+                                        route=task)
+            
+            if cacheable:
+                get_answer_cache().put(lesson_key, question, response.text)
+            return response.text
         
-        return response.text
-    
-    except Exception as e:
-        return f"I'm sorry, I encountered an error while generating a response. Please try again. Error details: {str(e)}"
+        except Exception as e:
+            # The student gets an apology; the span keeps the error class
+            span.set(error=type(e).__name__)
+            return f"I'm sorry, I encountered an error while generating a response. Please try again. Error details: {str(e)}"
+
+def stream_ai_response(question, lesson_context, chat_history, timings=None, summary="", lesson_key=None,
+                       related_context="", deadline=None):
+    """
+    Stream the AI tutor response as it is generated
+
+    Args:
+        question: User's question
+        lesson_context: Titles of the current module and lesson (see build_lesson_context)
+        chat_history: Previous conversation history
+        timings: Optional dictionary that receives "time_to_first_token" and
+            "total_time" (in seconds) once the stream is exhausted
+        summary: Summary of the turns no longer in chat_history
+        lesson_key: Lesson identity from answer_cache.lesson_cache_key; standalone
+            questions (no earlier turns) are answered from the answer cache
+        related_context: Passages of the current and nearby lessons relevant to the question
+        deadline: time.monotonic() value by which the answer is needed
+            (defaults to TUTOR_DEADLINE_SECONDS from now)
+
+    Yields:
+        Pieces of the AI-generated response
+    """
+    deadline = deadline or tutor_deadline()
+    start = time.perf_counter()
+    first_token = None
+    cacheable = lesson_key is not None and not chat_history and not summary
+
+    task = classify_question(question)
+    with get_tracer().span("tutor.stream", standalone=cacheable, route=task) as span:
+        try:
+            cached = _cached_answer(lesson_key, question) if cacheable else None
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                first_token = time.perf_counter() - start
+                yield cached
+                return
+
+            system_prompt, history, prompt = _tutor_request(question, lesson_context, chat_history, summary, related_context)
+
+            # Send the current question to the model routed for it and relay the answer as it arrives
+            backend = get_backend()
+            chunks = []
+            for chunk in backend.stream(prompt, system_instruction=system_prompt, history=history,
+                                        model=route_model(task, backend), deadline=deadline, hedge=HEDGE_REQUESTS,
+                                        route=task):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                chunks.append(chunk)
+                yield chunk
+
+            if cacheable:
+                get_answer_cache().put(lesson_key, question, "".join(chunks))
+
+        except Exception as e:
+            # The student gets an apology; the span keeps the error class
+            span.set(error=type(e).__name__)
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            yield f"I'm sorry, I encountered an error while generating a response. Please try again. Error details: {str(e)}"
+
+        finally:
+            if first_token is not None:
+                span.set(time_to_first_token=first_token)
+                get_metrics().observe("tutor_time_to_first_token_seconds", first_token)
+            if timings is not None:
+                timings["time_to_first_token"] = first_token
+                timings["total_time"] = time.perf_counter() - start
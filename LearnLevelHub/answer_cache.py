@@ -0,0 +1,195 @@
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from course_cache import normalize_text
+from retrieval import tokenize
+
+# Size and lifetime of the tutor answer cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Minimum cosine similarity for a differently worded question to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85"))
+
+# Length of the character n-grams compared
+NGRAM_SIZE = 3
+
+# Question words change what is asked, so they are compared too
+QUESTION_WORDS = {"how", "why", "what", "when", "where", "which", "who"}
+
+def lesson_cache_key(course, module_index, lesson_index):
+    """
+    Identify a lesson by its course, titles and content
+
+    Learners on the same cached course get the same key for the same lesson.
+
+    Args:
+        course: Course dictionary
+        module_index: Zero-based index of the module
+        lesson_index: Zero-based index of the lesson within the module
+
+    Returns:
+        Hex digest identifying the lesson
+    """
+    module = course["modules"][module_index]
+    lesson = module["lessons"][lesson_index]
+    parts = [course["title"], module["title"], lesson["title"], lesson.get("content") or ""]
+    return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+def _terms(question):
+    # The question's terms in their original order, without filler words and plurals
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", question.lower()):
+        terms += [word] if word in QUESTION_WORDS else tokenize(word)
+    return terms
+
+def _ngrams(terms):
+    text = " " + " ".join(terms) + " "
+    return Counter(text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1))
+
+def _same_order(a, b):
+    # "Is Python faster than Java?" and "Is Java faster than Python?" share every
+    # term, so a similar question also has to use the shared terms in the same order
+    shared = set(a) & set(b)
+    return [term for term in a if term in shared] == [term for term in b if term in shared]
+
+class AnswerCache:
+    """
+    Process-wide cache of tutor answers to standalone questions about a lesson
+
+    Questions are looked up by exact normalized text first, then by cosine
+    similarity of character n-gram TF-IDF vectors against the other cached
+    questions on the same lesson. The n-grams follow the order of the
+    question's terms, and a similar question only matches if the terms both
+    questions share come in the same order. Entries expire after ttl seconds and the
+    least recently used ones are evicted beyond max_entries.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL_SECONDS, threshold=ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lessons = {}
+        self._document_frequency = Counter()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, lesson_key, question):
+        """
+        Look up the answer to a question about a lesson
+
+        Args:
+            lesson_key: Key returned by lesson_cache_key
+            question: The learner's question
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        question = normalize_text(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((lesson_key, question))
+            if entry is not None and now - entry["created"] <= self.ttl:
+                self._entries.move_to_end((lesson_key, question))
+                self._counters["exact_hits"] += 1
+                return entry["answer"]
+
+            best_key, best_score = None, 0.0
+            terms = _terms(question)
+            query = self._vector(_ngrams(terms))
+            for key in list(self._lessons.get(lesson_key, ())):
+                if now - self._entries[key]["created"] > self.ttl:
+                    self._remove(key)
+                    continue
+                if not _same_order(terms, self._entries[key]["terms"]):
+                    continue
+                score = self._similarity(query, self._vector(self._entries[key]["ngrams"]))
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None or best_score < self.threshold:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._counters["similar_hits"] += 1
+            return self._entries[best_key]["answer"]
+
+    def put(self, lesson_key, question, answer):
+        """
+        Store the answer to a question about a lesson
+
+        Args:
+            lesson_key: Key returned by lesson_cache_key
+            question: The learner's question
+            answer: The tutor's answer
+        """
+        key = (lesson_key, normalize_text(question))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            terms = _terms(key[1])
+            ngrams = _ngrams(terms)
+            self._entries[key] = {"answer": answer, "terms": terms, "ngrams": ngrams, "created": time.time()}
+            self._lessons.setdefault(lesson_key, set()).add(key)
+            self._document_frequency.update(ngrams.keys())
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for gram in entry["ngrams"]:
+            self._document_frequency[gram] -= 1
+            if not self._document_frequency[gram]:
+                del self._document_frequency[gram]
+        questions = self._lessons[key[0]]
+        questions.discard(key)
+        if not questions:
+            del self._lessons[key[0]]
+
+    def _vector(self, ngrams):
+        count = len(self._entries)
+        vector = {
+            gram: frequency * (math.log((1 + count) / (1 + self._document_frequency[gram])) + 1)
+            for gram, frequency in ngrams.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {gram: weight / norm for gram, weight in vector.items()}
+
+    def _similarity(self, a, b):
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+    def stats(self):
+        """
+        Report cache usage in this process
+
+        Returns:
+            Dictionary with exact_hits, similar_hits, misses, evictions, hit_rate and entries
+        """
+        with self._lock:
+            hits = self._counters["exact_hits"] + self._counters["similar_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                "exact_hits": self._counters["exact_hits"],
+                "similar_hits": self._counters["similar_hits"],
+                "misses": self._counters["misses"],
+                "evictions": self._counters["evictions"],
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries)
+            }
+
+_answer_cache = AnswerCache()
+
+def get_answer_cache():
+    """
+    Return the process-wide answer cache
+    """
+    return _answer_cache
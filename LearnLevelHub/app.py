@@ -1,8 +1,35 @@
 import streamlit as st
 import os
-from course_generator import generate_course_content
-from ai_tutor import get_ai_response
-from utils import initialize_session_state, format_lesson_content
+import time
+import threading
+from course_generator import generate_course_content, generate_lazy_course, ensure_lesson_content, CourseStream
+from course_generator import regenerate_lesson, regenerate_module
+from course_generator import SYSTEM_PROMPT as COURSE_SYSTEM_PROMPT
+from llm_backends import get_backend
+from model_router import route_model
+from ai_tutor import stream_ai_response, build_lesson_context, tutor_deadline
+from answer_cache import lesson_cache_key
+from retrieval import CourseIndex
+from course_model import compact_course, compact_module
+from chat_memory import ChatMemory
+from session_store import get_session_store
+from telemetry import start_metrics_server
+from utils import initialize_session_state, format_lesson_content, timed_section
+from utils import restore_session, remember_course, remember_position, load_stored_lesson, remember_lesson, fold_chat
+
+# Course generation mode: "eager" writes every lesson up front,
+# "lazy" writes each lesson the first time it is opened,
+# "stream" shows the course as soon as its first module has arrived
+COURSE_GENERATION_MODE = os.getenv("COURSE_GENERATION_MODE", "eager")
+
+# Fragments rerun only the part of the page that changed;
+# APP_FRAGMENTS=0 reruns the whole page on every interaction instead
+USE_FRAGMENTS = os.getenv("APP_FRAGMENTS", "1") != "0"
+
+def fragment(func=None, run_every=None):
+    if func is None:
+        return lambda f: fragment(f, run_every)
+    return st.fragment(func, run_every=run_every) if USE_FRAGMENTS else func
 
 # Set page configuration
 st.set_page_config(
@@ -16,11 +43,36 @@ st.set_page_config(
 with open("styles.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# Initialize session state
+# Build model clients and open provider connections once per server process,
+# in the background so the first page is not held up
+@st.cache_resource
+def warm_up_backend():
+    backend = get_backend()
+    models = sorted({route_model(task, backend) for task in ("outline", "lesson")})
+    thread = threading.Thread(target=backend.warm_up, args=([COURSE_SYSTEM_PROMPT], models), daemon=True)
+    thread.start()
+    return thread
+
+warm_up_backend()
+
+# Export metrics for Prometheus from a local endpoint, once per server process
+@st.cache_resource
+def start_telemetry():
+    return start_metrics_server()
+
+start_telemetry()
+
+# Initialize session state and pick up a returning learner's progress
 initialize_session_state()
+restore_session()
 
 # Main application layout
 def main():
+    with timed_section("page"):
+        render_page()
+    remember_position()
+
+def render_page():
     # Home page - Course Generation UI
     if st.session_state.current_page == "home":
         col1, col2, col3 = st.columns([1, 10, 1])
@@ -57,9 +109,18 @@ def main():
                 generate_btn = st.button("Generate Course", type="primary", use_container_width=True)
                 if generate_btn and topic:
                     with st.spinner("Generating your personalized course..."):
-                        # Generate course content using OpenAI
-                        course_data = generate_course_content(topic, st.session_state.difficulty, additional_info)
+                        # Generate course content using the configured language model
+                        if COURSE_GENERATION_MODE == "lazy":
+                            course_data = generate_lazy_course(topic, st.session_state.difficulty, additional_info)
+                        elif COURSE_GENERATION_MODE == "stream":
+                            stream = CourseStream(topic, st.session_state.difficulty, additional_info)
+                            stream.wait_for_first_module()
+                            course_data = stream.course
+                        else:
+                            course_data = generate_course_content(topic, st.session_state.difficulty, additional_info)
                         st.session_state.course_data = course_data
+                        st.session_state.course_index = CourseIndex(course_data)
+                        st.session_state.course_id = None
                         st.session_state.current_page = "course"
                         st.rerun()
 
@@ -73,6 +134,13 @@ def main():
         # Display course header
         course_data = st.session_state.course_data
         
+        # Once the course is complete, keep it in compact form (lesson bodies are
+        # shared with other sessions) and store it so the session survives restarts
+        if st.session_state.course_id is None and not course_data.get('streaming'):
+            course_data = compact_course(course_data)
+            st.session_state.course_data = course_data
+            remember_course(course_data)
+        
         # Add a back button at the top
         st.button("← Back to AI Tutor", on_click=lambda: set_page("home"))
         
@@ -81,6 +149,8 @@ def main():
         with col1:
             st.markdown(f"<h1 class='course-title'>{course_data['title']}</h1>", unsafe_allow_html=True)
             st.markdown(f"<p>{len(course_data['modules'])} modules • {sum(len(module['lessons']) for module in course_data['modules'])} lessons</p>", unsafe_allow_html=True)
+            if course_data.get('streaming'):
+                st.caption("Writing the remaining modules...")
         with col2:
             progress_percent = int(st.session_state.completed_lessons / st.session_state.total_lessons * 100) if st.session_state.total_lessons > 0 else 0
             st.markdown(f"<div class='progress-container'>{progress_percent}% Completed</div>", unsafe_allow_html=True)
@@ -91,29 +161,7 @@ def main():
         
         # Sidebar with course outline
         with col1:
-            st.button("Outline", key="outline_btn")
-            st.button("Map", key="map_btn")
-            
-            # Display modules and lessons for navigation
-            for i, module in enumerate(course_data['modules'], 1):
-                module_id = f"module_{i}"
-                module_expanded = i == st.session_state.current_module
-                
-                with st.expander(f"{i}. {module['title']}", expanded=module_expanded):
-                    for j, lesson in enumerate(module['lessons'], 1):
-                        lesson_id = f"{module_id}_lesson_{j}"
-                        is_current = i == st.session_state.current_module and j == st.session_state.current_lesson
-                        
-                        # Check if lesson is completed
-                        is_completed = f"{i}_{j}" in st.session_state.completed_lesson_ids
-                        status_icon = "✓" if is_completed else ""
-                        
-                        if st.button(f"{status_icon} {j}. {lesson['title']}", 
-                                    key=lesson_id,
-                                    type="primary" if is_current else "secondary"):
-                            st.session_state.current_module = i
-                            st.session_state.current_lesson = j
-                            st.rerun()
+            render_outline()
         
         # Main content area
         with col2:
@@ -124,67 +172,161 @@ def main():
                 module = course_data['modules'][st.session_state.current_module - 1]
                 
                 if st.session_state.current_lesson <= len(module['lessons']):
-                    lesson = module['lessons'][st.session_state.current_lesson - 1]
-                    
-                    # Display lesson info
-                    st.markdown(f"<p>Lesson {st.session_state.current_lesson} of {len(module['lessons'])}</p>", unsafe_allow_html=True)
-                    
-                    # Lesson title and content
-                    st.markdown(f"<h2>{lesson['title']}</h2>", unsafe_allow_html=True)
-                    
-                    # Format and display lesson content
-                    formatted_content = format_lesson_content(lesson['content'])
-                    st.markdown(formatted_content, unsafe_allow_html=True)
-                    
-                    # Mark as completed button
-                    lesson_id = f"{st.session_state.current_module}_{st.session_state.current_lesson}"
-                    already_completed = lesson_id in st.session_state.completed_lesson_ids
-                    
-                    if already_completed:
-                        if st.button("✓ Marked as Done", type="primary", disabled=True):
-                            pass
-                    else:
-                        if st.button("Mark as Done", type="primary"):
-                            st.session_state.completed_lesson_ids.add(lesson_id)
-                            st.session_state.completed_lessons += 1
-                            st.rerun()
+                    render_lesson()
                     
                     # AI Tutor chat interface
                     st.markdown("<br><br>", unsafe_allow_html=True)
-                    with st.container(border=True):
-                        st.markdown("<h3>AI Instructor</h3>", unsafe_allow_html=True)
-                        
-                        # Display chat history
-                        for message in st.session_state.chat_history:
-                            if message["role"] == "user":
-                                st.markdown(f"<div class='user-message'>{message['content']}</div>", unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"<div class='ai-message'>{message['content']}</div>", unsafe_allow_html=True)
-                        
-                        # Initial greeting if no messages
-                        if not st.session_state.chat_history:
-                            st.markdown("<div class='ai-message'>Hey, I am your AI instructor. How can I help you today? 🤖</div>", unsafe_allow_html=True)
-                            
-                            # Sample questions
-                            st.markdown("<p>Some questions you might have about this lesson:</p>", unsafe_allow_html=True)
-                            sample_q1 = "What are the key differences between Python 2 and Python 3, and why is it important to use Python 3 for new projects?"
-                            sample_q2 = "Can you provide more examples of how Python is used in specific industries, such as finance or healthcare?"
-                            sample_q3 = "How does Python compare to other popular programming languages like Java or C++ in terms of performance and ease of use?"
-                            
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.button(sample_q1, key="sample_q1", on_click=lambda q=sample_q1: ask_question(q))
-                            with col2:
-                                st.button(sample_q2, key="sample_q2", on_click=lambda q=sample_q2: ask_question(q))
-                            with col3:
-                                st.button(sample_q3, key="sample_q3", on_click=lambda q=sample_q3: ask_question(q))
-                        
-                        # User input for questions
-                        user_question = st.text_input("Ask a question about this lesson:", key="user_question")
-                        if st.button("Send", key="send_question"):
-                            if user_question:
-                                ask_question(user_question)
-                                st.session_state.user_question = ""
+                    render_chat()
+
+        # Pick up newly streamed modules until the course is complete
+        if course_data.get('streaming'):
+            watch_course_stream(len(course_data['modules']))
+
+# Page sections that rerun on their own when their widgets are used
+@fragment
+def render_outline():
+    with timed_section("outline"):
+        course_data = st.session_state.course_data
+        st.button("Outline", key="outline_btn")
+        st.button("Map", key="map_btn")
+        
+        # Display modules and lessons for navigation
+        for i, module in enumerate(course_data['modules'], 1):
+            module_id = f"module_{i}"
+            module_expanded = i == st.session_state.current_module
+            
+            with st.expander(f"{i}. {module['title']}", expanded=module_expanded):
+                for j, lesson in enumerate(module['lessons'], 1):
+                    lesson_id = f"{module_id}_lesson_{j}"
+                    is_current = i == st.session_state.current_module and j == st.session_state.current_lesson
+                    
+                    # Check if lesson is completed
+                    is_completed = f"{i}_{j}" in st.session_state.completed_lesson_ids
+                    status_icon = "✓" if is_completed else ""
+                    
+                    if st.button(f"{status_icon} {j}. {lesson['title']}", 
+                                key=lesson_id,
+                                type="primary" if is_current else "secondary"):
+                        st.session_state.current_module = i
+                        st.session_state.current_lesson = j
+                        # The lesson and the tutor context change too
+                        st.rerun()
+
+@fragment
+def render_lesson():
+    with timed_section("lesson"):
+        course_data = st.session_state.course_data
+        module = course_data['modules'][st.session_state.current_module - 1]
+        lesson = module['lessons'][st.session_state.current_lesson - 1]
+        
+        # Display lesson info
+        st.markdown(f"<p>Lesson {st.session_state.current_lesson} of {len(module['lessons'])}</p>", unsafe_allow_html=True)
+        
+        # Lesson title and content
+        st.markdown(f"<h2>{lesson['title']}</h2>", unsafe_allow_html=True)
+        
+        # Restored courses read lesson bodies from the session store when opened
+        module_index = st.session_state.current_module - 1
+        lesson_index = st.session_state.current_lesson - 1
+        if lesson['content'] is None:
+            lesson['content'] = load_stored_lesson(module_index, lesson_index)
+        
+        # Lazy courses write the lesson on first visit and prefetch the next ones
+        if course_data.get('lazy'):
+            with st.spinner("Writing this lesson..."):
+                ensure_lesson_content(course_data, module_index, lesson_index)
+            remember_lesson(module_index, lesson_index, lesson['content'])
+        
+        # Format and display lesson content
+        formatted_content = format_lesson_content(lesson['content'])
+        st.markdown(formatted_content, unsafe_allow_html=True)
+        
+        # Mark as completed button
+        lesson_id = f"{st.session_state.current_module}_{st.session_state.current_lesson}"
+        already_completed = lesson_id in st.session_state.completed_lesson_ids
+        
+        if already_completed:
+            if st.button("✓ Marked as Done", type="primary", disabled=True):
+                pass
+        else:
+            if st.button("Mark as Done", type="primary"):
+                st.session_state.completed_lesson_ids.add(lesson_id)
+                st.session_state.completed_lessons += 1
+                get_session_store().record_completed(st.session_state.session_id, st.session_state.course_id, lesson_id)
+                # The outline checkmark and the progress header change too
+                st.rerun()
+        
+        # Write just this lesson or its module again instead of the whole course
+        col1, col2 = st.columns(2)
+        with col1:
+            rewrite_lesson_btn = st.button("Rewrite this lesson", key="rewrite_lesson",
+                                           disabled=bool(course_data.get('streaming')))
+        with col2:
+            rewrite_module_btn = st.button("Rewrite this module", key="rewrite_module",
+                                           disabled=bool(course_data.get('streaming')))
+        if rewrite_lesson_btn:
+            with st.spinner("Rewriting this lesson..."):
+                rewritten = rewrite_lesson(module_index, lesson_index)
+            if rewritten:
+                st.rerun()
+        if rewrite_module_btn:
+            with st.spinner("Rewriting this module..."):
+                rewritten = rewrite_module(module_index)
+            if rewritten:
+                # New lesson titles in the outline, so the whole page changes
+                st.rerun()
+
+@fragment
+def render_chat():
+    with timed_section("chat"), st.container(border=True):
+        st.markdown("<h3>AI Instructor</h3>", unsafe_allow_html=True)
+        
+        # Display chat history; older turns only survive as the tutor's summary
+        if st.session_state.chat_memory.summary:
+            st.caption("Earlier messages have been summarized for the tutor.")
+        for message in st.session_state.chat_history:
+            if message["role"] == "user":
+                st.markdown(f"<div class='user-message'>{message['content']}</div>", unsafe_allow_html=True)
+            else:
+                st.markdown(f"<div class='ai-message'>{message['content']}</div>", unsafe_allow_html=True)
+        
+        # Stream the answer to a question asked since the last run
+        if st.session_state.pending_question:
+            answer_pending_question()
+        
+        # Initial greeting if no messages
+        if not st.session_state.chat_history:
+            st.markdown("<div class='ai-message'>Hey, I am your AI instructor. How can I help you today? 🤖</div>", unsafe_allow_html=True)
+            
+            # Sample questions
+            st.markdown("<p>Some questions you might have about this lesson:</p>", unsafe_allow_html=True)
+            sample_q1 = "What are the key differences between Python 2 and Python 3, and why is it important to use Python 3 for new projects?"
+            sample_q2 = "Can you provide more examples of how Python is used in specific industries, such as finance or healthcare?"
+            sample_q3 = "How does Python compare to other popular programming languages like Java or C++ in terms of performance and ease of use?"
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.button(sample_q1, key="sample_q1", on_click=lambda q=sample_q1: ask_question(q))
+            with col2:
+                st.button(sample_q2, key="sample_q2", on_click=lambda q=sample_q2: ask_question(q))
+            with col3:
+                st.button(sample_q3, key="sample_q3", on_click=lambda q=sample_q3: ask_question(q))
+        
+        # User input for questions
+        st.text_input("Ask a question about this lesson:", key="user_question")
+        st.button("Send", key="send_question", on_click=send_question)
+
+@fragment(run_every=1)
+def watch_course_stream(modules_shown):
+    # Without fragments the whole page has to poll
+    if not USE_FRAGMENTS:
+        time.sleep(1)
+        st.rerun()
+    
+    # Rerun the whole page only when a new module has arrived or the stream ended
+    course_data = st.session_state.course_data
+    if not course_data.get('streaming') or len(course_data['modules']) != modules_shown:
+        st.rerun()
 
 # Helper functions
 def set_difficulty(level):
@@ -196,23 +338,113 @@ def set_page(page):
         st.session_state.current_module = 0
         st.session_state.current_lesson = 0
         st.session_state.chat_history = []
+        st.session_state.chat_memory = ChatMemory()
+        st.session_state.pending_question = None
+        st.session_state.course_id = None
+        get_session_store().clear_chat(st.session_state.session_id)
+
+def rewrite_lesson(module_index, lesson_index):
+    try:
+        content = regenerate_lesson(st.session_state.course_data, module_index, lesson_index)
+    except Exception as e:
+        st.error(f"The lesson could not be rewritten: {e}")
+        return False
+    
+    # Same titles, so the course keeps its id and only this session's stored body is replaced
+    st.session_state.stored_lesson_ids.discard(f"{module_index}_{lesson_index}")
+    remember_lesson(module_index, lesson_index, content)
+    return True
+
+def rewrite_module(module_index):
+    course_data = st.session_state.course_data
+    
+    # The course is stored again under its new outline, with the bodies of
+    # a restored course read back from the store first
+    for m, module in enumerate(course_data['modules']):
+        for l, lesson in enumerate(module['lessons']):
+            if lesson['content'] is None:
+                lesson['content'] = load_stored_lesson(m, l)
+    
+    try:
+        regenerate_module(course_data, module_index)
+    except Exception as e:
+        st.error(f"The module could not be rewritten: {e}")
+        return False
+    course_data['modules'][module_index] = compact_module(course_data['modules'][module_index])
+    
+    # Progress in the rewritten module no longer applies
+    prefix = f"{module_index + 1}_"
+    st.session_state.completed_lesson_ids = {
+        lesson_id for lesson_id in st.session_state.completed_lesson_ids if not lesson_id.startswith(prefix)
+    }
+    st.session_state.completed_lessons = len(st.session_state.completed_lesson_ids)
+    st.session_state.total_lessons = sum(len(module['lessons']) for module in course_data['modules'])
+    st.session_state.current_lesson = 1
+    st.session_state.course_index = CourseIndex(course_data)
+    
+    remember_course(course_data)
+    for lesson_id in st.session_state.completed_lesson_ids:
+        get_session_store().record_completed(st.session_state.session_id, st.session_state.course_id, lesson_id)
+    return True
 
 def ask_question(question):
-    # Add user question to chat history
-    st.session_state.chat_history.append({"role": "user", "content": question})
+    # Add user question to chat history; the answer is streamed in the chat panel
+    message = {"role": "user", "content": question}
+    st.session_state.chat_history.append(message)
+    st.session_state.pending_question = question
+    get_session_store().record_message(st.session_state.session_id, message)
+
+def send_question():
+    if st.session_state.user_question:
+        ask_question(st.session_state.user_question)
+        st.session_state.user_question = ""
+
+def answer_pending_question():
+    question = st.session_state.pending_question
+    st.session_state.pending_question = None
+    
+    # Everything below, down to the last streamed chunk, has to finish within the tutor deadline
+    deadline = tutor_deadline()
     
-    # Get current lesson context
-    current_module = st.session_state.course_data['modules'][st.session_state.current_module - 1]
+    # The titles of the current lesson frame every question about it
+    course_data = st.session_state.course_data
+    current_module = course_data['modules'][st.session_state.current_module - 1]
     current_lesson = current_module['lessons'][st.session_state.current_lesson - 1]
-    lesson_context = f"Module: {current_module['title']}\nLesson: {current_lesson['title']}\nContent: {current_lesson['content']}"
+    lesson_context = build_lesson_context(current_module, current_lesson)
+    
+    # Get the passages of the current and neighbouring lessons relevant to the question
+    if st.session_state.course_index is None or st.session_state.course_index.course is not course_data:
+        st.session_state.course_index = CourseIndex(course_data)
+    related_context = st.session_state.course_index.select_context(
+        st.session_state.current_module - 1, st.session_state.current_lesson - 1, question
+    )
+    
+    # Standalone questions (like the sample questions) may be answered from the answer cache
+    lesson_key = lesson_cache_key(course_data, st.session_state.current_module - 1, st.session_state.current_lesson - 1)
+    
+    # Render the AI response as it streams in
+    placeholder = st.empty()
+    placeholder.markdown("<div class='ai-message'>...</div>", unsafe_allow_html=True)
+    ai_response = ""
+    timings = {}
+    fold_chat()
+    for delta in stream_ai_response(question, lesson_context, st.session_state.chat_history[:-1], timings,
+                                    st.session_state.chat_memory.summary, lesson_key, related_context, deadline):
+        ai_response += delta
+        placeholder.markdown(f"<div class='ai-message'>{ai_response}</div>", unsafe_allow_html=True)
     
-    # Get AI response
-    with st.spinner("AI is thinking..."):
-        ai_response = get_ai_response(question, lesson_context, st.session_state.chat_history)
+    # Add AI response and its latency to chat history
+    message = {
+        "role": "assistant",
+        "content": ai_response,
+        "time_to_first_token": timings.get("time_to_first_token"),
+        "total_time": timings.get("total_time")
+    }
+    st.session_state.chat_history.append(message)
+    get_session_store().record_message(st.session_state.session_id, message)
     
-    # Add AI response to chat history
-    st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
-    st.rerun()
+    # Summarize older turns in the background once the chat gets long
+    fold_chat()
 
 if __name__ == "__main__":
     main()
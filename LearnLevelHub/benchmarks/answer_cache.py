@@ -0,0 +1,60 @@
+"""
+Measure the tutor answer cache on learners asking the same lesson questions
+
+Each simulated learner asks one standalone question about the same lesson,
+picked from the sample questions and a few paraphrases of them. Reports the
+latency of cache hits and misses, the hit rate and the upstream calls saved.
+
+Run from the project folder:
+    python -m benchmarks.answer_cache --learners 200 --latency 0.2
+"""
+import argparse
+import random
+import time
+
+import ai_tutor
+from answer_cache import get_answer_cache
+from llm_backends import FakeBackend, set_backend
+from benchmarks.common import summarize
+
+QUESTIONS = [
+    "What are the key differences between Python 2 and Python 3, and why is it important to use Python 3 for new projects?",
+    "What are the key differences between Python 2 and Python 3 and why use Python 3 for new projects",
+    "Can you provide more examples of how Python is used in specific industries, such as finance or healthcare?",
+    "Can you provide examples of how Python is used in industries like finance or healthcare?",
+    "How does Python compare to other popular programming languages like Java or C++ in terms of performance and ease of use?",
+    "How does Python compare to languages like Java or C++ in performance and ease of use?",
+    "What is a Python decorator?",
+    "What are decorators in Python?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--learners", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per model call")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency)
+    set_backend(backend)
+    rng = random.Random(0)
+
+    hits, misses = [], []
+    for _ in range(args.learners):
+        calls = backend.stats()["calls"]
+        start = time.perf_counter()
+        ai_tutor.get_ai_response(rng.choice(QUESTIONS), "Lesson context", [], lesson_key="benchmark-lesson")
+        elapsed = time.perf_counter() - start
+        (misses if backend.stats()["calls"] > calls else hits).append(elapsed)
+
+    stats = get_answer_cache().stats()
+    print(f"{args.learners} questions, {backend.stats()['calls']} upstream calls, hit rate {stats['hit_rate']:.0%} "
+          f"({stats['exact_hits']} exact, {stats['similar_hits']} similar)")
+    for name, samples in (("hit", hits), ("miss", misses)):
+        if samples:
+            summary = summarize(samples)
+            print(f"{name}: p50 {summary['p50'] * 1000:.2f} ms, p95 {summary['p95'] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
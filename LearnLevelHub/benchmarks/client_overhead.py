@@ -0,0 +1,110 @@
+"""
+Measure per-call client overhead against a local stub model server
+
+Starts an OpenAI-compatible stub server on localhost that answers every
+chat completion at once, then times the same request made with a client
+built for each call (the old pattern) and with the shared client from the
+client registry. The difference is client construction plus connection
+setup. Also times building a Gemini GenerativeModel per call against
+looking it up in the registry (no network needed).
+
+Run from the project folder:
+    python -m benchmarks.client_overhead --calls 200
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from client_registry import ClientRegistry
+from llm_backends import OpenAIBackend
+from benchmarks.common import summarize
+
+COMPLETION = json.dumps({
+    "id": "stub", "object": "chat.completion", "created": 0, "model": "stub-model",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Stub answer."}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13}
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this, keep-alive
+        # requests wait on delayed ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def do_GET(self):
+        self.do_POST()
+
+    def log_message(self, *args):
+        pass
+
+
+def time_calls(call, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def report(name, summary):
+    print(f"{name:<32} p50 {summary['p50'] * 1000:7.3f} ms  p95 {summary['p95'] * 1000:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def fresh_client_call():
+        from openai import OpenAI
+        client = OpenAI(api_key="stub", base_url=base_url)
+        client.chat.completions.create(model="stub-model", messages=[{"role": "user", "content": "Hi"}])
+        client.close()
+
+    backend = OpenAIBackend(model="stub-model", api_key="stub", base_url=base_url)
+    backend.warm_up()
+
+    def shared_client_call():
+        backend.generate("Hi")
+
+    report("openai: client per call", time_calls(fresh_client_call, args.calls))
+    report("openai: shared client", time_calls(shared_client_call, args.calls))
+    server.shutdown()
+
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        return
+    registry = ClientRegistry()
+    report("gemini: model per call", time_calls(
+        lambda: genai.GenerativeModel("gemini-1.5-pro", system_instruction="You are a tutor."), args.calls
+    ))
+    report("gemini: model from registry", time_calls(
+        lambda: registry.get(("gemini-model", "gemini-1.5-pro", "You are a tutor."),
+                             lambda: genai.GenerativeModel("gemini-1.5-pro", system_instruction="You are a tutor.")),
+        args.calls
+    ))
+
+
+if __name__ == "__main__":
+    main()
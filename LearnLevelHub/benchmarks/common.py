@@ -0,0 +1,48 @@
+"""
+Helpers shared by the benchmark scripts
+"""
+import math
+import subprocess
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers
+
+    Args:
+        values: Measured values
+        fraction: Percentile as a fraction (0.95 for p95)
+
+    Returns:
+        The percentile value, or None for an empty list
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """
+    Summarize latency samples (in seconds) as count, mean, p50, p95 and p99
+    """
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+    }
+
+
+def git_revision():
+    """
+    Current git commit of the working tree, or None outside a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,80 @@
+"""
+Benchmark the lesson formatter on 500-word and 50k-word lessons
+
+Compares the original uncompiled regex passes, the precompiled passes,
+the single-pass renderer and a cache hit of format_lesson_content, and
+checks that the precompiled passes keep the original output.
+
+Run from the project folder:
+    python -m benchmarks.formatter --runs 50
+"""
+import argparse
+import re
+import time
+
+import utils
+from benchmarks.common import summarize
+
+
+def original_format_lesson_content(content):
+    """
+    The formatter before patterns were precompiled and results cached
+    """
+    content = re.sub(r'^# (.*?)$', r'### \1', content, flags=re.MULTILINE)
+    content = re.sub(r'^## (.*?)$', r'#### \1', content, flags=re.MULTILINE)
+    content = re.sub(r'```(.*?)```', r'<pre><code>\1</code></pre>', content, flags=re.DOTALL)
+    content = re.sub(r'^\* (.*?)$', r'• \1<br>', content, flags=re.MULTILINE)
+    content = re.sub(r'^- (.*?)$', r'• \1<br>', content, flags=re.MULTILINE)
+    content = re.sub(r'\n\n', r'<br><br>', content)
+    return content
+
+
+def make_lesson(words):
+    """
+    Build a markdown lesson of about the given number of words
+    """
+    section = (
+        "## Key idea\n"
+        "This paragraph explains the concept with a few sentences of running text "
+        "and an example that ties it back to practice.\n\n"
+        "- first point to remember\n"
+        "* second point to remember\n\n"
+        "```python\nresult = compute(value)\nprint(result)\n```\n\n"
+    )
+    sections = max(1, words // len(section.split()))
+    return "# Lesson\n\n" + section * sections
+
+
+def time_calls(function, content, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(content)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    for words in (500, 50000):
+        content = make_lesson(words)
+        assert utils._format_with_regex(content) == original_format_lesson_content(content)
+
+        utils.format_lesson_content(content)
+        results = {
+            "original passes": time_calls(original_format_lesson_content, content, args.runs),
+            "precompiled passes": time_calls(utils._format_with_regex, content, args.runs),
+            "single pass": time_calls(utils.render_lesson_single_pass, content, args.runs),
+            "cached": time_calls(utils.format_lesson_content, content, args.runs),
+        }
+
+        print(f"{words} words ({len(content)} characters)")
+        for name, result in results.items():
+            print(f"  {name:<20} p50 {result['p50'] * 1000:9.3f}ms  p95 {result['p95'] * 1000:9.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
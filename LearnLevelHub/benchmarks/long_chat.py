@@ -0,0 +1,61 @@
+"""
+Check that tutor prompts and chat memory stay bounded in a long conversation
+
+Plays a conversation of many questions against the fake backend through
+ChatMemory, the way the chat panel does, and reports the prompt size and
+latency of the first and last questions and the size of the kept history.
+
+Run from the project folder:
+    python -m benchmarks.long_chat --questions 100 --latency 0.05
+"""
+import argparse
+import time
+
+import ai_tutor
+from chat_memory import ChatMemory
+from llm_backends import FakeBackend, estimate_tokens, set_backend
+from benchmarks.common import summarize
+
+LESSON_CONTEXT = "Module: Basics\nLesson: Variables\nContent: " + "Variables hold values. " * 150
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per model call")
+    parser.add_argument("--answer-words", type=int, default=250)
+    args = parser.parse_args()
+
+    set_backend(FakeBackend(latency=args.latency, answer_words=args.answer_words))
+
+    memory = ChatMemory()
+    chat_history = []
+    prompt_tokens = []
+    latencies = []
+    for i in range(args.questions):
+        question = f"Question {i}: can you explain variables with another example?"
+        chat_history.append({"role": "user", "content": question})
+        memory.fold(chat_history)
+
+        system_prompt, history, prompt = ai_tutor._tutor_request(question, LESSON_CONTEXT, chat_history[:-1], memory.summary)
+        prompt_tokens.append(
+            estimate_tokens(system_prompt) + estimate_tokens(prompt) + sum(estimate_tokens(msg["content"]) for msg in history)
+        )
+
+        start = time.perf_counter()
+        answer = ai_tutor.get_ai_response(question, LESSON_CONTEXT, chat_history[:-1], memory.summary)
+        latencies.append(time.perf_counter() - start)
+        chat_history.append({"role": "assistant", "content": answer})
+        memory.fold(chat_history)
+
+    window = max(1, args.questions // 10)
+    for name, part in (("first", slice(0, window)), ("last", slice(-window, None))):
+        latency = summarize(latencies[part])
+        print(f"{name} {window} questions: prompt {max(prompt_tokens[part])} tokens max, "
+              f"latency p50 {latency['p50'] * 1000:.0f} ms p95 {latency['p95'] * 1000:.0f} ms")
+    print(f"ceiling: {ai_tutor.PROMPT_TOKEN_CEILING} tokens; kept {len(chat_history)} of {2 * args.questions} messages "
+          f"and a {estimate_tokens(memory.summary)}-token summary")
+
+
+if __name__ == "__main__":
+    main()
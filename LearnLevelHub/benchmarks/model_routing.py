@@ -0,0 +1,72 @@
+"""
+Compare latency and cost with every call on the strong model and with routing
+
+Generates courses and answers a mix of short factual and open-ended tutor
+questions against the fake backend, where the fast model answers a few
+times quicker, once with every task on the strong model and once with the
+default routes. Costs use the list prices of gemini-1.5-pro and
+gemini-1.5-flash. Prints per-route calls, latency, tokens and cost.
+
+Run from the project folder:
+    python -m benchmarks.model_routing --courses 2 --questions 40
+"""
+import argparse
+import time
+
+import ai_tutor
+import course_generator
+import model_router
+from llm_backends import FakeBackend, set_backend
+from telemetry import get_metrics
+
+LESSON_CONTEXT = "Module: Basics\nLesson: Variables\nContent: " + "Variables hold values. " * 100
+
+QUESTIONS = [
+    "What is a variable?",
+    "What does immutable mean?",
+    "Is a tuple mutable?",
+    "Why are strings immutable in Python?",
+    "Can you compare lists and tuples with examples?",
+    "Explain how scoping works when a function is defined inside another function.",
+]
+
+
+def run(courses, questions):
+    get_metrics().reset()
+    start = time.perf_counter()
+    for i in range(courses):
+        course_generator.generate_course_content(f"Routing topic {i}", "Beginner", use_cache=False)
+    for i in range(questions):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        ai_tutor.get_ai_response(f"{question} ({i})", LESSON_CONTEXT, [])
+    return time.perf_counter() - start, model_router.route_report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=2)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.1, help="Strong model seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="Strong model output rate")
+    parser.add_argument("--speedup", type=float, default=3.0, help="How many times faster the fast model is")
+    args = parser.parse_args()
+
+    set_backend(FakeBackend(model="gemini-1.5-pro", latency=args.latency, tokens_per_second=args.tokens_per_second,
+                            modules=3, lessons=3, answer_words=300,
+                            model_speedup={"gemini-1.5-flash": args.speedup}))
+    model_router.FAST_MODEL = "gemini-1.5-flash"
+    routes = dict(model_router.ROUTES)
+
+    for name, table in (("everything on the strong model", {task: "strong" for task in routes}), ("routed", routes)):
+        model_router.ROUTES.clear()
+        model_router.ROUTES.update(table)
+        elapsed, report = run(args.courses, args.questions)
+        print(f"{name}: {elapsed:.2f} s, ${sum(route['cost_usd'] for route in report.values()):.4f}")
+        for route, stats in report.items():
+            print(f"  {route:<14} {stats['model']:<18} calls {stats['calls']:4d}  "
+                  f"mean {stats['mean_seconds'] * 1000:6.0f} ms  p95 <= {stats['p95_seconds'] * 1000:6.0f} ms  "
+                  f"tokens {stats['input_tokens']:6d} in {stats['output_tokens']:6d} out  ${stats['cost_usd']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure server time per interaction on the course page, whole-page vs fragment reruns
+
+The app records how long each page section takes to render in
+st.session_state.render_timings. AppTest always runs the whole script, so
+for every interaction this benchmark adds up the sections each layout
+renders: whole-page runs without fragments (clicks that call st.rerun()
+render the page twice) and the fragment plus any follow-up page run with
+fragments.
+
+Run from the project folder:
+    python -m benchmarks.page_reruns --chat-messages 60 --interactions 10
+"""
+import argparse
+import os
+import tempfile
+
+from course_cache import CourseCache, set_course_cache
+from llm_backends import FakeBackend, set_backend
+from session_store import SessionStore, set_session_store
+from benchmarks.common import summarize
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Sections rendered by each interaction: (whole-page layout, fragment layout)
+INTERACTION_SECTIONS = {
+    "send_question": (["page"], ["chat"]),
+    "open_lesson": (["page", "page"], ["outline", "page"]),
+    "mark_done": (["page", "page"], ["lesson", "page"]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", type=int, default=6)
+    parser.add_argument("--lessons", type=int, default=7, help="Lessons per module")
+    parser.add_argument("--chat-messages", type=int, default=60, help="Messages already in the chat")
+    parser.add_argument("--interactions", type=int, default=10, help="Repetitions of each interaction")
+    args = parser.parse_args()
+
+    from streamlit.testing.v1 import AppTest
+
+    set_backend(FakeBackend(modules=args.modules, lessons=args.lessons, answer_words=120))
+    scratch = tempfile.mkdtemp()
+    set_course_cache(CourseCache(os.path.join(scratch, "courses.sqlite3")))
+    set_session_store(SessionStore(os.path.join(scratch, "sessions.sqlite3")))
+    os.environ["COURSE_GENERATION_MODE"] = "eager"
+
+    app = AppTest.from_file(APP_PATH, default_timeout=600)
+    app.run()
+    app.text_input[0].input("Page rerun benchmark")
+    next(b for b in app.button if b.label == "Generate Course").click()
+    app.run()
+    app.session_state["chat_history"] = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i} " + "text " * 80}
+        for i in range(args.chat_messages)
+    ]
+
+    whole_page = {name: [] for name in INTERACTION_SECTIONS}
+    fragments = {name: [] for name in INTERACTION_SECTIONS}
+
+    def record(name):
+        timings = app.session_state["render_timings"]
+        before, after = INTERACTION_SECTIONS[name]
+        whole_page[name].append(sum(timings[section] for section in before))
+        fragments[name].append(sum(timings[section] for section in after))
+
+    for i in range(args.interactions):
+        app.text_input(key="user_question").input(f"Question {i}?")
+        app.button(key="send_question").click().run()
+        record("send_question")
+
+        lesson = i % args.lessons + 1
+        app.button(key=f"module_1_lesson_{lesson}").click().run()
+        record("open_lesson")
+
+        done = [b for b in app.button if b.label == "Mark as Done"]
+        if done:
+            done[0].click().run()
+            record("mark_done")
+
+    print(f"{'interaction':<15} {'whole page p50':>15} {'fragments p50':>15} {'whole page p95':>15} {'fragments p95':>15}")
+    for name in INTERACTION_SECTIONS:
+        if not whole_page[name]:
+            continue
+        before = summarize(whole_page[name])
+        after = summarize(fragments[name])
+        print(f"{name:<15} {before['p50'] * 1000:>13.1f}ms {after['p50'] * 1000:>13.1f}ms "
+              f"{before['p95'] * 1000:>13.1f}ms {after['p95'] * 1000:>13.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare what repairing damaged course responses costs with regenerating them
+
+Streams full courses from the fake backend with a share of the responses
+damaged (an unescaped quote in a string, or a response cut off early) and
+lets CourseStream salvage them, regenerating only the broken lessons and
+the missing modules. Without repair, each of those courses would have been
+generated again in full, priced here at the output of an undamaged course
+response. Runs with and without structured output, which rules out syntax
+damage but not truncation.
+
+Run from the project folder:
+    python -m benchmarks.partial_repair --courses 20 --malformed-rate 0.3 --truncate-rate 0.2
+"""
+import argparse
+import time
+
+import course_generator
+from course_generator import CourseStream
+from llm_backends import FakeBackend, set_backend
+from telemetry import get_metrics
+
+
+def run(courses):
+    metrics = get_metrics()
+    metrics.reset()
+    damaged = 0  # courses with a repair or a broken-off response
+    start = time.perf_counter()
+    for i in range(courses):
+        repairs = metrics.total("course_repairs_total")
+        stream = CourseStream(f"Repair topic {i}", "Beginner", use_cache=False)
+        stream.wait()
+        damaged += stream.error is not None or metrics.total("course_repairs_total") > repairs
+    course_tokens = metrics.total("llm_tokens_total", route="course", direction="output")
+    return {
+        "seconds": time.perf_counter() - start,
+        "damaged": damaged,
+        "course_tokens": course_tokens,
+        "repair_tokens": metrics.total("llm_tokens_total", direction="output") - course_tokens,
+        "repaired": metrics.total("course_repairs_total", result="ok"),
+        "failed": metrics.total("course_repairs_total", result="failed")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--malformed-rate", type=float, default=0.3, help="Share of responses with a syntax error")
+    parser.add_argument("--truncate-rate", type=float, default=0.2, help="Share of responses cut off early")
+    parser.add_argument("--modules", type=int, default=6)
+    parser.add_argument("--lessons", type=int, default=7, help="Lessons per module")
+    args = parser.parse_args()
+
+    backend = FakeBackend(modules=args.modules, lessons=args.lessons, answer_words=400)
+    set_backend(backend)
+    full_course = run(1)["course_tokens"]
+
+    backend.malformed_rate = args.malformed_rate
+    backend.truncate_rate = args.truncate_rate
+    for name, structured in (("prompt only", False), ("structured output", True)):
+        course_generator.STRUCTURED_OUTPUT = structured
+        result = run(args.courses)
+        retry_tokens = result["damaged"] * full_course
+        print(f"{name}: {result['damaged']}/{args.courses} courses needed repairs, {result['repaired']} pieces regenerated "
+              f"({result['failed']} failed) in {result['seconds']:.2f} s")
+        print(f"  repair {result['repair_tokens']} output tokens vs {retry_tokens} for full retries"
+              + (f" ({result['repair_tokens'] / retry_tokens:.1%})" if retry_tokens else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measure how retries and the circuit breaker cope with a flaky model service
+
+Sends the same tutor-sized requests to the fake backend while it injects
+rate limits (HTTP 429) and timeouts, once without retries (the old
+behaviour) and once through the Resilience policy, and reports the share
+of requests that succeeded and their latency. Then makes the service fail
+every request and shows the circuit breaker failing fast instead of
+waiting on each timeout.
+
+Run from the project folder:
+    python -m benchmarks.resilience --requests 200 --rate-limit-rate 0.1 --timeout-rate 0.05
+"""
+import argparse
+import time
+
+from llm_backends import FakeBackend
+from resilience import Resilience
+from benchmarks.common import summarize
+
+
+def run(backend, requests):
+    samples = []
+    failures = 0
+    for i in range(requests):
+        start = time.perf_counter()
+        try:
+            backend.generate(f"Question {i}: explain the example again")
+        except Exception:
+            failures += 1
+        samples.append(time.perf_counter() - start)
+    return failures, dict(summarize(samples), total=sum(samples))
+
+
+def report(name, requests, failures, summary, backend):
+    stats = backend.resilience.stats()
+    print(f"{name:<22} ok {1 - failures / requests:6.1%}  p50 {summary['p50'] * 1000:7.1f} ms  "
+          f"p95 {summary['p95'] * 1000:7.1f} ms  total {summary['total']:6.2f} s  "
+          f"retries {stats['retries']}  rejected {stats['rejected']}  circuit {stats['circuit_state']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01, help="Simulated seconds per model call")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.1)
+    parser.add_argument("--timeout-rate", type=float, default=0.05)
+    parser.add_argument("--timeout-after", type=float, default=0.2, help="Seconds a timing out call hangs")
+    args = parser.parse_args()
+
+    def backend(resilience, rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate):
+        return FakeBackend(latency=args.latency, answer_words=50, rate_limit_rate=rate_limit_rate,
+                           timeout_rate=timeout_rate, timeout_after=args.timeout_after, resilience=resilience)
+
+    policy = dict(base_delay=0.02, max_delay=0.2, seed=0)
+    cases = (
+        ("no retries", backend(Resilience(max_retries=0, failure_threshold=args.requests + 1))),
+        ("retries + breaker", backend(Resilience(**policy))),
+        ("outage, no breaker", backend(Resilience(max_retries=0, failure_threshold=args.requests + 1),
+                                       rate_limit_rate=0.0, timeout_rate=1.0)),
+        ("outage, breaker", backend(Resilience(**policy), rate_limit_rate=0.0, timeout_rate=1.0)),
+    )
+    for name, case in cases:
+        requests = args.requests if not name.startswith("outage") else max(1, args.requests // 10)
+        failures, summary = run(case, requests)
+        report(name, requests, failures, summary, case)
+
+
+if __name__ == "__main__":
+    main()
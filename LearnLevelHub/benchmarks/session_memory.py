@@ -0,0 +1,82 @@
+"""
+Measure the memory each session holds for a course shared by many learners
+
+Every simulated session loads the same cached course the way the app does
+(a fresh json.loads of the cache entry) and keeps it either as plain
+dictionaries or as a compact course whose lesson bodies live in the
+process-wide content store. A chat history of the given length is added
+to every session in both cases.
+
+Run from the project folder:
+    python -m benchmarks.session_memory --sessions 1000 --modules 6 --lessons 7
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from course_model import compact_course, get_content_store
+from llm_backends import FakeBackend
+
+
+def make_course_json(modules, lessons, words):
+    """
+    Serialized course as stored in the course cache
+    """
+    backend = FakeBackend(modules=modules, lessons=lessons, answer_words=words)
+    return backend.generate('Respond with JSON containing "modules" with lessons and their "content"').text
+
+
+def make_chat(messages, words):
+    backend = FakeBackend(answer_words=words)
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": backend.generate(f"message {i}").text}
+        for i in range(messages)
+    ]
+
+
+def measure(sessions, load):
+    """
+    Bytes allocated per session while all sessions are alive
+    """
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    alive = [load() for _ in range(sessions)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del alive
+    return used / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--modules", type=int, default=6)
+    parser.add_argument("--lessons", type=int, default=7, help="Lessons per module")
+    parser.add_argument("--words", type=int, default=400, help="Words per lesson")
+    parser.add_argument("--chat-messages", type=int, default=10)
+    args = parser.parse_args()
+
+    cached = make_course_json(args.modules, args.lessons, args.words)
+    chat = json.dumps(make_chat(args.chat_messages, 60))
+
+    def dict_session():
+        return {"course_data": json.loads(cached), "chat_history": json.loads(chat)}
+
+    def compact_session():
+        return {"course_data": compact_course(json.loads(cached)), "chat_history": json.loads(chat)}
+
+    dict_bytes = measure(args.sessions, dict_session)
+    compact_bytes = measure(args.sessions, compact_session)
+
+    print(f"course JSON: {len(cached) / 1024:.0f} KiB, {args.sessions} sessions")
+    print(f"dicts:   {dict_bytes / 1024:8.1f} KiB per session")
+    print(f"compact: {compact_bytes / 1024:8.1f} KiB per session "
+          f"({dict_bytes / compact_bytes:.1f}x smaller, shared bodies included)")
+    print(f"content store after the run: {get_content_store().stats()}")
+
+
+if __name__ == "__main__":
+    main()
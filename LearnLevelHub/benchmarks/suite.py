@@ -0,0 +1,204 @@
+"""
+End-to-end benchmark suite for course generation, tutor chat and page flow
+
+Every scenario runs against the fake backend with simulated latency and
+token rate, so results are comparable between commits on any machine.
+The report contains p50/p95/p99 latencies, time-to-first-token, upstream
+calls, tokens sent and received, and peak memory per app session.
+
+Run from the project folder:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import ai_tutor
+import course_generator
+from course_cache import CourseCache, set_course_cache
+from llm_backends import FakeBackend, set_backend
+from session_store import SessionStore, set_session_store
+from utils import format_lesson_content
+from benchmarks.common import git_revision, summarize
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+LESSON_CONTEXT = "Module: Basics\nLesson: Variables\nContent: " + "Variables hold values. " * 100
+
+
+def backend_usage(backend):
+    stats = backend.stats()
+    return {
+        "upstream_calls": stats["calls"],
+        "input_tokens": stats["input_tokens"],
+        "output_tokens": stats["output_tokens"],
+    }
+
+
+def bench_course_generation(backend, runs):
+    backend.reset_stats()
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        course_generator.generate_course_content(f"Benchmark topic {i}", "Beginner", use_cache=False)
+        latencies.append(time.perf_counter() - start)
+    return {"latency": summarize(latencies), **backend_usage(backend)}
+
+
+def bench_tutor(backend, questions):
+    backend.reset_stats()
+    latencies = []
+    history = []
+    for i in range(questions):
+        question = f"Can you explain point {i} of this lesson?"
+        start = time.perf_counter()
+        answer = ai_tutor.get_ai_response(question, LESSON_CONTEXT, history)
+        latencies.append(time.perf_counter() - start)
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return {"latency": summarize(latencies), **backend_usage(backend)}
+
+
+def bench_tutor_stream(backend, questions):
+    backend.reset_stats()
+    backend.hedger.reset_stats()
+    first_tokens = []
+    totals = []
+    for i in range(questions):
+        timings = {}
+        for _ in ai_tutor.stream_ai_response(f"Question {i}?", LESSON_CONTEXT, [], timings):
+            pass
+        first_tokens.append(timings["time_to_first_token"])
+        totals.append(timings["total_time"])
+    return {
+        "time_to_first_token": summarize(first_tokens), "latency": summarize(totals),
+        "hedge_rate": backend.hedger.stats()["hedge_rate"],
+        **backend_usage(backend)
+    }
+
+
+def bench_formatter(words, runs):
+    content = "\n\n".join(
+        "## Section\n" + ("Some lesson text with `code`. " * 8) + "\n- bullet one\n* bullet two\n```\nprint('x')\n```"
+        for _ in range(max(1, words // 60))
+    )
+    latencies = []
+    for i in range(runs):
+        # A different lesson every run, so each call formats instead of hitting the formatter cache
+        lesson = f"# Lesson {i}\n\n{content}"
+        start = time.perf_counter()
+        format_lesson_content(lesson)
+        latencies.append(time.perf_counter() - start)
+    return {"words": words, "latency": summarize(latencies)}
+
+
+def bench_page_flow(backend, sessions, mode):
+    """
+    Drive the Streamlit app headlessly: generate a course, open lessons and ask questions
+    """
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["COURSE_GENERATION_MODE"] = mode
+    backend.reset_stats()
+    steps = {}
+    peaks = []
+
+    def timed(name, action, app):
+        action()
+        start = time.perf_counter()
+        app.run()
+        steps.setdefault(name, []).append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(f"{name}: {app.exception[0].value}")
+
+    tracemalloc.start()
+    for i in range(sessions):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        app = AppTest.from_file(APP_PATH, default_timeout=600)
+        timed("load_home", lambda: None, app)
+        app.text_input[0].input(f"Page flow topic {i}")
+        timed("generate_course", lambda: next(b for b in app.button if b.label == "Generate Course").click(), app)
+        timed("open_lesson", lambda: app.button(key="module_1_lesson_2").click(), app)
+        timed("sample_question", lambda: app.button(key="sample_q1").click(), app)
+        app.text_input(key="user_question").input("Can you give another example?")
+        timed("send_question", lambda: app.button(key="send_question").click(), app)
+        timed("mark_done", lambda: next(b for b in app.button if b.label == "Mark as Done").click(), app)
+
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "steps": {name: summarize(values) for name, values in steps.items()},
+        "peak_memory_bytes_per_session": summarize(peaks),
+        **backend_usage(backend),
+    }
+
+
+def compare(current, baseline, path=""):
+    """
+    Print relative changes of every numeric result against a baseline report
+    """
+    for key, value in current.items():
+        if key in ("settings", "count", "words"):
+            continue
+        name = f"{path}.{key}" if path else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, name)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            change = (value - old) / old * 100
+            print(f"{name:<70} {old:>12.4g} -> {value:>12.4g} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="Simulated output rate")
+    parser.add_argument("--courses", type=int, default=3, help="Course generations to time")
+    parser.add_argument("--questions", type=int, default=20, help="Tutor questions to time")
+    parser.add_argument("--sessions", type=int, default=3, help="Headless app sessions to drive")
+    parser.add_argument("--mode", default="eager", choices=["eager", "lazy", "stream"], help="Course generation mode for the page flow")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency, tokens_per_second=args.tokens_per_second, modules=5, lessons=5)
+    set_backend(backend)
+
+    # Keep benchmark courses and sessions out of the real course cache and session store
+    scratch = tempfile.mkdtemp()
+    set_course_cache(CourseCache(os.path.join(scratch, "courses.sqlite3")))
+    set_session_store(SessionStore(os.path.join(scratch, "sessions.sqlite3")))
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "course_generation": bench_course_generation(backend, args.courses),
+        "tutor": bench_tutor(backend, args.questions),
+        "tutor_stream": bench_tutor_stream(backend, args.questions),
+        "formatter": {
+            "500_words": bench_formatter(500, 200),
+            "50000_words": bench_formatter(50000, 10),
+        },
+        "page_flow": bench_page_flow(backend, args.sessions, args.mode),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
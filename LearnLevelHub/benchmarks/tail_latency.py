@@ -0,0 +1,59 @@
+"""
+Measure how hedged requests cut the tail of tutor time-to-first-token
+
+Streams tutor answers from the fake backend while a small share of calls
+is slow to start (a latency tail), once without hedging and once with it,
+and reports p50/p95/p99 time to first token, the hedge rate and the extra
+upstream calls the hedges cost. A last run with a short deadline shows
+slow calls being cut off at the deadline instead of stalling the answer.
+
+Run from the project folder:
+    python -m benchmarks.tail_latency --questions 300 --slow-rate 0.03
+"""
+import argparse
+import time
+
+import ai_tutor
+from llm_backends import FakeBackend, set_backend
+from benchmarks.common import summarize
+
+LESSON_CONTEXT = "Module: Basics\nLesson: Variables\nContent: " + "Variables hold values. " * 100
+
+
+def run(backend, questions, hedge, deadline_seconds):
+    ai_tutor.HEDGE_REQUESTS = hedge
+    backend.reset_stats()
+    backend.hedger.reset_stats()
+    first_tokens = []
+    for i in range(questions):
+        timings = {}
+        deadline = time.monotonic() + deadline_seconds
+        for _ in ai_tutor.stream_ai_response(f"Question {i}: explain it again?", LESSON_CONTEXT, [], timings,
+                                             deadline=deadline):
+            pass
+        first_tokens.append(timings["time_to_first_token"])
+    return summarize(first_tokens), backend.hedger.stats(), backend.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds to first token")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="Share of calls that are slow to start")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Extra seconds before a slow call starts")
+    parser.add_argument("--deadline", type=float, default=0.5, help="Deadline in seconds for the last run")
+    args = parser.parse_args()
+
+    cases = (("no hedging", False, 30.0), ("hedging", True, 30.0), (f"{args.deadline}s deadline", False, args.deadline))
+    for name, hedge, deadline_seconds in cases:
+        backend = FakeBackend(latency=args.latency, answer_words=50, slow_rate=args.slow_rate,
+                              slow_latency=args.slow_latency)
+        set_backend(backend)
+        first_token, hedger, usage = run(backend, args.questions, hedge, deadline_seconds)
+        print(f"{name:<16} first token p50 {first_token['p50'] * 1000:6.0f} ms  p95 {first_token['p95'] * 1000:6.0f} ms  "
+              f"p99 {first_token['p99'] * 1000:6.0f} ms  hedge rate {hedger['hedge_rate']:5.1%}  "
+              f"upstream calls {usage['calls']}  past deadline {hedger['deadline_exceeded']}")
+
+
+if __name__ == "__main__":
+    main()
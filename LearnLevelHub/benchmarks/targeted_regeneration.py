@@ -0,0 +1,49 @@
+"""
+Compare rewriting one lesson or one module with regenerating the whole course
+
+Generates a course against the fake backend, then rewrites a single lesson
+and a single module in place and generates the course again from scratch.
+Prints model calls, output tokens and time for each.
+
+Run from the project folder:
+    python -m benchmarks.targeted_regeneration --modules 6 --lessons 7 --latency 0.05
+"""
+import argparse
+import time
+
+import course_generator
+from llm_backends import FakeBackend, set_backend
+
+
+def measure(backend, action):
+    backend.reset_stats()
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    stats = backend.stats()
+    return stats["calls"], stats["output_tokens"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", type=int, default=6)
+    parser.add_argument("--lessons", type=int, default=7, help="Lessons per module")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per model call")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency, modules=args.modules, lessons=args.lessons)
+    set_backend(backend)
+    course = course_generator.generate_course_content("Regeneration benchmark", "Beginner", use_cache=False)
+
+    for name, action in (
+        ("rewrite one lesson", lambda: course_generator.regenerate_lesson(course, 1, 2)),
+        ("rewrite one module", lambda: course_generator.regenerate_module(course, 1)),
+        ("regenerate the course", lambda: course_generator.generate_course_content(
+            "Regeneration benchmark", "Beginner", use_cache=False)),
+    ):
+        calls, tokens, elapsed = measure(backend, action)
+        print(f"{name:<22} {calls:4d} calls  {tokens:7d} output tokens  {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
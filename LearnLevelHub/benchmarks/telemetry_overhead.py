@@ -0,0 +1,57 @@
+"""
+Measure what tracing costs per span, sampled and unsampled
+
+Times an empty block bare, inside an unsampled span (metrics only) and
+inside a sampled span written to a JSON lines file, then runs model calls
+against the fake backend so the exported metrics can be checked. Prints
+the per-span overhead and the first lines of the Prometheus export.
+
+Run from the project folder:
+    python -m benchmarks.telemetry_overhead --spans 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from llm_backends import FakeBackend
+from telemetry import Metrics, Tracer, get_metrics
+
+
+def time_spans(tracer, spans):
+    start = time.perf_counter()
+    for _ in range(spans):
+        with tracer.span("bench", item=1):
+            pass
+    return (time.perf_counter() - start) / spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=200, help="Fake model calls for the metrics export")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.spans):
+        pass
+    bare = (time.perf_counter() - start) / args.spans
+
+    path = os.path.join(tempfile.mkdtemp(), "spans.jsonl")
+    for name, tracer in (("unsampled span", Tracer(Metrics(), path, sample_rate=0.0, seed=0)),
+                         ("10% sampled span", Tracer(Metrics(), path, sample_rate=0.1, seed=0)),
+                         ("sampled span", Tracer(Metrics(), path, sample_rate=1.0, seed=0))):
+        per_span = time_spans(tracer, args.spans) - bare
+        tracer.flush()
+        print(f"{name:<18} {per_span * 1e6:6.2f} us per span")
+
+    backend = FakeBackend(answer_words=50, rate_limit_rate=0.05)
+    for i in range(args.calls):
+        backend.generate(f"Question {i}")
+        "".join(backend.stream(f"Streamed question {i}"))
+    print()
+    print("\n".join(line for line in get_metrics().render().splitlines() if "_bucket" not in line))
+
+
+if __name__ == "__main__":
+    main()
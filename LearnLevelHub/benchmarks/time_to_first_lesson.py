@@ -0,0 +1,56 @@
+"""
+Compare time-to-first-lesson of eager and lazy course generation
+
+The model is replaced by the fake backend with a fixed latency per call, so
+the numbers reflect the request pattern of each mode rather than the network.
+
+Run from the project folder:
+    python -m benchmarks.time_to_first_lesson --latency 0.5 --modules 6 --lessons 7
+"""
+import argparse
+import time
+
+import course_generator
+from llm_backends import FakeBackend, set_backend
+
+
+def measure_eager(max_workers):
+    start = time.perf_counter()
+    course = course_generator.generate_course_content("Benchmark", "Beginner", max_workers=max_workers, use_cache=False)
+    first_lesson = time.perf_counter() - start
+    return course, first_lesson
+
+
+def measure_lazy():
+    start = time.perf_counter()
+    course = course_generator.generate_lazy_course("Benchmark", "Beginner", use_cache=False)
+    course_generator.ensure_lesson_content(course, 0, 0)
+    first_lesson = time.perf_counter() - start
+    return course, first_lesson
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per model call")
+    parser.add_argument("--modules", type=int, default=6)
+    parser.add_argument("--lessons", type=int, default=7, help="Lessons per module")
+    parser.add_argument("--max-workers", type=int, default=course_generator.MAX_CONCURRENT_LESSONS)
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency, modules=args.modules, lessons=args.lessons)
+    set_backend(backend)
+
+    _, eager_time = measure_eager(args.max_workers)
+    eager_calls = backend.stats()["calls"]
+
+    backend.reset_stats()
+    _, lazy_time = measure_lazy()
+    lazy_calls = backend.stats()["calls"]
+
+    print(f"eager: first lesson after {eager_time:.2f}s, {eager_calls} model calls")
+    print(f"lazy:  first lesson after {lazy_time:.2f}s, {lazy_calls} model calls "
+          f"(including up to {course_generator.PREFETCH_LESSONS} background prefetches)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare upstream calls and latency of the old chat replay and the single-request tutor
+
+The old tutor sent the system prompt, every recent user message and the
+question as separate messages. The model is replaced by the fake backend
+with a fixed latency per call, so the numbers reflect round trips.
+
+Run from the project folder:
+    python -m benchmarks.tutor_round_trips --latency 0.3 --questions 5
+"""
+import argparse
+import time
+
+import ai_tutor
+from llm_backends import FakeBackend, get_backend, set_backend
+
+
+def legacy_get_ai_response(question, lesson_context, chat_history):
+    """
+    The tutor request pattern before the single-request rewrite
+    """
+    backend = get_backend()
+    replayed = []
+
+    def send(message):
+        response = backend.generate(message, history=replayed)
+        replayed.extend([{"role": "user", "content": message}, {"role": "model", "content": response.text}])
+        return response.text
+
+    send(f"You are an AI tutor. Here's the context of the current lesson:\n{lesson_context}")
+    for msg in chat_history[-5:]:
+        if msg["role"] == "user":
+            send(msg["content"])
+    return send(question)
+
+
+def run_conversation(respond, questions):
+    """
+    Ask a series of questions and return the latency of each answer
+    """
+    history = []
+    latencies = []
+    for i in range(questions):
+        question = f"Question {i + 1} about the lesson?"
+        start = time.perf_counter()
+        answer = respond(question, "Module: Basics\nLesson: Variables\nContent: ...", history)
+        latencies.append(time.perf_counter() - start)
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.3, help="Simulated seconds per model call")
+    parser.add_argument("--questions", type=int, default=5, help="Questions asked in the conversation")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency, answer_words=80)
+    set_backend(backend)
+
+    for name, respond in (("replay", legacy_get_ai_response), ("single", ai_tutor.get_ai_response)):
+        backend.reset_stats()
+        latencies = run_conversation(respond, args.questions)
+        stats = backend.stats()
+        print(f"{name:>6}: {stats['calls']} model calls, {stats['input_tokens']} input tokens, "
+              f"mean {sum(latencies) / len(latencies):.2f}s, last question {latencies[-1]:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
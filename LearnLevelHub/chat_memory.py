@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from llm_backends import get_backend, estimate_tokens
+from model_router import route_model
+
+# Verbatim chat turns kept per session before older ones are summarized
+RECENT_TOKEN_BUDGET = int(os.getenv("TUTOR_RECENT_TOKEN_BUDGET", "1200"))
+
+# Maximum length of the running summary of older turns
+SUMMARY_TOKEN_BUDGET = int(os.getenv("TUTOR_SUMMARY_TOKEN_BUDGET", "300"))
+
+# Model used for summaries; defaults to the "summary" route (see model_router)
+SUMMARY_MODEL = os.getenv("TUTOR_SUMMARY_MODEL", "")
+
+SUMMARY_PROMPT = """You keep notes on a tutoring conversation.
+Merge the earlier summary and the new messages into one short summary of what the student asked,
+what was explained and anything the student struggled with. Write plain prose, no more than {words} words."""
+
+# Summaries run in the background so questions never wait for them
+_summary_executor = ThreadPoolExecutor(max_workers=2)
+
+def summarize_messages(summary, messages, token_budget=SUMMARY_TOKEN_BUDGET):
+    """
+    Fold chat messages into a running summary with a cheap model call
+
+    Args:
+        summary: The summary so far (may be empty)
+        messages: Messages to add to the summary
+        token_budget: Maximum length of the new summary
+
+    Returns:
+        The new summary, cut to token_budget
+    """
+    backend = get_backend()
+    transcript = "\n".join(
+        f"{'Student' if msg['role'] == 'user' else 'Tutor'}: {msg['content']}" for msg in messages
+    )
+    prompt = f"Earlier summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+    response = backend.generate(
+        prompt,
+        system_instruction=SUMMARY_PROMPT.format(words=token_budget * 3 // 4),
+        model=SUMMARY_MODEL or route_model("summary", backend),
+        route="summary"
+    )
+    return response.text.strip()[:token_budget * 4]
+
+class ChatMemory:
+    """
+    Running summary of the turns that no longer fit in a session's chat
+
+    The chat history list keeps the recent turns verbatim. Once they exceed
+    recent_tokens, the oldest turns are summarized in the background and
+    removed from the list when the summary is ready, leaving about half of
+    the budget. Until then the tutor keeps using the previous summary, so
+    questions never wait for summarization and the history stays bounded
+    however long the conversation runs. folded_messages counts the messages
+    removed so far, so a stored chat can be restored from the summary and
+    the messages after them.
+    """
+
+    def __init__(self, recent_tokens=RECENT_TOKEN_BUDGET, summary_tokens=SUMMARY_TOKEN_BUDGET, summary="",
+                 folded_messages=0):
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.summary = summary
+        self.folded_messages = folded_messages
+        self._folding = None
+        self._folded = []
+
+    def fold(self, chat_history):
+        """
+        Apply a finished summary and start a new one if the history is too long
+
+        Args:
+            chat_history: The session's chat messages; summarized messages
+                are removed from the front of the list
+
+        Returns:
+            True if a new summary was applied
+        """
+        applied = False
+        if self._folding is not None and self._folding.done():
+            try:
+                self.summary = self._folding.result()
+                applied = True
+                # Drop the summarized messages unless the chat was reset meanwhile
+                if chat_history[:len(self._folded)] == self._folded:
+                    del chat_history[:len(self._folded)]
+                    self.folded_messages += len(self._folded)
+            except Exception:
+                # Keep the messages; they are summarized again next time
+                pass
+            self._folding = None
+            self._folded = []
+
+        if self._folding is not None:
+            return applied
+
+        sizes = [estimate_tokens(msg["content"]) for msg in chat_history]
+        if sum(sizes) <= self.recent_tokens:
+            return applied
+
+        # Cut before a user turn, keeping the newest turns within half the budget
+        cut = None
+        remaining = sum(sizes)
+        for i in range(1, len(chat_history)):
+            remaining -= sizes[i - 1]
+            if chat_history[i]["role"] == "user":
+                cut = i
+                if remaining <= self.recent_tokens // 2:
+                    break
+        if cut is None:
+            return applied
+
+        self._folded = chat_history[:cut]
+        self._folding = _summary_executor.submit(summarize_messages, self.summary, list(self._folded), self.summary_tokens)
+        return applied
@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Maximum number of client objects (models, HTTP clients) kept per process
+CLIENT_REGISTRY_MAX_ENTRIES = int(os.getenv("LLM_CLIENT_REGISTRY_MAX_ENTRIES", "256"))
+
+class ClientRegistry:
+    """
+    Process-wide store of configured model clients, keyed by model and config
+
+    Building a provider client (and opening its HTTP connections) costs far
+    more than looking one up, so backends ask the registry for every client
+    they need and the first caller builds it. The least recently used
+    clients are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries=CLIENT_REGISTRY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._clients = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0}
+
+    def get(self, key, factory):
+        """
+        Return the client for a key, building it with factory on first use
+
+        Args:
+            key: Hashable identity of the client (provider, model, config)
+            factory: Function building the client
+
+        Returns:
+            The shared client
+        """
+        with self._lock:
+            if key in self._clients:
+                self._clients.move_to_end(key)
+                self._stats["reused"] += 1
+                return self._clients[key]
+            # One builder per key; others wait for it
+            building = self._building.setdefault(key, threading.Lock())
+
+        with building:
+            with self._lock:
+                if key in self._clients:
+                    self._stats["reused"] += 1
+                    return self._clients[key]
+            client = factory()
+            with self._lock:
+                self._clients[key] = client
+                self._building.pop(key, None)
+                self._stats["created"] += 1
+                while len(self._clients) > self.max_entries:
+                    self._clients.popitem(last=False)
+            return client
+
+    def stats(self):
+        """
+        Report how many clients were built and reused
+
+        Returns:
+            Dictionary with created, reused and entries
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._clients))
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+_registry = ClientRegistry()
+
+def get_client_registry():
+    """
+    Return the process-wide client registry
+    """
+    return _registry
@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+# Location and limits of the shared course cache
+CACHE_PATH = os.getenv("COURSE_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "learnlevelhub", "courses.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv("COURSE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("COURSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+def normalize_text(text):
+    """
+    Normalize free text so trivially different requests share a cache entry
+
+    Args:
+        text: Topic or additional information entered by the learner
+
+    Returns:
+        Lowercased text with collapsed whitespace and no surrounding punctuation
+    """
+    text = re.sub(r"\s+", " ", (text or "").lower()).strip()
+    return text.strip(" .,;:!?\"'")
+
+def make_key(topic, difficulty, additional_info, version):
+    """
+    Build the content address of a course request
+
+    Args:
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+        version: Prompt and model version; changing it invalidates old entries
+
+    Returns:
+        Hex digest identifying the request
+    """
+    parts = [version, normalize_text(topic), normalize_text(difficulty), normalize_text(additional_info)]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+class CourseCache:
+    """
+    SQLite course store shared by every app process on the host
+
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted once the stored courses exceed max_bytes. Hit and miss counters
+    are kept in the database so they cover all processes.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS courses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS courses_accessed ON courses (accessed)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        """
+        Look up a course
+
+        Args:
+            key: Key returned by make_key
+
+        Returns:
+            The course dictionary, or None on a miss
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM courses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM courses WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self._count(conn, "misses")
+                return None
+
+            conn.execute("UPDATE courses SET accessed = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+            return json.loads(row[0])
+
+    def contains(self, key):
+        """
+        Check whether a course is stored, without counting a hit or miss or marking it as used
+
+        Args:
+            key: Key returned by make_key
+
+        Returns:
+            True if an unexpired course is stored under key
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT created FROM courses WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def put(self, key, course):
+        """
+        Store a course, evicting least recently used entries if needed
+
+        Args:
+            key: Key returned by make_key
+            course: Course dictionary to store
+        """
+        value = json.dumps(course)
+        size = len(value.encode("utf-8"))
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO courses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            conn.execute("DELETE FROM courses WHERE created < ?", (now - self.ttl,))
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM courses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM courses WHERE key != ? ORDER BY accessed", (key,)).fetchall()
+                for old_key, old_size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM courses WHERE key = ?", (old_key,))
+                    self._count(conn, "evictions")
+                    total -= old_size
+
+    def update_module(self, key, module_index, module):
+        """
+        Replace one module of a stored course, keeping the rest of the entry
+
+        Args:
+            key: Key returned by make_key
+            module_index: Zero-based index of the module
+            module: Module dictionary to store in its place
+
+        Returns:
+            True if the course was stored and had that module
+        """
+        with self._connect() as conn:
+            # Read and write under one lock so concurrent updates are not lost
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM courses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            course = json.loads(row[0])
+            if not 0 <= module_index < len(course["modules"]):
+                return False
+            course["modules"][module_index] = module
+            value = json.dumps(course)
+            conn.execute(
+                "UPDATE courses SET value = ?, size = ?, accessed = ? WHERE key = ?",
+                (value, len(value.encode("utf-8")), time.time(), key)
+            )
+            return True
+
+    def update_lesson(self, key, module_index, lesson_index, title, content):
+        """
+        Replace the content of one lesson of a stored course, keeping the rest of the entry
+
+        Args:
+            key: Key returned by make_key
+            module_index: Zero-based index of the module
+            lesson_index: Zero-based index of the lesson within the module
+            title: Title of the lesson; the entry is left alone if its lesson has another title
+            content: New lesson content
+
+        Returns:
+            True if the course was stored and had that lesson
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM courses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            course = json.loads(row[0])
+            if not 0 <= module_index < len(course["modules"]):
+                return False
+            lessons = course["modules"][module_index]["lessons"]
+            if not 0 <= lesson_index < len(lessons) or lessons[lesson_index]["title"] != title:
+                return False
+            lessons[lesson_index]["content"] = content
+            value = json.dumps(course)
+            conn.execute(
+                "UPDATE courses SET value = ?, size = ?, accessed = ? WHERE key = ?",
+                (value, len(value.encode("utf-8")), time.time(), key)
+            )
+            return True
+
+    def stats(self):
+        """
+        Report cache usage across all processes
+
+        Returns:
+            Dictionary with hits, misses, evictions, hit_rate, entries and bytes
+        """
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM courses").fetchone()
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "bytes": total
+        }
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_course_cache():
+    """
+    Return the process-wide cache at CACHE_PATH
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CourseCache()
+        return _default_cache
+
+def set_course_cache(cache):
+    """
+    Replace the process-wide cache (used by benchmarks and batch jobs)
+
+    Args:
+        cache: A CourseCache instance
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
+
+if __name__ == "__main__":
+    print(json.dumps(get_course_cache().stats(), indent=2))
@@ -1,104 +1,1120 @@
 import os
+import copy
 import json
-import google.generativeai as genai
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from llm_backends import get_backend
+from json_stream import IncrementalCourseParser, salvage_course
+from course_cache import get_course_cache, make_key
+from single_flight import SingleFlight
+from telemetry import get_metrics, get_tracer
+from model_router import route_model
 
-# Initialize Google AI client
-api_key = os.getenv("GOOGLE_API_KEY", "")
-genai.configure(api_key=api_key)
+# Maximum number of lessons generated at the same time during the fan-out phase
+MAX_CONCURRENT_LESSONS = int(os.getenv("COURSE_MAX_CONCURRENT_LESSONS", "8"))
 
-def generate_course_content(topic, difficulty, additional_info=""):
+# Number of upcoming lessons generated in the background in lazy mode
+PREFETCH_LESSONS = int(os.getenv("COURSE_PREFETCH_LESSONS", "2"))
+
+# Background workers shared by all sessions for those prefetches; the lesson a
+# learner has opened is written in their own thread and never queues behind them
+PREFETCH_WORKERS = int(os.getenv("COURSE_PREFETCH_WORKERS", "4"))
+
+# Ask providers with a structured output mode for JSON following the course
+# schema (0 to rely on the prompt alone)
+STRUCTURED_OUTPUT = os.getenv("COURSE_STRUCTURED_OUTPUT", "1") != "0"
+
+# A course response cut off early is topped up to this many modules
+MIN_MODULES = 5
+
+SYSTEM_PROMPT = "You are an expert course creator specializing in educational content."
+
+# Bump whenever the course prompts change so cached courses are regenerated
+PROMPT_VERSION = "3"
+
+# Shown in place of a streamed lesson that is being written again
+PENDING_LESSON = "This lesson is still being written. Check back in a moment."
+
+def _module_schema(with_content):
+    lesson = {"type": "object", "properties": {"title": {"type": "string"}}, "required": ["title"]}
+    if with_content:
+        lesson["properties"]["content"] = {"type": "string"}
+        lesson["required"].append("content")
+    return {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "lessons": {"type": "array", "items": lesson}
+        },
+        "required": ["title", "description", "lessons"]
+    }
+
+def _course_schema(with_content):
+    return {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "difficulty": {"type": "string"},
+            "modules": {"type": "array", "items": _module_schema(with_content)}
+        },
+        "required": ["title", "modules"]
+    }
+
+# Response schemas of the outline, a single module outline and the streamed full course
+OUTLINE_SCHEMA = _course_schema(with_content=False)
+MODULE_SCHEMA = _module_schema(with_content=False)
+COURSE_SCHEMA = _course_schema(with_content=True)
+
+# Identical generations running at the same time share one upstream request.
+# Set COURSE_SINGLE_FLIGHT_LOCK_DIR to coalesce across processes on the host too.
+_course_flight = SingleFlight(os.getenv("COURSE_SINGLE_FLIGHT_LOCK_DIR") or None)
+
+def _generate_text(prompt, task, response_schema=None):
+    """
+    Send a single prompt to the model routed for a course generation task
+
+    Args:
+        prompt: The user prompt to send
+        task: Routing task ("outline" or "lesson", see model_router)
+        response_schema: JSON schema of the response, for structured output
+
+    Returns:
+        The raw response text
+    """
+    backend = get_backend()
+    return backend.generate(prompt, system_instruction=SYSTEM_PROMPT, model=route_model(task, backend), route=task,
+                            response_schema=response_schema if STRUCTURED_OUTPUT else None).text
+
+def _stream_text(prompt, task, response_schema=None):
+    """
+    Send a single prompt to the model routed for a course generation task and stream the answer
+
+    Args:
+        prompt: The user prompt to send
+        task: Routing task ("course", see model_router)
+        response_schema: JSON schema of the response, for structured output
+
+    Yields:
+        Response text chunks as they arrive
+    """
+    backend = get_backend()
+    yield from backend.stream(prompt, system_instruction=SYSTEM_PROMPT, model=route_model(task, backend), route=task,
+                              response_schema=response_schema if STRUCTURED_OUTPUT else None)
+
+def course_cache_key(topic, difficulty, additional_info=""):
+    """
+    Build the course cache key for a request under the current prompt and models
+    """
+    backend = get_backend()
+    models = ":".join(route_model(task, backend) for task in ("outline", "lesson", "course"))
+    return make_key(topic, difficulty, additional_info, f"{backend.name}:{models}:{PROMPT_VERSION}")
+
+def _cached_course(key):
+    """
+    Fetch a course from the shared cache, treating storage errors as a miss
+    """
+    try:
+        course = get_course_cache().get(key)
+    except sqlite3.Error:
+        course = None
+    get_metrics().inc("cache_lookups_total", cache="course", result="miss" if course is None else "hit")
+    return course
+
+def _store_course(key, course):
+    """
+    Save a complete course to the shared cache, ignoring storage errors
+    """
+    try:
+        get_course_cache().put(key, course)
+    except sqlite3.Error:
+        pass
+
+def _parse_json(response_text):
+    """
+    Parse a JSON model response, tolerating markdown code block markers
+
+    Args:
+        response_text: Raw response text from the model
+
+    Returns:
+        The parsed JSON object
+    """
+    response_text = response_text.strip()
+
+    # Remove any markdown code block markers if present
+    if response_text.startswith("```json"):
+        response_text = response_text.replace("```json", "", 1)
+    elif response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+
+    return json.loads(response_text.strip())
+
+def _read_course(response_text):
+    """
+    Parse a course response, salvaging what it can when the JSON is malformed
+
+    Args:
+        response_text: Raw response text from the model
+
+    Returns:
+        Tuple of the course dictionary and whether the response was complete;
+        a module cut off at the end of the response is kept with the lessons
+        that arrived whole
+    """
+    try:
+        course = _parse_json(response_text)
+    except ValueError:
+        course = None
+    if isinstance(course, dict) and isinstance(course.get("modules"), list):
+        return course, True
+
+    course, unfinished, complete = salvage_course(response_text)
+    if unfinished is not None and unfinished[1].get("lessons"):
+        course["modules"].append(unfinished[1])
+    get_metrics().inc("course_salvaged_total", complete=complete)
+    return course, complete
+
+def _is_text(value):
+    return isinstance(value, str) and bool(value.strip())
+
+def _check_module(module, with_content=False):
+    """
+    Drop the lessons of a parsed module that have no title and find what is missing
+
+    Args:
+        module: Module as parsed from a response
+        with_content: Whether lessons should have content
+
+    Returns:
+        None if the module is unusable (no title or no lesson left), otherwise
+        the indexes of its lessons without content
+    """
+    if not isinstance(module, dict):
+        return None
+    lessons = module.get("lessons")
+    module["lessons"] = [
+        lesson for lesson in (lessons if isinstance(lessons, list) else [])
+        if isinstance(lesson, dict) and _is_text(lesson.get("title"))
+    ]
+    if not _is_text(module.get("title")) or not module["lessons"]:
+        return None
+    if not with_content:
+        return []
+    return [index for index, lesson in enumerate(module["lessons"]) if not _is_text(lesson.get("content"))]
+
+def generate_course_outline(topic, difficulty, additional_info=""):
+    """
+    Generate the course outline (titles and module descriptions, no lesson content)
+
+    Args:
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+
+    Modules that do not parse are outlined again on their own and an
+    outline cut off early is topped up to MIN_MODULES modules, so only the
+    damaged part of the response is paid for twice. If a module cannot be
+    repaired it is left out and the outline is flagged "incomplete".
+
+    Returns:
+        Dictionary with the course structure; every lesson has a title only
+
+    Raises:
+        ValueError: If the response holds no usable module
+    """
+    user_prompt = f"""
+    Create the outline of a comprehensive, educational course on "{topic}" at a {difficulty} level.
+
+    Additional requirements: {additional_info}
+
+    Structure the course with the following components:
+    1. A course title
+    2. 5-7 modules (main topics), each with a short description
+    3. 5-8 lessons per module, each with a clear, descriptive title
+
+    Do NOT write the lesson content yet, only the titles.
+
+    Format the response as a structured JSON object with the following format:
+    {{
+      "title": "Course Title",
+      "difficulty": "Difficulty Level",
+      "modules": [
+        {{
+          "title": "Module Title",
+          "description": "Module description",
+          "lessons": [
+            {{
+              "title": "Lesson Title"
+            }}
+          ]
+        }}
+      ]
+    }}
+
+    IMPORTANT: Your entire response must be valid JSON only, with no other text before or after.
+    """
+
+    outline, complete = _read_course(_generate_text(user_prompt, "outline", OUTLINE_SCHEMA))
+    broken = [index for index, module in enumerate(outline["modules"]) if _check_module(module) is None]
+    # A response cut off early is topped up below, even if no module of it survived
+    if complete and len(broken) == len(outline["modules"]):
+        raise ValueError("the response contained no usable module")
+    if broken or not complete:
+        _, failed = repair_course(outline, topic, difficulty, additional_info, broken=broken, complete=complete)
+        if failed:
+            outline["incomplete"] = True
+    if not outline["modules"]:
+        raise ValueError("the response contained no usable module")
+    outline.setdefault("difficulty", difficulty)
+    return outline
+
+def generate_module_outline(course, module_index, topic, difficulty, additional_info=""):
+    """
+    Generate the outline of a single module, using the rest of the course for context
+
+    Args:
+        course: Course or outline the module belongs to
+        module_index: Zero-based index of the module (may be one past the last module)
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+
+    Returns:
+        Module dictionary with a title, description and lesson titles
+
+    Raises:
+        ValueError: If the response holds no usable module
+    """
+    other_modules = "\n".join(
+        f"{index}. {module['title']}" for index, module in enumerate(course["modules"], 1)
+        # Parsed modules may be anything; course records and dictionaries have get
+        if index != module_index + 1 and hasattr(module, "get") and _is_text(module.get("title"))
+        and module.get("lessons")
+    )
+
+    user_prompt = f"""
+    You are planning one module of the course "{course['title']}" on "{topic}" at a {difficulty} level.
+
+    Additional requirements: {additional_info}
+
+    Other modules of the course:
+    {other_modules}
+
+    Write the outline of module {module_index + 1}, so that it fits between its neighbours without
+    repeating them. Give it a short description and 5-8 lessons, each with a clear, descriptive title.
+
+    Do NOT write the lesson content yet, only the titles.
+
+    Format the response as a structured JSON object with the following format:
+    {{
+      "title": "Module Title",
+      "description": "Module description",
+      "lessons": [
+        {{
+          "title": "Lesson Title"
+        }}
+      ]
+    }}
+
+    IMPORTANT: Your entire response must be valid JSON only, with no other text before or after.
+    """
+
+    response_text = _generate_text(user_prompt, "outline", MODULE_SCHEMA)
+    try:
+        module = _parse_json(response_text)
+    except ValueError:
+        # Read the module as the only one of a course to keep the lessons that parse
+        salvaged, unfinished, _ = salvage_course('{"modules": [' + response_text[response_text.find("{"):])
+        module = salvaged["modules"][0] if salvaged["modules"] else unfinished and unfinished[1]
+    if _check_module(module) is None:
+        raise ValueError("the response contained no usable module")
+    return module
+
+def repair_course(course, topic, difficulty, additional_info="", broken=(), missing=(), complete=True,
+                  with_content=False, max_workers=None):
+    """
+    Regenerate the broken and missing parts of a parsed course in place
+
+    Everything that parsed is kept. Broken modules are outlined again from
+    the rest of the course and a course whose response was cut off is
+    topped up to MIN_MODULES modules. With with_content, the lessons of
+    those modules and the lessons in missing are then written concurrently.
+    A module that cannot be outlined again is dropped from an outline and
+    replaced by an error module in a full course.
+
+    Args:
+        course: Course dictionary to repair
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+        broken: Indexes of the modules to outline again
+        missing: (module_index, lesson_index) positions of lessons to write again
+        complete: Whether the response ended normally
+        with_content: Whether lessons need content (False for outlines)
+        max_workers: Maximum number of concurrent lesson requests
+            (defaults to MAX_CONCURRENT_LESSONS)
+
+    Returns:
+        Tuple of the number of modules and lessons regenerated and the number that failed
+    """
+    if not _is_text(course.get("title")):
+        course["title"] = f"Course on {topic}"
+    modules = course["modules"]
+    rewrite = list(broken)
+    if not complete:
+        while len(modules) < MIN_MODULES:
+            rewrite.append(len(modules))
+            modules.append({"title": f"Module {len(modules) + 1}", "description": "", "lessons": []})
+
+    repaired, failed, dropped = [], [], []
+    positions = list(missing)
+    for module_index in rewrite:
+        with get_tracer().span("course.repair", piece="module", module=module_index + 1) as span:
+            try:
+                module = generate_module_outline(course, module_index, topic, difficulty, additional_info)
+            except Exception as e:
+                span.set(error=type(e).__name__)
+                get_metrics().inc("course_repairs_total", piece="module", result="failed")
+                failed.append(module_index)
+                if with_content:
+                    modules[module_index] = _module_error(module_index, e)
+                else:
+                    dropped.append(module_index)
+                continue
+        get_metrics().inc("course_repairs_total", piece="module", result="ok")
+        if with_content:
+            for lesson in module["lessons"]:
+                lesson["content"] = PENDING_LESSON
+            positions.extend((module_index, lesson_index) for lesson_index in range(len(module["lessons"])))
+        modules[module_index] = module
+        repaired.append(module_index)
+
+    # Only outlines drop modules, so no lesson position refers to them
+    for module_index in reversed(dropped):
+        del modules[module_index]
+
+    def write_lesson(position):
+        module_index, lesson_index = position
+        lesson = modules[module_index]["lessons"][lesson_index]
+        with get_tracer().span("course.repair", piece="lesson", module=module_index + 1,
+                               lesson=lesson_index + 1) as span:
+            try:
+                lesson["content"] = generate_lesson_content(
+                    course, module_index, lesson_index, topic, difficulty, additional_info
+                )
+            except Exception as e:
+                span.set(error=type(e).__name__)
+                get_metrics().inc("course_repairs_total", piece="lesson", result="failed")
+                lesson["content"] = _lesson_error(e)
+                failed.append(position)
+                return
+        get_metrics().inc("course_repairs_total", piece="lesson", result="ok")
+        repaired.append(position)
+
+    if positions:
+        with ThreadPoolExecutor(max_workers=max_workers or MAX_CONCURRENT_LESSONS) as executor:
+            list(executor.map(write_lesson, positions))
+
+    return len(repaired), len(failed)
+
+def generate_lesson_content(outline, module_index, lesson_index, topic, difficulty, additional_info=""):
     """
-    Generate a complete course structure and content using Google AI
-    
+    Generate the body of a single lesson, using the course outline for context
+
     Args:
+        outline: Course outline as returned by generate_course_outline
+        module_index: Zero-based index of the module
+        lesson_index: Zero-based index of the lesson within the module
         topic: The main course topic
         difficulty: Difficulty level (Beginner, Intermediate, Advanced)
         additional_info: Optional additional context for course customization
-    
+
+    Returns:
+        The lesson content as markdown text
+    """
+    module = outline["modules"][module_index]
+    lesson = module["lessons"][lesson_index]
+    module_lessons = "\n".join(
+        f"{i}. {other['title']}" for i, other in enumerate(module["lessons"], 1)
+    )
+
+    user_prompt = f"""
+    You are writing one lesson of the course "{outline['title']}" on "{topic}" at a {difficulty} level.
+
+    Additional requirements: {additional_info}
+
+    Module {module_index + 1}: {module['title']}
+    Module description: {module.get('description', '')}
+
+    Lessons in this module:
+    {module_lessons}
+
+    Write lesson {lesson_index + 1}: "{lesson['title']}".
+
+    Provide:
+    - Comprehensive educational content (300-500 words)
+    - Key concepts and takeaways
+    - Examples or practical applications when relevant
+
+    Respond with the lesson content only, formatted as markdown, without repeating the lesson title.
+    """
+
+    return _generate_text(user_prompt, "lesson").strip()
+
+def _error_course(topic, difficulty, error):
+    """
+    Build a basic course structure describing a generation error
+    """
+    return {
+        "title": f"Error generating course on {topic}",
+        "difficulty": difficulty,
+        "topic": topic,
+        "modules": [
+            {
+                "title": "Error Module",
+                "description": "An error occurred while generating the course content.",
+                "lessons": [
+                    {
+                        "title": "Error Information",
+                        "content": f"We encountered an error while generating your course: {str(error)}. Please try again with a different topic or check your API key configuration."
+                    }
+                ]
+            }
+        ]
+    }
+
+def _lesson_error(error):
+    """
+    Build the placeholder content shown for a lesson that failed to generate
+    """
+    return f"We encountered an error while generating this lesson: {str(error)}. Please try again later."
+
+def _module_error(module_index, error):
+    """
+    Build the placeholder module shown for a module that failed to generate
+    """
+    return {
+        "title": f"Module {module_index + 1}",
+        "description": "An error occurred while generating this module.",
+        "lessons": [{"title": "Error Information", "content": _lesson_error(error)}]
+    }
+
+def generate_course_content(topic, difficulty, additional_info="", max_workers=None, use_cache=True):
+    """
+    Generate a complete course structure and content using the configured language model
+
+    The outline is requested first, then every lesson body is generated
+    concurrently with at most max_workers requests in flight. Complete
+    courses are stored in the shared course cache and reused for requests
+    with the same normalized topic, difficulty and additional information.
+    Concurrent identical requests wait for a single generation.
+
+    Args:
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+        max_workers: Maximum number of concurrent lesson requests
+            (defaults to MAX_CONCURRENT_LESSONS)
+        use_cache: Whether to read from and write to the course cache
+
     Returns:
         Dictionary containing the course structure and content
     """
+    with get_tracer().span("course.generate", topic=topic, difficulty=difficulty) as span:
+        key = course_cache_key(topic, difficulty, additional_info)
+        if use_cache:
+            cached = _cached_course(key)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        def generate():
+            course, complete = _generate_full_course(topic, difficulty, additional_info, max_workers)
+            span.set(complete=complete)
+            if use_cache and complete:
+                _store_course(key, course)
+            return course
+
+        recheck = (lambda: _cached_course(key)) if use_cache else None
+        course, produced = _course_flight.do(key, generate, recheck)
+        span.set(shared=not produced)
+
+        # Callers sharing another session's generation get their own copy
+        return course if produced else copy.deepcopy(course)
+
+def _generate_full_course(topic, difficulty, additional_info, max_workers):
+    """
+    Generate the outline and all lesson bodies of a course
+
+    Returns:
+        Tuple of the course dictionary and whether every part was generated
+    """
+    with get_tracer().span("course.outline") as span:
+        try:
+            outline = generate_course_outline(topic, difficulty, additional_info)
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            return _error_course(topic, difficulty, e), False
+
+    # Keep the request around so single lessons and modules can be rewritten later;
+    # the model may report another difficulty than the one asked for
+    outline["topic"] = topic
+    outline["requested_difficulty"] = difficulty
+    outline["additional_info"] = additional_info
+    failures = []
+
+    def fill_lesson(position):
+        module_index, lesson_index = position
+        lesson = outline["modules"][module_index]["lessons"][lesson_index]
+        with get_tracer().span("course.lesson", module=module_index + 1, lesson=lesson_index + 1) as span:
+            try:
+                lesson["content"] = generate_lesson_content(
+                    outline, module_index, lesson_index, topic, difficulty, additional_info
+                )
+            except Exception as e:
+                # Keep the rest of the course if a single lesson fails
+                span.set(error=type(e).__name__)
+                lesson["content"] = _lesson_error(e)
+                failures.append(position)
+
+    positions = [
+        (module_index, lesson_index)
+        for module_index, module in enumerate(outline["modules"])
+        for lesson_index in range(len(module["lessons"]))
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_CONCURRENT_LESSONS) as executor:
+        list(executor.map(fill_lesson, positions))
+
+    return outline, not failures and not outline.pop("incomplete", False)
+
+# Prefetch workers and in-flight lesson generations for lazy courses
+_prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+_pending_lessons = {}
+_pending_lock = threading.Lock()
+
+def generate_lazy_course(topic, difficulty, additional_info="", use_cache=True):
+    """
+    Generate a course whose lessons are outline stubs, written on first access
+
+    Lesson content is left as None and filled in by ensure_lesson_content.
+    If the complete course is already cached it is returned instead.
+
+    Args:
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+        use_cache: Whether to look for the complete course in the course cache
+
+    Returns:
+        Dictionary containing the course structure with stub lessons
+    """
+    if use_cache:
+        cached = _cached_course(course_cache_key(topic, difficulty, additional_info))
+        if cached is not None:
+            return cached
+
+    with get_tracer().span("course.outline", topic=topic, difficulty=difficulty) as span:
+        try:
+            outline, _ = _course_flight.do(
+                "outline:" + course_cache_key(topic, difficulty, additional_info),
+                lambda: generate_course_outline(topic, difficulty, additional_info)
+            )
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            return _error_course(topic, difficulty, e)
+
+    # Every session fills in its own copy of the shared outline
+    course = copy.deepcopy(outline)
+    for module in course["modules"]:
+        for lesson in module["lessons"]:
+            lesson["content"] = None
+
+    # Keep the request around so lessons can be generated later
+    course["lazy"] = True
+    course["topic"] = topic
+    course["requested_difficulty"] = difficulty
+    course["additional_info"] = additional_info
+    return course
+
+def _materialize_lesson(course, module_index, lesson_index):
+    """
+    Generate and store the content of one lazy lesson
+    """
+    lesson = course["modules"][module_index]["lessons"][lesson_index]
+    with get_tracer().span("course.lesson", module=module_index + 1, lesson=lesson_index + 1) as span:
+        try:
+            lesson["content"] = generate_lesson_content(course, module_index, lesson_index, *_course_request(course))
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            lesson["content"] = _lesson_error(e)
+        finally:
+            with _pending_lock:
+                _pending_lessons.pop(id(lesson), None)
+    return lesson["content"]
+
+def _prefetch_lesson(course, module_index, lesson_index):
+    """
+    Queue a lazy lesson on the prefetch workers unless it is already written or in flight
+    """
+    lesson = course["modules"][module_index]["lessons"][lesson_index]
+    with _pending_lock:
+        if lesson.get("content") is None and id(lesson) not in _pending_lessons:
+            _pending_lessons[id(lesson)] = _prefetch_executor.submit(
+                _materialize_lesson, course, module_index, lesson_index
+            )
+
+def _claim_lesson(course, module_index, lesson_index):
+    """
+    Take over a lazy lesson for the calling thread
+
+    A prefetch of the lesson that is still waiting for a worker is cancelled
+    so the lesson does not queue behind other prefetches.
+
+    Returns:
+        (future, claimed): the future that completes with the content and
+        whether the caller has to write the lesson itself; future is None if
+        the content already exists
+    """
+    lesson = course["modules"][module_index]["lessons"][lesson_index]
+    with _pending_lock:
+        if lesson.get("content") is not None:
+            return None, False
+        future = _pending_lessons.get(id(lesson))
+        if future is not None and not future.cancel():
+            return future, False
+        future = Future()
+        _pending_lessons[id(lesson)] = future
+        return future, True
+
+def _following_positions(course, module_index, lesson_index, count):
+    """
+    List the next count lesson positions in reading order, across modules
+    """
+    positions = []
+    m, l = module_index, lesson_index + 1
+    while m < len(course["modules"]) and len(positions) < count:
+        if l < len(course["modules"][m]["lessons"]):
+            positions.append((m, l))
+            l += 1
+        else:
+            m, l = m + 1, 0
+    return positions
+
+def ensure_lesson_content(course, module_index, lesson_index, prefetch=None):
+    """
+    Return a lesson's content, generating it first if the course is lazy
+
+    The lesson itself is written in the calling thread (or awaited if a
+    prefetch is already writing it), and the next lessons in reading order
+    are queued for background generation so that moving on to them does not
+    wait on the model.
+
+    Args:
+        course: Course dictionary (eager or lazy)
+        module_index: Zero-based index of the module
+        lesson_index: Zero-based index of the lesson within the module
+        prefetch: Number of upcoming lessons to prefetch
+            (defaults to PREFETCH_LESSONS)
+
+    Returns:
+        The lesson content
+    """
+    lesson = course["modules"][module_index]["lessons"][lesson_index]
+    if not course.get("lazy"):
+        return lesson["content"]
+
+    future, claimed = _claim_lesson(course, module_index, lesson_index)
+
+    count = PREFETCH_LESSONS if prefetch is None else prefetch
+    for m, l in _following_positions(course, module_index, lesson_index, count):
+        _prefetch_lesson(course, m, l)
+
+    if claimed:
+        future.set_result(_materialize_lesson(course, module_index, lesson_index))
+    elif future is not None:
+        future.result()
+    return lesson["content"]
+
+def _previous_position(course, module_index, lesson_index):
+    """
+    Position of the lesson before a lesson in reading order, across modules, or None
+    """
+    if lesson_index > 0:
+        return module_index, lesson_index - 1
+    for m in range(module_index - 1, -1, -1):
+        if course["modules"][m]["lessons"]:
+            return m, len(course["modules"][m]["lessons"]) - 1
+    return None
+
+def _excerpt(text, words=80, end=False):
+    """
+    First (or, with end, last) words of a lesson
+    """
+    parts = text.split()
+    if len(parts) <= words:
+        return text.strip()
+    return "... " + " ".join(parts[-words:]) if end else " ".join(parts[:words]) + " ..."
+
+def _course_request(course):
+    """
+    Topic, difficulty and additional information a course was generated for
+
+    These are the values the learner asked for, which make up the course
+    cache key; courses from before the request was kept fall back to their
+    title and the difficulty the model reported.
+    """
+    difficulty = course.get("requested_difficulty") or course.get("difficulty") or "Beginner"
+    return course.get("topic") or course["title"], difficulty, course.get("additional_info") or ""
+
+def _update_cached_module(course, module_index):
+    """
+    Write one rewritten module into the course cache entry of its course, if there is one
+    """
+    module = course["modules"][module_index]
+    if course.get("lazy") or not course.get("topic") or any(lesson["content"] is None for lesson in module["lessons"]):
+        # Only complete courses are cached
+        return
     try:
-        # Setup the model
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Prepare system prompt for course generation
-        system_prompt = "You are an expert course creator specializing in educational content."
-        
-        # Prepare user prompt for course generation
-        user_prompt = f"""
-        Create a comprehensive, educational course on "{topic}" at a {difficulty} level.
-        
-        Additional requirements: {additional_info}
-        
-        Structure the course with the following components:
-        1. A course title
-        2. 5-7 modules (main topics)
-        3. 5-8 lessons per module
-        4. Detailed content for each lesson
-        
-        For each lesson, provide:
-        - A clear, descriptive title
-        - Comprehensive educational content (300-500 words)
-        - Key concepts and takeaways
-        - Examples or practical applications when relevant
-        
-        Format the response as a structured JSON object with the following format:
+        get_course_cache().update_module(course_cache_key(*_course_request(course)), module_index, {
+            "title": module["title"],
+            "description": module.get("description", ""),
+            "lessons": [{"title": lesson["title"], "content": lesson["content"]} for lesson in module["lessons"]]
+        })
+    except sqlite3.Error:
+        pass
+
+def _update_cached_lesson(course, module_index, lesson_index):
+    """
+    Write one rewritten lesson into the course cache entry of its course, if there is one
+
+    Only that lesson is written, so bodies a restored course has not loaded
+    yet are never stored in place of the cached ones.
+    """
+    if course.get("lazy") or not course.get("topic"):
+        return
+    lesson = course["modules"][module_index]["lessons"][lesson_index]
+    try:
+        get_course_cache().update_lesson(course_cache_key(*_course_request(course)), module_index, lesson_index,
+                                         lesson["title"], lesson["content"])
+    except sqlite3.Error:
+        pass
+
+def regenerate_lesson(course, module_index, lesson_index):
+    """
+    Write one lesson of a course again, in place
+
+    The request carries the course outline, the end of the previous lesson
+    and the start of the next one, so the new version fits between them,
+    and the start of the current version so it is not repeated. The cached
+    course, if any, is updated with the new lesson only. If the model call
+    fails, its error is raised and the lesson keeps its current content.
+
+    Args:
+        course: Course dictionary or compact Course
+        module_index: Zero-based index of the module
+        lesson_index: Zero-based index of the lesson within the module
+
+    Returns:
+        The new lesson content
+    """
+    topic, difficulty, additional_info = _course_request(course)
+    module = course["modules"][module_index]
+    lesson = module["lessons"][lesson_index]
+
+    course_modules = "\n".join(f"{i}. {other['title']}" for i, other in enumerate(course["modules"], 1))
+    module_lessons = "\n".join(f"{i}. {other['title']}" for i, other in enumerate(module["lessons"], 1))
+    neighbours = []
+    previous = _previous_position(course, module_index, lesson_index)
+    following = _following_positions(course, module_index, lesson_index, 1)
+    for position, label, end in ((previous, "previous", True), (following[0] if following else None, "next", False)):
+        if position is None:
+            continue
+        other = course["modules"][position[0]]["lessons"][position[1]]
+        if other.get("content"):
+            verb = "ends" if end else "begins"
+            neighbours.append(f"The {label} lesson, \"{other['title']}\", {verb}:\n{_excerpt(other['content'], end=end)}")
+    if lesson.get("content"):
+        neighbours.append(f"The current version of this lesson, which the learner wants replaced, begins:\n"
+                          f"{_excerpt(lesson['content'])}")
+    context = "\n\n".join(neighbours)
+
+    user_prompt = f"""
+    You are rewriting one lesson of the course "{course['title']}" on "{topic}" at a {difficulty} level.
+
+    Additional requirements: {additional_info}
+
+    Modules of the course:
+    {course_modules}
+
+    Module {module_index + 1}: {module['title']}
+    Module description: {module.get('description', '')}
+
+    Lessons in this module:
+    {module_lessons}
+
+    {context}
+
+    Write lesson {lesson_index + 1}: "{lesson['title']}" again. Continue from the previous lesson, lead into the
+    next one and take a different approach from the current version.
+
+    Provide:
+    - Comprehensive educational content (300-500 words)
+    - Key concepts and takeaways
+    - Examples or practical applications when relevant
+
+    Respond with the lesson content only, formatted as markdown, without repeating the lesson title.
+    """
+
+    with get_tracer().span("course.regenerate", piece="lesson", module=module_index + 1, lesson=lesson_index + 1):
+        content = _generate_text(user_prompt, "lesson").strip()
+    lesson["content"] = content
+    get_metrics().inc("course_regenerations_total", piece="lesson")
+    _update_cached_lesson(course, module_index, lesson_index)
+    return content
+
+def regenerate_module(course, module_index, max_workers=None):
+    """
+    Outline one module of a course again and write its lessons, in place
+
+    The module is outlined from the rest of the course (see
+    generate_module_outline) and its lessons are written concurrently;
+    lessons of lazy courses are left to be written when opened. The old
+    module stays in place until the new one is done. The cached course,
+    if any, is updated with the new module only.
+
+    Args:
+        course: Course dictionary or compact Course
+        module_index: Zero-based index of the module
+        max_workers: Maximum number of concurrent lesson requests
+            (defaults to MAX_CONCURRENT_LESSONS)
+
+    Returns:
+        The new module dictionary
+
+    Raises:
+        ValueError: If the response holds no usable module
+    """
+    topic, difficulty, additional_info = _course_request(course)
+    with get_tracer().span("course.regenerate", piece="module", module=module_index + 1) as span:
+        module = generate_module_outline(course, module_index, topic, difficulty, additional_info)
+        # Lessons are written against a copy of the course that already holds the new module
+        draft = {"title": course["title"], "modules": list(course["modules"])}
+        draft["modules"][module_index] = module
+        failures = []
+
+        def write_lesson(lesson_index):
+            lesson = module["lessons"][lesson_index]
+            try:
+                lesson["content"] = generate_lesson_content(
+                    draft, module_index, lesson_index, topic, difficulty, additional_info
+                )
+            except Exception as e:
+                lesson["content"] = _lesson_error(e)
+                failures.append(lesson_index)
+
+        if course.get("lazy"):
+            for lesson in module["lessons"]:
+                lesson["content"] = None
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers or MAX_CONCURRENT_LESSONS) as executor:
+                list(executor.map(write_lesson, range(len(module["lessons"]))))
+        span.set(lessons=len(module["lessons"]), failed=len(failures))
+
+    course["modules"][module_index] = module
+    get_metrics().inc("course_regenerations_total", piece="module")
+    if not failures:
+        _update_cached_module(course, module_index)
+    return module
+
+def stream_course_content(topic, difficulty, additional_info=""):
+    """
+    Generate a complete course in a single streamed response
+
+    The response is parsed incrementally, so every lesson and module is
+    reported as soon as its JSON object is complete. Malformed objects are
+    salvaged rather than ending the stream (see IncrementalCourseParser),
+    and when the response breaks off, the module it was writing is reported
+    with the lessons that did arrive before the error is raised.
+
+    Args:
+        topic: The main course topic
+        difficulty: Difficulty level (Beginner, Intermediate, Advanced)
+        additional_info: Optional additional context for course customization
+
+    Yields:
+        Parser events: ("field", key, value), ("lesson", module_index,
+        lesson_index, lesson) and ("module", module_index, module)
+    """
+    user_prompt = f"""
+    Create a comprehensive, educational course on "{topic}" at a {difficulty} level.
+
+    Additional requirements: {additional_info}
+
+    Structure the course with the following components:
+    1. A course title
+    2. 5-7 modules (main topics)
+    3. 5-8 lessons per module
+    4. Detailed content for each lesson
+
+    For each lesson, provide:
+    - A clear, descriptive title
+    - Comprehensive educational content (300-500 words)
+    - Key concepts and takeaways
+    - Examples or practical applications when relevant
+
+    Format the response as a structured JSON object with the following format:
+    {{
+      "title": "Course Title",
+      "difficulty": "Difficulty Level",
+      "modules": [
         {{
-          "title": "Course Title",
-          "difficulty": "Difficulty Level",
-          "modules": [
+          "title": "Module Title",
+          "description": "Module description",
+          "lessons": [
             {{
-              "title": "Module Title",
-              "description": "Module description",
-              "lessons": [
-                {{
-                  "title": "Lesson Title",
-                  "content": "Detailed lesson content..."
-                }}
-              ]
+              "title": "Lesson Title",
+              "content": "Detailed lesson content..."
             }}
           ]
         }}
-        
-        IMPORTANT: Your entire response must be valid JSON only, with no other text before or after.
-        """
-        
-        # Start a chat and generate the course content
-        chat = model.start_chat(history=[])
-        chat.send_message(system_prompt)
-        response = chat.send_message(user_prompt)
-        
-        # Extract and clean the JSON response
-        response_text = response.text
-        
-        # Remove any markdown code block markers if present
-        if response_text.startswith("```json"):
-            response_text = response_text.replace("```json", "", 1)
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        # Try to find and extract JSON content if not properly formatted
-        response_text = response_text.strip()
-        
-        # Parse and return the course data
-        return json.loads(response_text)
-    
-    except Exception as e:
-        # Return a basic error course structure
-        return {
-            "title": f"Error generating course on {topic}",
+      ]
+    }}
+
+    IMPORTANT: Your entire response must be valid JSON only, with no other text before or after.
+    """
+
+    parser = IncrementalCourseParser(tolerant=True)
+    try:
+        for chunk in _stream_text(user_prompt, "course", COURSE_SCHEMA):
+            for event in parser.feed(chunk):
+                yield event
+    except Exception:
+        yield from _unfinished_module(parser)
+        raise
+
+    if not parser.finished:
+        yield from _unfinished_module(parser)
+        raise ValueError("the response ended before the course was complete")
+
+def _unfinished_module(parser):
+    """
+    Report the module a broken-off response was writing, if any of its lessons arrived
+    """
+    unfinished = parser.unfinished_module()
+    if unfinished is not None and unfinished[1].get("lessons"):
+        yield ("module",) + unfinished
+
+class CourseStream:
+    """
+    A course that is filled in by a background streaming generation
+
+    course is a regular course dictionary whose "modules" list grows as the
+    response arrives; its "streaming" flag stays True until generation ends.
+    Lessons that arrive broken show PENDING_LESSON and, once the response
+    has ended, they, broken modules and the modules a cut-off response
+    never reached are generated again with repair_course. Cached courses
+    are shown at once and complete courses are cached.
+
+    Args:
+        use_cache: Whether to read from and write to the course cache
+    """
+
+    def __init__(self, topic, difficulty, additional_info="", use_cache=True):
+        self.topic = topic
+        self.difficulty = difficulty
+        self.additional_info = additional_info
+        self.use_cache = use_cache
+        self.course = {
+            "title": f"Course on {topic}",
             "difficulty": difficulty,
-            "modules": [
-                {
-                    "title": "Error Module",
-                    "description": "An error occurred while generating the course content.",
-                    "lessons": [
-                        {
-                            "title": "Error Information",
-                            "content": f"We encountered an error while generating your course: {str(e)}. Please try again with a different topic or check your API key configuration."
-                        }
-                    ]
-                }
-            ]
+            "modules": [],
+            "streaming": True,
+            "topic": topic,
+            "requested_difficulty": difficulty,
+            "additional_info": additional_info
         }
+        self.lessons_received = 0
+        self.error = None
+        self._first_module = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        key = course_cache_key(self.topic, self.difficulty, self.additional_info)
+        cached = _cached_course(key) if self.use_cache else None
+        if cached is not None:
+            self.course.update(cached)
+            self.course["streaming"] = False
+            self._first_module.set()
+            return
+
+        with get_tracer().span("course.stream", topic=self.topic, difficulty=self.difficulty) as span:
+            broken, missing = [], []
+            try:
+                for event in stream_course_content(self.topic, self.difficulty, self.additional_info):
+                    if event[0] == "field" and event[1] in ("title", "difficulty"):
+                        self.course[event[1]] = event[2]
+                    elif event[0] == "lesson":
+                        self.lessons_received += 1
+                    elif event[0] == "module":
+                        self._add_module(event[2], broken, missing)
+                        self._first_module.set()
+            except Exception as e:
+                self.error = e
+                span.set(error=type(e).__name__)
+
+            try:
+                # Keep whatever modules arrived and generate only the rest again
+                complete = self.error is None and not broken and not missing
+                if self.course["modules"] and not complete:
+                    repaired, failed = repair_course(self.course, self.topic, self.difficulty, self.additional_info,
+                                                     broken, missing, complete=self.error is None, with_content=True)
+                    span.set(repaired=repaired, repair_failed=failed)
+                    complete = not failed
+                if self.use_cache and complete and self.course["modules"]:
+                    _store_course(key, {name: value for name, value in self.course.items() if name != "streaming"})
+            finally:
+                if not self.course["modules"]:
+                    self.course.update(_error_course(self.topic, self.difficulty,
+                                                     self.error or "the response contained no complete module"))
+                self.course["streaming"] = False
+                self._first_module.set()
+                span.set(modules=len(self.course["modules"]), lessons=self.lessons_received)
+
+    def _add_module(self, module, broken, missing):
+        """
+        Show a streamed module, noting what repair_course has to generate again
+        """
+        module_index = len(self.course["modules"])
+        lessons = _check_module(module, with_content=True)
+        if lessons is None:
+            broken.append(module_index)
+            module = {"title": f"Module {module_index + 1}", "description": "", "lessons": []}
+        for lesson_index in lessons or []:
+            module["lessons"][lesson_index]["content"] = PENDING_LESSON
+            missing.append((module_index, lesson_index))
+        self.course["modules"].append(module)
+
+    def wait(self, timeout=None):
+        """
+        Block until generation, repairs included, has ended
+        """
+        self._thread.join(timeout)
+
+    def wait_for_first_module(self, timeout=None):
+        """
+        Block until the first module is available or generation has ended
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            True if the course has at least one module to show
+        """
+        self._first_module.wait(timeout)
+        return bool(self.course["modules"])
@@ -0,0 +1,199 @@
+import sys
+import hashlib
+import threading
+import weakref
+
+class _Body:
+    """
+    A lesson body shared by every course that contains the same text
+    """
+
+    __slots__ = ("text", "__weakref__")
+
+    def __init__(self, text):
+        self.text = text
+
+class ContentStore:
+    """
+    Process-wide store of lesson bodies, keyed by content hash
+
+    Sessions showing the same course point at one copy of each lesson body.
+    Bodies are held weakly and disappear once no course refers to them.
+    """
+
+    def __init__(self):
+        self._bodies = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def intern(self, text):
+        """
+        Return the shared body for a text, adding it if it is new
+
+        Args:
+            text: Lesson content
+
+        Returns:
+            The shared body holding the text
+        """
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                body = _Body(text)
+                self._bodies[key] = body
+            return body
+
+    def stats(self):
+        """
+        Report the bodies currently held
+
+        Returns:
+            Dictionary with entries and characters
+        """
+        with self._lock:
+            bodies = list(self._bodies.values())
+        return {"entries": len(bodies), "characters": sum(len(body.text) for body in bodies)}
+
+_content_store = ContentStore()
+
+def get_content_store():
+    """
+    Return the process-wide content store
+    """
+    return _content_store
+
+def _intern(text):
+    return sys.intern(text) if isinstance(text, str) else text
+
+class _Record:
+    """
+    Slotted record that can be read and written like the course dictionaries
+
+    Only the names in _fields are accepted; a field set to None counts as
+    missing for get, keys and the in operator.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self._fields else None
+        return default if value is None else value
+
+    def keys(self):
+        return [key for key in self._fields if getattr(self, key) is not None]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+class Lesson(_Record):
+    """
+    Lesson with an interned title and a body held in the content store
+    """
+
+    __slots__ = ("title", "_body")
+    _fields = ("title", "content")
+
+    def __init__(self, title, content=None):
+        self.title = _intern(title)
+        self.content = content
+
+    @property
+    def content(self):
+        return None if self._body is None else self._body.text
+
+    @content.setter
+    def content(self, text):
+        self._body = None if text is None else _content_store.intern(text)
+
+class Module(_Record):
+    """
+    Module with interned title and description
+    """
+
+    __slots__ = ("title", "description", "lessons")
+    _fields = ("title", "description", "lessons")
+
+    def __init__(self, title, description=None, lessons=None):
+        self.title = _intern(title)
+        self.description = _intern(description)
+        self.lessons = lessons or []
+
+class Course(_Record):
+    """
+    Course with the generation settings that lazy and streamed courses keep
+    """
+
+    __slots__ = ("title", "difficulty", "modules", "lazy", "streaming", "topic", "requested_difficulty",
+                 "additional_info")
+    _fields = ("title", "difficulty", "modules", "lazy", "streaming", "topic", "requested_difficulty",
+               "additional_info")
+
+    def __init__(self, title, difficulty=None, modules=None, lazy=None, streaming=None, topic=None,
+                 requested_difficulty=None, additional_info=None):
+        self.title = _intern(title)
+        self.difficulty = _intern(difficulty)
+        self.modules = modules or []
+        self.lazy = lazy
+        self.streaming = streaming
+        self.topic = topic
+        self.requested_difficulty = _intern(requested_difficulty)
+        self.additional_info = additional_info
+
+def compact_module(module):
+    """
+    Convert a module dictionary into a Module sharing lesson bodies
+
+    Args:
+        module: Module dictionary (or an already compact Module)
+
+    Returns:
+        A Module
+    """
+    if isinstance(module, Module):
+        return module
+    return Module(
+        module.get("title"),
+        module.get("description"),
+        [Lesson(lesson.get("title"), lesson.get("content")) for lesson in module.get("lessons", [])]
+    )
+
+def compact_course(course):
+    """
+    Convert a course dictionary into slotted records sharing lesson bodies
+
+    Titles are interned and lesson content goes through the process-wide
+    content store, so sessions on the same course hold one copy of its
+    text. Keys the app does not use are dropped.
+
+    Args:
+        course: Course dictionary (or an already compact Course)
+
+    Returns:
+        A Course
+    """
+    if isinstance(course, Course):
+        return course
+    return Course(
+        course.get("title"),
+        course.get("difficulty"),
+        [compact_module(module) for module in course.get("modules", [])],
+        lazy=course.get("lazy"),
+        streaming=course.get("streaming"),
+        topic=course.get("topic"),
+        requested_difficulty=course.get("requested_difficulty"),
+        additional_info=course.get("additional_info")
+    )
@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from resilience import DeadlineExceeded
+from telemetry import get_metrics
+
+# Percentile of recent first-token latencies after which a request is hedged
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+
+# Hedge delay until enough latencies have been observed, and its lower bound
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.05"))
+
+# Latencies kept for the percentile, and how many are needed before using it
+HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Threads running the upstream attempts of hedged calls
+HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-attempt")
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+class Hedger:
+    """
+    Runs upstream attempts under a deadline and hedges slow ones
+
+    A hedgeable attempt that has not produced its first result (the first
+    chunk of a stream, or a whole completion) after the HEDGE_PERCENTILE
+    latency of recent hedgeable attempts of the same kind gets a second,
+    identical attempt. Whichever answers first is used and the other is
+    discarded. Only hedgeable calls feed the latency windows and the request
+    stats, so long unhedged generations neither stretch the hedge delay nor
+    dilute the hedge rate. Hedged attempts run on a shared thread pool, so
+    the caller stops waiting at the deadline even when a provider call has
+    not returned yet. Unhedged attempts run in the calling thread and are
+    ended at the deadline by the provider request timeout.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, default_delay=HEDGE_DEFAULT_DELAY, min_delay=HEDGE_MIN_DELAY,
+                 window=HEDGE_WINDOW, min_samples=HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self._attempts = {}
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def hedge_delay(self, kind="default"):
+        """
+        Seconds to wait for an attempt of the given kind before hedging it
+
+        Args:
+            kind: Kind of call, for example the route and whether it streams
+        """
+        with self._lock:
+            attempts = self._attempts.get(kind, ())
+            if len(attempts) < self.min_samples:
+                return self.default_delay
+            return max(self.min_delay, _percentile(attempts, self.percentile))
+
+    def run(self, attempt, deadline=None, hedge=False, discard=None, kind="default"):
+        """
+        Run attempt, hedging it if it is slow, until the deadline
+
+        Args:
+            attempt: Function making one upstream attempt and returning its first result
+            deadline: time.monotonic() value by which a result is needed, or None
+            hedge: Whether a slow attempt may be hedged with a second one
+            discard: Optional function called with the result of a losing attempt
+                (for example to close its stream)
+            kind: Kind of call whose recent latencies set the hedge delay
+
+        Returns:
+            The result of the first successful attempt
+
+        Raises:
+            DeadlineExceeded: If no attempt succeeded before the deadline
+        """
+        start = time.monotonic()
+        if not hedge:
+            return self._run_in_caller(attempt, deadline, start)
+
+        def timed():
+            begun = time.monotonic()
+            result = attempt()
+            if hedge:
+                self._observe(kind, time.monotonic() - begun)
+            return result
+
+        primary = _executor.submit(timed)
+        pending = [primary]
+        hedged = False
+        error = None
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if hedge and not hedged:
+                delay = self.hedge_delay(kind) - (time.monotonic() - start)
+                timeout = max(0.0, delay) if timeout is None else min(timeout, max(0.0, delay))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                pending.remove(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                self._abandon(pending, discard)
+                self._finish(start, hedge, hedged, future is not primary)
+                return future.result()
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if hedge and not hedged and not done:
+                hedged = True
+                pending.append(_executor.submit(timed))
+
+        if not pending:
+            # Every attempt failed
+            self._finish(start, hedge, hedged, False, failed=True, deadline_exceeded=isinstance(error, DeadlineExceeded))
+            raise error
+        self._abandon(pending, discard)
+        self._finish(start, hedge, hedged, False, failed=True, deadline_exceeded=True)
+        raise DeadlineExceeded(f"no response from the model within {time.monotonic() - start:.1f}s")
+
+    def _run_in_caller(self, attempt, deadline, start):
+        # The attempt's request timeout is derived from the deadline, so an
+        # error once the deadline has passed means the model did not answer in time
+        try:
+            return attempt()
+        except DeadlineExceeded:
+            self._finish(start, False, False, False, failed=True, deadline_exceeded=True)
+            raise
+        except Exception as e:
+            if deadline is None or time.monotonic() < deadline:
+                raise
+            self._finish(start, False, False, False, failed=True, deadline_exceeded=True)
+            raise DeadlineExceeded(f"no response from the model within {time.monotonic() - start:.1f}s") from e
+
+    def _abandon(self, futures, discard):
+        # Losing attempts cannot be interrupted; drop their results when they finish
+        for future in futures:
+            if not future.cancel() and discard is not None:
+                future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+
+    def _observe(self, kind, latency):
+        with self._lock:
+            self._attempts.setdefault(kind, deque(maxlen=self.window)).append(latency)
+
+    def _finish(self, start, hedge, hedged, won_by_hedge, failed=False, deadline_exceeded=False):
+        with self._lock:
+            self._stats["deadline_exceeded"] += deadline_exceeded
+            if hedge:
+                self._stats["requests"] += 1
+                self._stats["hedged"] += hedged
+                self._stats["hedge_wins"] += won_by_hedge
+                self._stats["failed"] += failed
+                if not failed:
+                    self._latencies.append(time.monotonic() - start)
+        if hedged:
+            get_metrics().inc("llm_hedged_total", won="hedge" if won_by_hedge else "first")
+        if deadline_exceeded:
+            get_metrics().inc("llm_deadline_exceeded_total")
+
+    def stats(self):
+        """
+        Report the hedge rate and the latency of the first results
+
+        Returns:
+            Dictionary with the requests that could be hedged and how many were
+            hedged, hedge_wins, failed, hedge_rate, p50/p95/p99 of their recent
+            first-result latencies in seconds, hedge_delays by kind of call, and
+            deadline_exceeded over all calls run under a deadline
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = list(self._latencies)
+            kinds = list(self._attempts)
+        stats["hedge_rate"] = stats["hedged"] / stats["requests"] if stats["requests"] else 0.0
+        stats["hedge_delays"] = {kind: self.hedge_delay(kind) for kind in kinds}
+        for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            stats[name] = _percentile(latencies, fraction)
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failed": 0, "deadline_exceeded": 0}
+            self._latencies.clear()
@@ -0,0 +1,263 @@
+import json
+
+class IncrementalCourseParser:
+    """
+    Incremental parser for a course JSON document arriving in chunks
+
+    Feed it the raw response text piece by piece. Every time an object of
+    interest closes it is decoded and returned as an event:
+
+        ("field", key, value)                     top-level string fields
+        ("lesson", module_index, lesson_index, lesson)
+        ("module", module_index, module)
+
+    Any text before the first "{" (such as a ```json fence) is ignored.
+
+    A tolerant parser does not give up on malformed JSON. An object that
+    does not decode is rebuilt from the string fields that did (a module
+    also keeps its lessons), leaving out a value followed by unexpected
+    text, which is what an unescaped quote looks like. Raw line breaks
+    inside strings are accepted, and a top-level field is only reported
+    once the text after it shows the string really ended there.
+
+    Args:
+        tolerant: Whether to salvage malformed objects instead of raising ValueError
+    """
+
+    def __init__(self, tolerant=False):
+        self._tolerant = tolerant
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._stack = []
+        self._root = None
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    def feed(self, chunk):
+        """
+        Add a chunk of response text
+
+        Args:
+            chunk: The next piece of the response
+
+        Returns:
+            List of events completed by this chunk
+        """
+        self._text += chunk
+        events = []
+        text = self._text
+
+        while self._pos < len(text) and not self._finished:
+            char = text[self._pos]
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    continue
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string(events)
+                self._pos += 1
+                continue
+
+            if self._tolerant and self._stack and not char.isspace():
+                self._check_separator(char, events)
+            if char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in "{[":
+                self._open_container(char)
+            elif char in "}]":
+                self._close_container(events)
+            elif char == ":" and self._stack:
+                frame = self._stack[-1]
+                frame["key"] = frame["last_string"]
+                frame["expect_key"] = False
+            elif char == "," and self._stack:
+                frame = self._stack[-1]
+                if frame["kind"] == "{":
+                    frame["expect_key"] = True
+                else:
+                    frame["count"] += 1
+
+            self._pos += 1
+
+        return events
+
+    @property
+    def finished(self):
+        """
+        True once the top-level object has closed
+        """
+        return self._finished
+
+    @property
+    def fields(self):
+        """
+        Top-level string fields read so far, without those found damaged later
+        """
+        return dict(self._root["fields"]) if self._root is not None else {}
+
+    def unfinished_module(self):
+        """
+        The module that was still open where the text ends
+
+        Returns:
+            Tuple of the module index and the module built from its fields
+            and complete lessons so far, or None
+        """
+        if len(self._stack) < 3 or self._path()[:1] != ["modules"] or self._stack[2]["kind"] != "{":
+            return None
+        return self._stack[2]["name"], self._rebuild(self._stack[2])
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(self._text[start:end], strict=not self._tolerant)
+        except ValueError:
+            if not self._tolerant:
+                raise
+            return None
+
+    def _rebuild(self, frame):
+        """
+        Object made of the fields of a frame that decoded, for objects that did not
+        """
+        value = dict(frame["fields"])
+        if frame["lessons"]:
+            value["lessons"] = [frame["lessons"][index] for index in sorted(frame["lessons"])]
+        return value
+
+    def _check_separator(self, char, events):
+        """
+        Flag a value followed by something other than a separator as damaged,
+        and report a top-level field held back until now if it was not
+        """
+        frame = self._stack[-1]
+        held, frame["held"] = frame["held"], None
+        if frame["expect"] is not None and char not in frame["expect"]:
+            # The string ended early, most likely at an unescaped quote;
+            # the rest of it is not a value either
+            frame["fields"].pop(frame["value_key"], None)
+            frame["key"] = None
+        elif held is not None:
+            events.append(("field",) + held)
+        frame["expect"] = None
+
+    def _value_done(self):
+        """
+        Record that a value ended in the innermost container
+        """
+        frame = self._stack[-1]
+        frame["expect"] = ",}" if frame["kind"] == "{" else ",]"
+        frame["value_key"] = frame["key"] if frame["kind"] == "{" else None
+
+    def _child_key(self):
+        """
+        Key (object) or index (array) that the next value takes in its parent
+        """
+        if not self._stack:
+            return None
+        parent = self._stack[-1]
+        if parent["kind"] == "{":
+            return parent["key"]
+        return parent["count"]
+
+    def _path(self):
+        return [frame["name"] for frame in self._stack[1:]]
+
+    def _open_container(self, kind):
+        name = self._child_key()
+        frame = {
+            "kind": kind,
+            "name": name,
+            "start": self._pos,
+            "key": None,
+            "last_string": None,
+            "expect_key": kind == "{",
+            "count": 0,
+            "expect": None,
+            "value_key": None,
+            "held": None,
+            "fields": {},
+            "lessons": {},
+        }
+        if not self._stack:
+            self._root = frame
+        self._stack.append(frame)
+
+    def _close_container(self, events):
+        path = self._path()
+        frame = self._stack.pop()
+        if not self._stack:
+            self._finished = True
+            return
+        self._value_done()
+        if frame["kind"] != "{":
+            return
+
+        # modules[i] and modules[i].lessons[j] are the objects we report
+        if len(path) == 2 and path[0] == "modules":
+            module = self._decode(frame["start"], self._pos + 1)
+            if not isinstance(module, dict):
+                module = self._rebuild(frame)
+            events.append(("module", path[1], module))
+        elif len(path) == 4 and path[0] == "modules" and path[2] == "lessons":
+            lesson = self._decode(frame["start"], self._pos + 1)
+            if not isinstance(lesson, dict):
+                lesson = self._rebuild(frame)
+            # Kept with the module in case the module itself does not decode
+            self._stack[-2]["lessons"][path[3]] = lesson
+            events.append(("lesson", path[1], path[3], lesson))
+
+    def _close_string(self, events):
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        value = self._decode(self._string_start, self._pos + 1)
+
+        if frame["kind"] == "{" and frame["expect_key"]:
+            frame["last_string"] = value
+            frame["expect"] = ":"
+            frame["value_key"] = None
+            return
+        self._value_done()
+        if frame["kind"] != "{" or frame["key"] is None or value is None:
+            return
+        frame["fields"][frame["key"]] = value
+        if len(self._stack) == 1:
+            if self._tolerant:
+                # Wait for the next separator in case the string was cut short by a quote
+                frame["held"] = (frame["key"], value)
+            else:
+                events.append(("field", frame["key"], value))
+
+
+def salvage_course(text):
+    """
+    Recover every complete module and lesson of a malformed or truncated course document
+
+    Args:
+        text: The raw response text
+
+    Returns:
+        Tuple of the course dictionary (top-level string fields and the
+        modules that closed, in order), the module still open where the
+        text ends as (index, module) or None, and whether the document was
+        complete
+    """
+    parser = IncrementalCourseParser(tolerant=True)
+    modules = {event[1]: event[2] for event in parser.feed(text) if event[0] == "module"}
+    course = parser.fields
+    course["modules"] = [modules[index] for index in sorted(modules)]
+    return course, parser.unfinished_module(), parser.finished
@@ -0,0 +1,617 @@
+import os
+import json
+import time
+import random
+import hashlib
+import itertools
+import threading
+from client_registry import get_client_registry
+from resilience import Resilience, DeadlineExceeded
+from hedging import Hedger
+from telemetry import get_metrics, get_tracer
+
+# Which backend the app talks to: "gemini", "openai" or "fake"
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# List prices in USD per million input and output tokens, for the cost metric
+MODEL_PRICES = {
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+def estimate_tokens(text):
+    """
+    Rough token count for text when the provider does not report usage
+
+    Args:
+        text: Any prompt or response text
+
+    Returns:
+        Approximate number of tokens (about four characters per token)
+    """
+    return max(1, len(text or "") // 4)
+
+class Completion:
+    """
+    Result of a non-streaming generation
+    """
+
+    def __init__(self, text, input_tokens=None, output_tokens=None):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+class LLMBackend:
+    """
+    Common interface of the language model providers
+
+    Subclasses implement _generate and _stream. Callers use generate and
+    stream, which also keep call and token counters for the backend and
+    send every upstream request through the backend's Resilience policy
+    (rate limit, retries and circuit breaker). Every call is traced as an
+    llm.generate or llm.stream span with its tokens, attempts and time to
+    first token, and token counts go to the llm_tokens_total metric.
+    Streams are only retried
+    until their first chunk has arrived. Attempts run through the
+    backend's Hedger: the request timeout sent to the provider ends them at
+    the deadline, and with hedge set a slow attempt gets a second one.
+
+    history is a list of {"role": "user" | "assistant" | "model", "content": str}
+    messages that come before the prompt. response_schema is a JSON schema the response must follow; providers
+    with a structured output mode are asked for JSON in that mode.
+    """
+
+    name = "base"
+
+    def __init__(self, model, resilience=None):
+        self.model = model
+        self.resilience = resilience or Resilience()
+        self.hedger = Hedger()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def generate(self, prompt, system_instruction=None, history=None, model=None, deadline=None,
+                 hedge=False, route=None, response_schema=None):
+        """
+        Generate a complete response
+
+        Args:
+            prompt: The user prompt
+            system_instruction: Optional system instruction
+            history: Optional previous conversation messages
+            model: Model name (defaults to the backend's model)
+            deadline: Optional time.monotonic() value by which the response is needed
+            hedge: Whether a slow request may be hedged with a second one
+            route: Routing task of the request (model_router), used to label metrics
+            response_schema: Optional JSON schema of the expected JSON response
+
+        Returns:
+            A Completion
+
+        Raises:
+            DeadlineExceeded: If the deadline passes first
+        """
+        model = model or self.model
+        route = route or "default"
+        attempts = []
+
+        def attempt():
+            attempts.append(1)
+            try:
+                return self._generate(prompt, system_instruction, history or [], model, self._timeout(deadline),
+                                      response_schema)
+            except Exception:
+                self._record(self._estimate_input(prompt, system_instruction, history), 0, model, route)
+                raise
+
+        def discard(completion):
+            self._record(self._estimate_input(prompt, system_instruction, history), estimate_tokens(completion.text),
+                         model, route)
+
+        with get_tracer().span("llm.generate", backend=self.name, model=model, route=route) as span:
+            begun = time.perf_counter()
+            try:
+                completion = self.hedger.run(lambda: self.resilience.call(attempt, deadline), deadline, hedge, discard,
+                                             f"{route}.generate")
+            finally:
+                span.set(attempts=len(attempts))
+            input_tokens = completion.input_tokens or self._estimate_input(prompt, system_instruction, history)
+            output_tokens = completion.output_tokens or estimate_tokens(completion.text)
+            self._record(input_tokens, output_tokens, model, route)
+            span.set(input_tokens=input_tokens, output_tokens=output_tokens)
+            get_metrics().observe("llm_request_seconds", time.perf_counter() - begun, backend=self.name, model=model,
+                                  route=route)
+        return completion
+
+    def stream(self, prompt, system_instruction=None, history=None, model=None, deadline=None,
+               hedge=False, route=None, response_schema=None):
+        """
+        Generate a response as a stream of text chunks
+
+        Args:
+            prompt: The user prompt
+            system_instruction: Optional system instruction
+            history: Optional previous conversation messages
+            model: Model name (defaults to the backend's model)
+            deadline: Optional time.monotonic() value by which the response is needed
+            hedge: Whether a request without a first chunk after the hedge delay
+                may be hedged with a second one
+            route: Routing task of the request (model_router), used to label metrics
+            response_schema: Optional JSON schema of the expected JSON response
+
+        Yields:
+            Response text chunks as they arrive
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before the stream ends
+        """
+        model = model or self.model
+        route = route or "default"
+        attempts = []
+
+        def start():
+            # Wait for the first chunk so failed starts can be retried
+            attempts.append(1)
+            chunks = self._stream(prompt, system_instruction, history or [], model, self._timeout(deadline),
+                                  response_schema)
+            try:
+                return next(chunks, None), chunks
+            except Exception:
+                self._record(self._estimate_input(prompt, system_instruction, history), 0, model, route)
+                raise
+
+        def discard(started):
+            started[1].close()
+            self._record(self._estimate_input(prompt, system_instruction, history), estimate_tokens(started[0] or ""),
+                         model, route)
+
+        with get_tracer().span("llm.stream", backend=self.name, model=model, route=route) as span:
+            begun = time.perf_counter()
+            try:
+                first, chunks = self.hedger.run(lambda: self.resilience.call(start, deadline), deadline, hedge, discard,
+                                                f"{route}.stream")
+            finally:
+                span.set(attempts=len(attempts))
+            first_token = time.perf_counter() - begun
+            get_metrics().observe("llm_time_to_first_token_seconds", first_token, backend=self.name, route=route)
+            span.set(time_to_first_token=first_token)
+
+            received = []
+            try:
+                for chunk in itertools.chain([first], chunks):
+                    if deadline is not None and time.monotonic() > deadline:
+                        chunks.close()
+                        raise DeadlineExceeded("the response took longer than its deadline")
+                    if chunk:
+                        received.append(chunk)
+                        yield chunk
+            finally:
+                input_tokens = self._estimate_input(prompt, system_instruction, history)
+                output_tokens = estimate_tokens("".join(received))
+                self._record(input_tokens, output_tokens, model, route)
+                span.set(input_tokens=input_tokens, output_tokens=output_tokens)
+                get_metrics().observe("llm_request_seconds", time.perf_counter() - begun, backend=self.name,
+                                      model=model, route=route)
+
+    def warm_up(self, system_instructions=(), models=()):
+        """
+        Build clients and open provider connections ahead of the first request
+
+        Args:
+            system_instructions: System instructions requests will use
+            models: Models requests will use (defaults to the backend's model)
+        """
+
+    def stats(self):
+        """
+        Counters accumulated since the last reset
+
+        Returns:
+            Dictionary with calls, input_tokens and output_tokens
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def _record(self, input_tokens, output_tokens, model=None, route="default"):
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["input_tokens"] += input_tokens
+            self._stats["output_tokens"] += output_tokens
+        model = model or self.model
+        metrics = get_metrics()
+        metrics.inc("llm_tokens_total", input_tokens, backend=self.name, model=model, route=route, direction="input")
+        metrics.inc("llm_tokens_total", output_tokens, backend=self.name, model=model, route=route, direction="output")
+        price = MODEL_PRICES.get(model)
+        if price is not None:
+            cost = (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+            metrics.inc("llm_cost_usd_total", cost, backend=self.name, model=model, route=route)
+
+    def _estimate_input(self, prompt, system_instruction, history):
+        texts = [prompt, system_instruction or ""] + [msg["content"] for msg in history or []]
+        return sum(estimate_tokens(text) for text in texts)
+
+    def _timeout(self, deadline):
+        # Seconds the provider call may take, passed on so abandoned attempts end too
+        return None if deadline is None else max(0.001, deadline - time.monotonic())
+
+    def _generate(self, prompt, system_instruction, history, model, timeout=None,
+                  response_schema=None):
+        raise NotImplementedError
+
+    def _stream(self, prompt, system_instruction, history, model, timeout=None,
+                response_schema=None):
+        raise NotImplementedError
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini through the google-generativeai SDK
+    """
+
+    name = "gemini"
+
+    def __init__(self, model=None, api_key=None):
+        import google.generativeai as genai
+
+        super().__init__(model or os.getenv("GEMINI_MODEL", "gemini-1.5-pro"))
+        self._genai = genai
+        self._registry = get_client_registry()
+
+        # The SDK keeps one configured client per process
+        api_key = api_key or os.getenv("GOOGLE_API_KEY", "")
+        self._registry.get(("gemini-config", api_key), lambda: genai.configure(api_key=api_key))
+
+    def _model(self, model, system_instruction=None):
+        """
+        Shared GenerativeModel for a model and system instruction
+        """
+        return self._registry.get(
+            ("gemini-model", model, system_instruction),
+            lambda: self._genai.GenerativeModel(model, system_instruction=system_instruction)
+        )
+
+    def warm_up(self, system_instructions=(), models=()):
+        for model in models or [self.model]:
+            for system_instruction in system_instructions:
+                self._model(model, system_instruction)
+        try:
+            # Opens the connection to the generation service without generating anything
+            self._model(self.model).count_tokens("warm-up")
+        except Exception:
+            pass
+
+    def _request(self, prompt, system_instruction, history, model):
+        model = self._model(model, system_instruction)
+        contents = [
+            {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+            for msg in history
+        ]
+        contents.append({"role": "user", "parts": [prompt]})
+        return model, contents
+
+    def _request_options(self, timeout):
+        return {"timeout": timeout} if timeout is not None else None
+
+    def _generation_config(self, response_schema):
+        if response_schema is None:
+            return None
+        return {"response_mime_type": "application/json", "response_schema": response_schema}
+
+    def _generate(self, prompt, system_instruction, history, model, timeout=None,
+                  response_schema=None):
+        model, contents = self._request(prompt, system_instruction, history, model)
+        response = model.generate_content(contents, generation_config=self._generation_config(response_schema),
+                                          request_options=self._request_options(timeout))
+        usage = getattr(response, "usage_metadata", None)
+        return Completion(
+            response.text,
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None)
+        )
+
+    def _stream(self, prompt, system_instruction, history, model, timeout=None,
+                response_schema=None):
+        model, contents = self._request(prompt, system_instruction, history, model)
+        for chunk in model.generate_content(contents, stream=True,
+                                            generation_config=self._generation_config(response_schema),
+                                            request_options=self._request_options(timeout)):
+            yield chunk.text
+
+class OpenAIBackend(LLMBackend):
+    """
+    Any OpenAI-compatible chat completions endpoint through the openai SDK
+    """
+
+    name = "openai"
+
+    def __init__(self, model=None, api_key=None, base_url=None):
+        from openai import OpenAI
+
+        super().__init__(model or os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+        api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+        base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+
+        # Backends with the same endpoint and key share one client and its
+        # keep-alive connection pool
+        self._client = get_client_registry().get(
+            ("openai", base_url, api_key),
+            lambda: OpenAI(api_key=api_key, base_url=base_url)
+        )
+
+    def warm_up(self, system_instructions=(), models=()):
+        try:
+            # Opens a pooled connection so the first question skips the TLS handshake
+            self._client.models.list()
+        except Exception:
+            pass
+
+    def _messages(self, prompt, system_instruction, history):
+        messages = []
+        if system_instruction:
+            messages.append({"role": "system", "content": system_instruction})
+        for msg in history:
+            messages.append({"role": "user" if msg["role"] == "user" else "assistant", "content": msg["content"]})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _client_for(self, timeout):
+        # Per-request timeout on a copy that shares the connection pool
+        return self._client if timeout is None else self._client.with_options(timeout=timeout)
+
+    def _response_format(self, response_schema):
+        # JSON mode works on every compatible endpoint, unlike strict schemas;
+        # the prompt describes the structure
+        return {"response_format": {"type": "json_object"}} if response_schema is not None else {}
+
+    def _generate(self, prompt, system_instruction, history, model, timeout=None,
+                  response_schema=None):
+        response = self._client_for(timeout).chat.completions.create(
+            model=model,
+            messages=self._messages(prompt, system_instruction, history),
+            **self._response_format(response_schema)
+        )
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content or "",
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None)
+        )
+
+    def _stream(self, prompt, system_instruction, history, model, timeout=None,
+                response_schema=None):
+        response = self._client_for(timeout).chat.completions.create(
+            model=model,
+            messages=self._messages(prompt, system_instruction, history),
+            stream=True,
+            **self._response_format(response_schema)
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+class FakeBackendError(Exception):
+    """
+    Failure injected by the fake backend
+    """
+
+class FakeRateLimitError(FakeBackendError):
+    """
+    Rate limit (HTTP 429) injected by the fake backend
+    """
+    status_code = 429
+
+class FakeTimeoutError(FakeBackendError, TimeoutError):
+    """
+    Request timeout injected by the fake backend
+    """
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic in-process model for benchmarks and load tests
+
+    Responses depend only on the request, so repeated runs produce the same
+    text. Prompts describing the course JSON format (they mention "modules")
+    get a valid course document, prompts describing a single module (they
+    mention "lessons" only) get one module; everything else gets plain prose.
+
+    Args:
+        latency: Seconds before the first token
+        tokens_per_second: Output rate after the first token (0 for instant)
+        failure_rate: Probability that a call raises FakeBackendError
+        rate_limit_rate: Probability that a call is rate limited (FakeRateLimitError)
+        timeout_rate: Probability that a call times out (FakeTimeoutError)
+        timeout_after: Seconds a timing out call hangs before raising
+        slow_rate: Probability that a call is slow to start (a latency tail)
+        slow_latency: Extra seconds before the first token of a slow call
+        model_speedup: Optional dictionary of model name to how many times
+            faster than the default that model answers (for routing tests)
+        malformed_rate: Probability that a JSON response has an unescaped
+            quote in one of its strings, unless a response_schema is given
+        truncate_rate: Probability that a JSON response is cut off early
+        modules: Number of modules in generated courses
+        lessons: Number of lessons per module in generated courses
+        answer_words: Length of prose answers in words
+        resilience: Resilience policy (defaults to one from the environment)
+    """
+
+    name = "fake"
+
+    def __init__(self, model="fake-model", latency=0.0, tokens_per_second=0.0, failure_rate=0.0,
+                 modules=6, lessons=7, answer_words=400, seed=0, rate_limit_rate=0.0, timeout_rate=0.0,
+                 timeout_after=1.0, slow_rate=0.0, slow_latency=2.0, model_speedup=None, malformed_rate=0.0,
+                 truncate_rate=0.0, resilience=None):
+        super().__init__(model, resilience)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_after = timeout_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.model_speedup = model_speedup or {}
+        self.malformed_rate = malformed_rate
+        self.truncate_rate = truncate_rate
+        self.modules = modules
+        self.lessons = lessons
+        self.answer_words = answer_words
+        self._failures = random.Random(seed)
+        self._failures_lock = threading.Lock()
+
+    def _wait(self, seconds, timeout):
+        # Like the real clients, give up once the request timeout has passed
+        if timeout is not None and timeout < seconds:
+            time.sleep(timeout)
+            raise FakeTimeoutError("request timed out")
+        time.sleep(seconds)
+
+    def _first_token_delay(self, timeout):
+        """
+        Inject the configured failures, then return the seconds before the first token
+        """
+        with self._failures_lock:
+            failed = self._failures.random() < self.failure_rate
+            throttled = self._failures.random() < self.rate_limit_rate
+            timed_out = self._failures.random() < self.timeout_rate
+            slow = self._failures.random() < self.slow_rate
+        if failed:
+            raise FakeBackendError("injected fake backend failure")
+        if throttled:
+            raise FakeRateLimitError("injected rate limit")
+        if timed_out:
+            self._wait(self.timeout_after, timeout)
+            raise FakeTimeoutError("injected request timeout")
+        return self.latency + (self.slow_latency if slow else 0.0)
+
+    def _words(self, rng, count):
+        vocabulary = ["learning", "concept", "example", "practice", "model", "data", "function",
+                      "system", "process", "value", "result", "method", "structure", "pattern"]
+        return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+    def _response_text(self, prompt, system_instruction, history, model):
+        digest = hashlib.sha256(f"{model}\n{system_instruction}\n{prompt}".encode("utf-8")).hexdigest()
+        rng = random.Random(digest)
+
+        if '"modules"' not in prompt and '"lessons"' not in prompt:
+            return self._words(rng, self.answer_words).capitalize() + "."
+
+        # Full course prompts ask for lesson content, outline prompts only for titles
+        with_content = '"content"' in prompt
+        modules = []
+        for m in range(1, self.modules + 1):
+            lessons = []
+            for l in range(1, self.lessons + 1):
+                lesson = {"title": f"Lesson {m}.{l}: {self._words(rng, 3).title()}"}
+                if with_content:
+                    lesson["content"] = self._words(rng, self.answer_words)
+                lessons.append(lesson)
+            modules.append({
+                "title": f"Module {m}: {self._words(rng, 2).title()}",
+                "description": self._words(rng, 15),
+                "lessons": lessons
+            })
+        if '"modules"' not in prompt:
+            return json.dumps(modules[0])
+        return json.dumps({"title": "Fake Course", "difficulty": "Beginner", "modules": modules})
+
+    def _damage(self, text, response_schema):
+        """
+        Inject the configured damage into a JSON response
+        """
+        if not text.startswith("{"):
+            return text
+        with self._failures_lock:
+            # Structured output keeps the syntax valid but not the length
+            malformed = response_schema is None and self._failures.random() < self.malformed_rate
+            truncated = self._failures.random() < self.truncate_rate
+            position = self._failures.random()
+        if malformed:
+            # A quoted word inside a string value, left unescaped
+            start = text.find('": "', int(position * len(text)))
+            start = (start if start >= 0 else text.find('": "')) + 4
+            text = text[:start] + 'the "quoted" ' + text[start:]
+        if truncated:
+            text = text[:int(len(text) * (0.2 + 0.7 * position))]
+        return text
+
+    def _chunks(self, text):
+        # Roughly one token per chunk
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def _generate(self, prompt, system_instruction, history, model, timeout=None,
+                  response_schema=None):
+        speedup = self.model_speedup.get(model, 1.0)
+        delay = self._first_token_delay(timeout) / speedup
+        text = self._damage(self._response_text(prompt, system_instruction, history, model), response_schema)
+        if self.tokens_per_second:
+            delay += estimate_tokens(text) / (self.tokens_per_second * speedup)
+        self._wait(delay, timeout)
+        return Completion(text)
+
+    def _stream(self, prompt, system_instruction, history, model, timeout=None,
+                response_schema=None):
+        speedup = self.model_speedup.get(model, 1.0)
+        delay = self._first_token_delay(timeout) / speedup
+        text = self._damage(self._response_text(prompt, system_instruction, history, model), response_schema)
+        self._wait(delay, timeout)
+        for chunk in self._chunks(text):
+            if self.tokens_per_second:
+                time.sleep(1 / (self.tokens_per_second * speedup))
+            yield chunk
+
+def create_backend(name=None):
+    """
+    Create a backend by name
+
+    Args:
+        name: "gemini", "openai" or "fake" (defaults to LLM_BACKEND)
+
+    Returns:
+        A new LLMBackend
+    """
+    name = name or LLM_BACKEND
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "fake":
+        return FakeBackend(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.5")),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200")),
+            failure_rate=float(os.getenv("FAKE_LLM_FAILURE_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+            timeout_rate=float(os.getenv("FAKE_LLM_TIMEOUT_RATE", "0")),
+            slow_rate=float(os.getenv("FAKE_LLM_SLOW_RATE", "0")),
+            malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+            truncate_rate=float(os.getenv("FAKE_LLM_TRUNCATE_RATE", "0"))
+        )
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    Return the process-wide backend, creating it on first use
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+def set_backend(backend):
+    """
+    Replace the process-wide backend (used by benchmarks and load tests)
+
+    Args:
+        backend: An LLMBackend instance
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
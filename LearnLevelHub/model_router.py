@@ -0,0 +1,99 @@
+import os
+import re
+from llm_backends import get_backend
+from telemetry import get_metrics
+
+# Fast, cheaper model of each provider; the backend's configured model is the strong tier
+FAST_MODEL = os.getenv("LLM_FAST_MODEL", "")
+FAST_MODELS = {
+    "gemini": "gemini-1.5-flash",
+    "openai": "gpt-4o-mini",
+    "fake": "fake-fast-model"
+}
+
+# Tier ("fast" or "strong") or model name for each task. Override a task
+# with LLM_ROUTE_<TASK>, for example LLM_ROUTE_OUTLINE=strong
+DEFAULT_ROUTES = {
+    "outline": "fast",
+    "lesson": "strong",
+    "course": "strong",
+    "summary": "fast",
+    "tutor_simple": "fast",
+    "tutor_complex": "strong"
+}
+ROUTES = {task: os.getenv(f"LLM_ROUTE_{task.upper()}", target) for task, target in DEFAULT_ROUTES.items()}
+
+# Tutor questions up to this many words without any complexity cue go to the fast model
+SIMPLE_QUESTION_WORDS = int(os.getenv("TUTOR_SIMPLE_QUESTION_WORDS", "15"))
+
+# Words asking for reasoning, comparison, code or a worked answer
+_COMPLEX_CUES = re.compile(
+    r"\b(why|explain|compare|comparison|differences?|versus|vs|trade-?offs?|pros and cons|"
+    r"prove|derive|design|implement|debug|optimi[sz]e|analy[sz]e|evaluate|step by step|examples?|code)\b",
+    re.IGNORECASE
+)
+
+def classify_question(question):
+    """
+    Decide whether a tutor question needs the strong model
+
+    Short questions (a definition, a fact, a yes/no check) go to the fast
+    model. Long questions, several questions at once, code and questions
+    asking for reasoning or examples stay on the strong model.
+
+    Args:
+        question: The student's question
+
+    Returns:
+        "tutor_simple" or "tutor_complex"
+    """
+    if (len(question.split()) > SIMPLE_QUESTION_WORDS
+            or question.count("?") > 1
+            or "```" in question
+            or _COMPLEX_CUES.search(question)):
+        return "tutor_complex"
+    return "tutor_simple"
+
+def route_model(task, backend=None):
+    """
+    Model a task is sent to under the configured routes
+
+    Args:
+        task: One of the DEFAULT_ROUTES tasks
+        backend: Backend the request goes to (defaults to the process-wide one)
+
+    Returns:
+        The model name
+    """
+    backend = backend or get_backend()
+    target = ROUTES.get(task, "strong")
+    if target == "strong":
+        return backend.model
+    if target == "fast":
+        return FAST_MODEL or FAST_MODELS.get(backend.name, backend.model)
+    return target
+
+def route_report():
+    """
+    Per-route latency, tokens and cost of the model calls made so far
+
+    Returns:
+        Dictionary of route name to calls, mean_seconds, p95_seconds (bucket
+        bound), input_tokens, output_tokens and cost_usd, for routes in use
+    """
+    metrics = get_metrics()
+    report = {}
+    for route in ROUTES:
+        latency = metrics.histogram("llm_request_seconds", route=route)
+        if not latency["count"]:
+            continue
+        report[route] = {
+            "model": route_model(route),
+            "calls": latency["count"],
+            "mean_seconds": latency["mean"],
+            "p95_seconds": latency["p95"],
+            "input_tokens": metrics.total("llm_tokens_total", route=route, direction="input"),
+            "output_tokens": metrics.total("llm_tokens_total", route=route, direction="output"),
+            "cost_usd": metrics.total("llm_cost_usd_total", route=route)
+        }
+    return report
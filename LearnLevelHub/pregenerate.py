@@ -0,0 +1,155 @@
+"""
+Pre-generate a catalog of courses into the course cache the app reads from
+
+Reads jobs from a JSON lines file ({"topic": ..., "difficulty": ...,
+"additional_info": ...} per line) or a CSV file with topic, difficulty and
+additional_info columns, and generates each course with
+generate_course_content on a pool of worker threads. Upstream requests of
+all workers share one rate limit. Every finished job is appended to a
+checkpoint file, so an interrupted run picks up where it stopped; jobs
+that failed are tried again. Reports per-job latency and throughput.
+
+Run from the project folder:
+    python pregenerate.py catalog.jsonl --workers 4 --rate-limit 60
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import course_generator
+from course_cache import get_course_cache
+from llm_backends import get_backend
+from resilience import Resilience
+
+DIFFICULTIES = ("Beginner", "Intermediate", "Advanced")
+
+def read_jobs(path):
+    """
+    Read course jobs from a JSON lines or CSV file
+
+    Args:
+        path: Jobs file; ".csv" files need a topic column, anything else is
+            read as JSON lines
+
+    Returns:
+        List of (topic, difficulty, additional_info) tuples
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    jobs = []
+    for number, row in enumerate(rows, 1):
+        topic = (row.get("topic") or "").strip()
+        difficulty = (row.get("difficulty") or "Beginner").strip().capitalize()
+        if not topic or difficulty not in DIFFICULTIES:
+            raise ValueError(f"{path}: job {number} needs a topic and one of {', '.join(DIFFICULTIES)}")
+        jobs.append((topic, difficulty, (row.get("additional_info") or "").strip()))
+    return jobs
+
+def read_checkpoint(path):
+    """
+    Return the cache keys of jobs a previous run finished
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Last line of a run that was killed mid-write
+                continue
+            if record.get("status") == "done":
+                done.add(record["key"])
+    return done
+
+def run_job(job):
+    """
+    Generate one course and check that it reached the course cache
+
+    Returns:
+        Tuple of the status ("done" or "failed") and the seconds it took
+    """
+    topic, difficulty, additional_info = job
+    start = time.perf_counter()
+    course_generator.generate_course_content(topic, difficulty, additional_info)
+    # Only complete courses are cached; a lesson that failed leaves the job unfinished.
+    # contains() leaves the cache's hit and miss counts to real lookups
+    stored = get_course_cache().contains(course_generator.course_cache_key(topic, difficulty, additional_info))
+    return ("done" if stored else "failed"), time.perf_counter() - start
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1] if ordered else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="JSON lines or CSV file of course jobs")
+    parser.add_argument("--workers", type=int, default=4, help="Courses generated at the same time")
+    parser.add_argument("--rate-limit", type=float, default=0,
+                        help="Upstream requests per minute across all workers (0 for no limit)")
+    parser.add_argument("--checkpoint", help="Progress file (defaults to <jobs>.checkpoint.jsonl)")
+    args = parser.parse_args()
+
+    jobs = read_jobs(args.jobs)
+    checkpoint = args.checkpoint or args.jobs + ".checkpoint.jsonl"
+    done = read_checkpoint(checkpoint)
+
+    # One shared limiter: every worker's requests go through the process-wide backend
+    backend = get_backend()
+    if args.rate_limit:
+        backend.resilience = Resilience(rate_per_minute=args.rate_limit)
+
+    # Jobs that normalize to the same course are generated once
+    unique = {}
+    for job in jobs:
+        unique.setdefault(course_generator.course_cache_key(*job), job)
+    pending = {key: job for key, job in unique.items() if key not in done}
+    print(f"{len(unique)} courses ({len(jobs)} jobs), {len(unique) - len(pending)} already done, "
+          f"{len(pending)} to generate with {args.workers} workers")
+
+    latencies = []
+    failed = 0
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {executor.submit(run_job, job): (key, job) for key, job in pending.items()}
+        for future in as_completed(futures):
+            key, (topic, difficulty, _) = futures[future]
+            try:
+                status, seconds = future.result()
+            except Exception as e:
+                status, seconds = "failed", 0.0
+                print(f"  error in {topic!r}: {e}")
+            latencies.append(seconds)
+            failed += status != "done"
+            with open(checkpoint, "a") as f:
+                f.write(json.dumps({"key": key, "topic": topic, "difficulty": difficulty,
+                                    "status": status, "seconds": round(seconds, 3)}) + "\n")
+            print(f"  [{len(latencies)}/{len(pending)}] {status:<6} {seconds:7.1f} s  {topic} ({difficulty})")
+    except KeyboardInterrupt:
+        print("Interrupted; finished jobs are checkpointed, run again to resume")
+        executor.shutdown(wait=False, cancel_futures=True)
+        return
+    executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    finished = len(latencies) - failed
+    if latencies:
+        print(f"{finished} courses generated, {failed} failed in {elapsed:.1f} s "
+              f"({finished / elapsed * 3600:.1f} courses/hour); per course p50 {percentile(latencies, 0.5):.1f} s, "
+              f"p95 {percentile(latencies, 0.95):.1f} s, max {max(latencies):.1f} s")
+    stats = backend.stats()
+    print(f"upstream: {stats['calls']} calls, {stats['input_tokens']} input and {stats['output_tokens']} output tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import time
+import random
+import threading
+from telemetry import get_metrics
+
+# Upstream request quota (requests per minute, 0 for no limit) and burst size
+RATE_LIMIT_PER_MINUTE = float(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+
+# Retries of rate-limited, timed out and unavailable requests
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+# Consecutive upstream failures that open the circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# HTTP statuses and provider exception names that are worth retrying
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "TooManyRequests"
+}
+THROTTLE_ERRORS = {"RateLimitError", "ResourceExhausted", "TooManyRequests"}
+
+def _status(error):
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+def is_throttled(error):
+    """
+    Whether an error means the provider is rate limiting us
+    """
+    return _status(error) == 429 or type(error).__name__ in THROTTLE_ERRORS
+
+def is_retryable(error):
+    """
+    Whether an upstream error is transient (rate limits, timeouts, outages)
+    """
+    return (
+        _status(error) in RETRYABLE_STATUS
+        or type(error).__name__ in RETRYABLE_ERRORS
+        or isinstance(error, (TimeoutError, ConnectionError))
+    )
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a request's deadline passes before the model answered
+    """
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling upstream while the circuit is open
+    """
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that adapts its rate to throttling
+
+    The rate is halved whenever the provider rate limits a request and
+    creeps back towards the configured rate with every success.
+    """
+
+    def __init__(self, rate_per_second, capacity, min_rate_fraction=0.1):
+        self.max_rate = rate_per_second
+        self.rate = rate_per_second
+        self.min_rate = rate_per_second * min_rate_fraction
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait until a request may be sent
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected for reset_timeout seconds. Then a single trial call is let
+    through: success closes the circuit, failure opens it again. A trial
+    that ends any other way (rate limited, out of time) counts as a failure,
+    so the circuit never waits on a trial that will not report back.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go upstream now
+
+        Returns:
+            True if the call is the trial of a half-open circuit
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+            remaining = self._opened + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half-open"
+                return True
+        raise CircuitOpenError(
+            f"the model service is temporarily unavailable, retrying in {max(0, remaining):.0f}s"
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        """
+        Returns:
+            True if this failure opened the circuit
+        """
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                opened = self.state != "open"
+                self.state = "open"
+                self._opened = time.monotonic()
+                return opened
+            return False
+
+class Resilience:
+    """
+    Rate limiting, retries with jittered exponential backoff and a circuit
+    breaker around the upstream calls of one backend
+
+    Only transient errors (see is_retryable) are retried; other errors are
+    raised at once. Timeouts and outages count towards opening the circuit,
+    rate limits instead slow down the token bucket.
+    """
+
+    def __init__(self, rate_per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST, max_retries=MAX_RETRIES,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS, seed=None):
+        self.limiter = TokenBucket(rate_per_minute / 60, burst) if rate_per_minute else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self._stats = {"retries": 0, "throttled": 0, "rejected": 0, "circuit_opened": 0}
+
+    def call(self, fn, deadline=None):
+        """
+        Call fn under the rate limit, retrying transient errors
+
+        Args:
+            fn: Function making one upstream request
+            deadline: Optional time.monotonic() value after which no
+                further attempt is started
+
+        Returns:
+            The result of fn
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            DeadlineExceeded: If the deadline passed before an attempt could start
+        """
+        attempt = 0
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded("the request deadline passed before the model answered")
+            try:
+                trial = self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+            settled = False
+            try:
+                if self.limiter is not None:
+                    self.limiter.acquire()
+                try:
+                    result = fn()
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The service answered, so it is not degraded
+                        self.breaker.record_success()
+                        settled = True
+                        raise
+                    if is_throttled(e):
+                        # Rate limits slow us down rather than open the circuit
+                        self._count("throttled")
+                        if self.limiter is not None:
+                            self.limiter.throttled()
+                    else:
+                        settled = True
+                        if self.breaker.record_failure():
+                            self._count("circuit_opened")
+                    backoff = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                    if deadline is not None and time.monotonic() + backoff >= deadline:
+                        raise DeadlineExceeded("the request deadline passed before the model answered") from e
+                    if attempt >= self.max_retries:
+                        raise
+                    time.sleep(backoff)
+                    attempt += 1
+                    self._count("retries")
+                    continue
+
+                self.breaker.record_success()
+                settled = True
+                if self.limiter is not None:
+                    self.limiter.succeeded()
+                return result
+            finally:
+                # A half-open trial that did not report back would keep the circuit half-open for good
+                if trial and not settled and self.breaker.record_failure():
+                    self._count("circuit_opened")
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+        get_metrics().inc(f"llm_{name}_total")
+
+    def stats(self):
+        """
+        Report retries, throttled requests, rejected calls and the circuit state
+
+        Returns:
+            Dictionary with retries, throttled, rejected, circuit_opened,
+            circuit_state and rate_per_minute (None without a rate limit)
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["circuit_state"] = self.breaker.state
+        stats["rate_per_minute"] = self.limiter.rate * 60 if self.limiter is not None else None
+        return stats
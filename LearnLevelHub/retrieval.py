@@ -0,0 +1,207 @@
+import os
+import re
+import math
+from collections import Counter
+from llm_backends import estimate_tokens
+
+# Maximum size of the lesson context sent with a tutor question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("TUTOR_CONTEXT_TOKEN_BUDGET", "800"))
+
+# How many lessons before and after the current one are searched
+CONTEXT_NEIGHBOUR_LESSONS = int(os.getenv("TUTOR_CONTEXT_NEIGHBOUR_LESSONS", "1"))
+
+# Target passage length in words
+PASSAGE_WORDS = 120
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Extra weight for passages of the lesson the learner is reading
+CURRENT_LESSON_BOOST = 1.5
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "where", "which", "who", "why", "with", "you", "your", "me", "my", "we", "about", "there"
+}
+
+def _stem(word):
+    # Fold simple plurals so "decorators" matches "decorator"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms without stopwords
+    """
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+def split_passages(content, passage_words=PASSAGE_WORDS):
+    """
+    Split lesson content into passages of roughly passage_words words
+
+    Paragraphs are kept together and merged until the target length is
+    reached; longer paragraphs are cut at word boundaries.
+
+    Args:
+        content: Lesson content
+        passage_words: Target passage length in words
+
+    Returns:
+        List of passage strings
+    """
+    passages = []
+    current = []
+    for paragraph in re.split(r"\n\s*\n", content or ""):
+        words = paragraph.split()
+        while len(words) > passage_words:
+            if current:
+                passages.append(" ".join(current))
+                current = []
+            passages.append(" ".join(words[:passage_words]))
+            words = words[passage_words:]
+        if current and len(current) + len(words) > passage_words:
+            passages.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+class CourseIndex:
+    """
+    BM25 index over the passages of every lesson in a course
+
+    Lessons are indexed when the index is built and re-indexed whenever
+    their content changes, so lazy and streamed courses are picked up as
+    their lessons are written.
+    """
+
+    def __init__(self, course):
+        self.course = course
+        self._lessons = {}
+        self._document_frequency = Counter()
+        self._passage_count = 0
+        self._total_length = 0
+
+        for module_index, module in enumerate(course["modules"]):
+            for lesson_index in range(len(module["lessons"])):
+                self._ensure_indexed(module_index, lesson_index)
+
+    def _ensure_indexed(self, module_index, lesson_index):
+        """
+        Index a lesson if its content is new or has changed since last time
+        """
+        content = self.course["modules"][module_index]["lessons"][lesson_index].get("content")
+        key = (module_index, lesson_index)
+        indexed = self._lessons.get(key)
+        if indexed is not None and indexed["content"] is content:
+            return indexed
+        if indexed is not None:
+            self._remove(indexed)
+
+        passages = []
+        for text in split_passages(content):
+            terms = Counter(tokenize(text))
+            passages.append({"text": text, "terms": terms, "length": sum(terms.values())})
+            self._document_frequency.update(terms.keys())
+            self._passage_count += 1
+            self._total_length += passages[-1]["length"]
+
+        indexed = {"content": content, "passages": passages}
+        self._lessons[key] = indexed
+        return indexed
+
+    def _remove(self, indexed):
+        for passage in indexed["passages"]:
+            self._document_frequency.subtract(passage["terms"].keys())
+            self._passage_count -= 1
+            self._total_length -= passage["length"]
+
+    def _score(self, passage, query_terms):
+        average_length = self._total_length / self._passage_count if self._passage_count else 1
+        score = 0.0
+        for term in query_terms:
+            frequency = passage["terms"].get(term, 0)
+            if not frequency:
+                continue
+            df = self._document_frequency[term]
+            idf = math.log(1 + (self._passage_count - df + 0.5) / (df + 0.5))
+            score += idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * passage["length"] / average_length))
+        return score
+
+    def _neighbourhood(self, module_index, lesson_index, neighbours):
+        """
+        Positions of the current lesson and its neighbours in reading order
+        """
+        positions = [
+            (m, l)
+            for m, module in enumerate(self.course["modules"])
+            for l in range(len(module["lessons"]))
+        ]
+        current = positions.index((module_index, lesson_index))
+        return positions[max(0, current - neighbours):current + neighbours + 1]
+
+    def select_context(self, module_index, lesson_index, question, token_budget=None, neighbours=None):
+        """
+        Pick the passages most relevant to a question within a token budget
+
+        Passages come from the current lesson and its neighbouring lessons;
+        those of the current lesson are preferred. When nothing matches the
+        question, the beginning of the current lesson is used.
+
+        Args:
+            module_index: Zero-based index of the current module
+            lesson_index: Zero-based index of the current lesson
+            question: The learner's question
+            token_budget: Maximum context size (defaults to CONTEXT_TOKEN_BUDGET)
+            neighbours: Lessons searched on each side (defaults to CONTEXT_NEIGHBOUR_LESSONS)
+
+        Returns:
+            Context text with passages grouped under their lesson titles
+        """
+        token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+        neighbours = CONTEXT_NEIGHBOUR_LESSONS if neighbours is None else neighbours
+        query_terms = set(tokenize(question))
+
+        candidates = []
+        for m, l in self._neighbourhood(module_index, lesson_index, neighbours):
+            indexed = self._ensure_indexed(m, l)
+            is_current = (m, l) == (module_index, lesson_index)
+            for position, passage in enumerate(indexed["passages"]):
+                score = self._score(passage, query_terms)
+                if is_current:
+                    score *= CURRENT_LESSON_BOOST
+                if score > 0:
+                    candidates.append((score, (m, l, position), passage["text"]))
+
+        if not candidates:
+            current = self._ensure_indexed(module_index, lesson_index)
+            candidates = [
+                (0.0, (module_index, lesson_index, position), passage["text"])
+                for position, passage in enumerate(current["passages"])
+            ]
+        else:
+            candidates.sort(key=lambda candidate: -candidate[0])
+
+        selected = []
+        used = 0
+        for _, location, text in candidates:
+            tokens = estimate_tokens(text)
+            if used + tokens > token_budget:
+                continue
+            selected.append((location, text))
+            used += tokens
+
+        # Present the passages in reading order, grouped by lesson
+        sections = []
+        last_lesson = None
+        for (m, l, _), text in sorted(selected):
+            if (m, l) != last_lesson:
+                lesson = self.course["modules"][m]["lessons"][l]
+                sections.append(f"[Module {m + 1}, Lesson {l + 1}: {lesson['title']}]")
+                last_lesson = (m, l)
+            sections.append(text)
+        return "\n\n".join(sections)
@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+# Location of the learner session database
+STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "learnlevelhub", "sessions.sqlite3"))
+
+# Buffered progress events are written at least this often (seconds) ...
+FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "2"))
+
+# ... or as soon as this many are waiting
+FLUSH_BATCH_SIZE = int(os.getenv("SESSION_FLUSH_BATCH_SIZE", "50"))
+
+def course_id_for(course):
+    """
+    Content address of a course outline, so identical courses are stored once
+
+    Args:
+        course: Course dictionary
+
+    Returns:
+        Hex digest of the course title, difficulty and lesson titles
+    """
+    outline = [course.get("title"), course.get("difficulty")] + [
+        [module["title"]] + [lesson["title"] for lesson in module["lessons"]]
+        for module in course["modules"]
+    ]
+    return hashlib.sha256(json.dumps(outline).encode("utf-8")).hexdigest()
+
+class SessionStore:
+    """
+    SQLite store that lets learners pick up where they left off after a restart
+
+    Course outlines are written once and shared by every session with the
+    same outline. Lesson bodies belong to the session that wrote them (lazy
+    courses and rewrites give sessions with the same outline different
+    text) and live in their own table, so a returning session loads only the
+    outline and reads bodies as lessons are opened. Progress events (position, completed lessons, chat messages and
+    the summary of older messages) are buffered in memory and written in
+    batches by a background thread.
+    """
+
+    def __init__(self, path=STORE_PATH, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._events = []
+        self._positions = {}
+        self._events_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Lesson bodies used to be keyed by outline alone and shared between sessions
+            conn.executescript(
+                "DROP TABLE IF EXISTS lessons;"
+                "CREATE TABLE IF NOT EXISTS courses ("
+                " course_id TEXT PRIMARY KEY, outline TEXT NOT NULL, created REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS session_lessons ("
+                " session_id TEXT NOT NULL, course_id TEXT NOT NULL, module_index INTEGER NOT NULL,"
+                " lesson_index INTEGER NOT NULL, content TEXT NOT NULL,"
+                " PRIMARY KEY (session_id, course_id, module_index, lesson_index));"
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY, course_id TEXT, state TEXT NOT NULL, updated REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS progress ("
+                " session_id TEXT NOT NULL, course_id TEXT NOT NULL, lesson_id TEXT NOT NULL,"
+                " PRIMARY KEY (session_id, course_id, lesson_id));"
+                "CREATE TABLE IF NOT EXISTS chat ("
+                " session_id TEXT NOT NULL, seq INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS chat_session ON chat (session_id, seq);"
+                "CREATE TABLE IF NOT EXISTS chat_summary ("
+                " session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, folded INTEGER NOT NULL);"
+            )
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Courses
+
+    def save_course(self, session_id, course):
+        """
+        Store a course outline and every lesson body it already has
+
+        Args:
+            session_id: Session the lesson bodies belong to
+            course: Course dictionary
+
+        Returns:
+            The course id
+        """
+        course_id = course_id_for(course)
+        outline = dict(course)
+        outline["modules"] = [
+            dict(module, lessons=[{k: v for k, v in lesson.items() if k != "content"} for lesson in module["lessons"]])
+            for module in course["modules"]
+        ]
+
+        lessons = [
+            (session_id, course_id, m, l, lesson["content"])
+            for m, module in enumerate(course["modules"])
+            for l, lesson in enumerate(module["lessons"])
+            if lesson.get("content") is not None
+        ]
+
+        with self._write_lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO courses (course_id, outline, created) VALUES (?, ?, ?)",
+                (course_id, json.dumps(outline), time.time())
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_lessons (session_id, course_id, module_index, lesson_index, content)"
+                " VALUES (?, ?, ?, ?, ?)",
+                lessons
+            )
+        return course_id
+
+    def save_lesson(self, session_id, course_id, module_index, lesson_index, content):
+        """
+        Queue a lesson body written after the course was saved (lazy courses and rewrites)
+        """
+        self._queue(("lesson", session_id, course_id, module_index, lesson_index, content))
+
+    def load_course(self, course_id):
+        """
+        Load a course outline; lesson content is None until load_lesson is called
+
+        Returns:
+            Course dictionary, or None if unknown
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT outline FROM courses WHERE course_id = ?", (course_id,)).fetchone()
+        if row is None:
+            return None
+
+        course = json.loads(row[0])
+        for module in course["modules"]:
+            for lesson in module["lessons"]:
+                lesson["content"] = None
+        return course
+
+    def load_lesson(self, session_id, course_id, module_index, lesson_index):
+        """
+        Read one lesson body as the session last stored it
+
+        Returns:
+            The lesson content, or None if it was never stored
+        """
+        self.flush()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content FROM session_lessons"
+                " WHERE session_id = ? AND course_id = ? AND module_index = ? AND lesson_index = ?",
+                (session_id, course_id, module_index, lesson_index)
+            ).fetchone()
+        return row[0] if row else None
+
+    # Session progress (write-behind)
+
+    def record_position(self, session_id, course_id, state):
+        """
+        Remember where a session is; only the latest position is written
+
+        Args:
+            session_id: Session identifier
+            course_id: Id of the session's course, or None
+            state: JSON-serializable dictionary (page, module, lesson, ...)
+        """
+        with self._events_lock:
+            self._positions[session_id] = (course_id, json.dumps(state))
+
+    def record_completed(self, session_id, course_id, lesson_id):
+        """
+        Queue a completed lesson
+        """
+        self._queue(("completed", session_id, course_id, lesson_id))
+
+    def record_message(self, session_id, message):
+        """
+        Queue a chat message
+        """
+        self._queue(("message", session_id, json.dumps(message)))
+
+    def record_summary(self, session_id, summary, folded):
+        """
+        Queue the summary of a session's older chat messages
+
+        Args:
+            session_id: Session identifier
+            summary: Summary of the first folded chat messages of the session
+            folded: Number of messages the summary covers; they are left
+                out of the chat history when the session is loaded
+        """
+        self._queue(("summary", session_id, summary, folded))
+
+    def clear_chat(self, session_id):
+        """
+        Queue removal of a session's chat history and its summary
+        """
+        self._queue(("clear_chat", session_id))
+
+    def load_session(self, session_id):
+        """
+        Load everything needed to rehydrate a session
+
+        Returns:
+            Dictionary with course_id, course (outline only, or None), state,
+            completed_lesson_ids, chat_summary, chat_folded (messages covered
+            by the summary) and chat_history (the messages after them), or
+            None for a new session
+        """
+        self.flush()
+        with self._connect() as conn:
+            row = conn.execute("SELECT course_id, state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            course_id, state = row
+            completed = {
+                lesson_id for (lesson_id,) in conn.execute(
+                    "SELECT lesson_id FROM progress WHERE session_id = ? AND course_id = ?", (session_id, course_id)
+                )
+            }
+            summary, folded = conn.execute(
+                "SELECT summary, folded FROM chat_summary WHERE session_id = ?", (session_id,)
+            ).fetchone() or ("", 0)
+            chat = [
+                json.loads(message) for (message,) in conn.execute(
+                    "SELECT message FROM chat WHERE session_id = ? ORDER BY seq LIMIT -1 OFFSET ?", (session_id, folded)
+                )
+            ]
+
+        return {
+            "course_id": course_id,
+            "course": self.load_course(course_id) if course_id else None,
+            "state": json.loads(state),
+            "completed_lesson_ids": completed,
+            "chat_summary": summary,
+            "chat_folded": folded,
+            "chat_history": chat
+        }
+
+    def _queue(self, event):
+        with self._events_lock:
+            self._events.append(event)
+            waiting = len(self._events)
+        if waiting >= self.batch_size:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # Keep the session running; events are retried on the next flush
+                pass
+
+    def flush(self):
+        """
+        Write all buffered events in one transaction
+        """
+        with self._write_lock:
+            with self._events_lock:
+                events, self._events = self._events, []
+                positions, self._positions = self._positions, {}
+            if not events and not positions:
+                return
+
+            try:
+                with self._connect() as conn:
+                    now = time.time()
+                    for event in events:
+                        if event[0] == "lesson":
+                            conn.execute(
+                                "INSERT OR REPLACE INTO session_lessons"
+                                " (session_id, course_id, module_index, lesson_index, content) VALUES (?, ?, ?, ?, ?)",
+                                event[1:]
+                            )
+                        elif event[0] == "completed":
+                            conn.execute("INSERT OR IGNORE INTO progress (session_id, course_id, lesson_id) VALUES (?, ?, ?)", event[1:])
+                        elif event[0] == "message":
+                            conn.execute("INSERT INTO chat (session_id, message) VALUES (?, ?)", event[1:])
+                        elif event[0] == "summary":
+                            conn.execute(
+                                "INSERT OR REPLACE INTO chat_summary (session_id, summary, folded) VALUES (?, ?, ?)",
+                                event[1:]
+                            )
+                        elif event[0] == "clear_chat":
+                            conn.execute("DELETE FROM chat WHERE session_id = ?", event[1:])
+                            conn.execute("DELETE FROM chat_summary WHERE session_id = ?", event[1:])
+                    for session_id, (course_id, state) in positions.items():
+                        conn.execute(
+                            "INSERT OR REPLACE INTO sessions (session_id, course_id, state, updated) VALUES (?, ?, ?, ?)",
+                            (session_id, course_id, state, now)
+                        )
+            except sqlite3.Error:
+                # Put the events back in front of anything queued meanwhile
+                with self._events_lock:
+                    self._events[:0] = events
+                    for session_id, position in positions.items():
+                        self._positions.setdefault(session_id, position)
+                raise
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_session_store():
+    """
+    Return the process-wide store at STORE_PATH
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SessionStore()
+        return _default_store
+
+def set_session_store(store):
+    """
+    Replace the process-wide store (used by benchmarks and batch jobs)
+
+    Args:
+        store: A SessionStore instance
+    """
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
@@ -0,0 +1,99 @@
+import os
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: lock files are not available
+    fcntl = None
+
+class _Call:
+    """
+    An in-flight call whose result is shared with every waiting caller
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single execution
+
+    While one call for a key is running, other callers in the same process
+    wait for it and receive its result. When lock_dir is set, the running
+    call also holds a lock file for the key, so callers in other processes
+    on the host wait for it too; they are expected to find the result through
+    the recheck function (for example a shared cache) once the lock is free.
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn, recheck=None):
+        """
+        Run fn once for all concurrent callers using the same key
+
+        Args:
+            key: Identity of the call
+            fn: Function producing the result
+            recheck: Optional function returning an already available result
+                (or None); called once the cross-process lock is held
+
+        Returns:
+            Tuple of the result and True if this caller produced it
+            (False if it was shared from another caller)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = self._run(key, fn, recheck)
+            return call.result, True
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn, recheck):
+        if not self.lock_dir:
+            return fn()
+
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        with open(os.path.join(self.lock_dir, f"{name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another process may have finished the same work while we waited
+                if recheck is not None:
+                    result = recheck()
+                    if result is not None:
+                        return result
+                return fn()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def in_flight(self):
+        """
+        Number of keys currently being computed in this process
+        """
+        with self._lock:
+            return len(self._calls)
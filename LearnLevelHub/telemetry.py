@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local endpoint serving metrics in Prometheus text format (port 0 to disable)
+METRICS_HOST = os.getenv("TELEMETRY_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("TELEMETRY_METRICS_PORT", "9464"))
+
+# JSON lines file receiving finished spans (empty to disable)
+SPANS_PATH = os.getenv("TELEMETRY_SPANS_PATH", "")
+
+# Share of traces whose spans are written; spans ending in an error are always written
+SPAN_SAMPLE_RATE = float(os.getenv("TELEMETRY_SPAN_SAMPLE_RATE", "0.1"))
+
+# Spans waiting for the writer thread; more are dropped rather than slowing requests
+SPAN_QUEUE_SIZE = int(os.getenv("TELEMETRY_SPAN_QUEUE_SIZE", "10000"))
+
+METRIC_PREFIX = "learnlevelhub_"
+
+# Histogram bucket bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms, exported in Prometheus text format
+
+    Metrics are identified by name and a set of labels; both are created on
+    first use. Names get METRIC_PREFIX when exported.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add value to a counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Record one value (in seconds) in a histogram
+        """
+        key = (name, tuple(sorted(labels.items())))
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def counter(self, name, **labels):
+        """
+        Current value of a counter (0 if it was never incremented)
+        """
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def total(self, name, **labels):
+        """
+        Sum of a counter over every label set that includes labels
+        """
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for (metric, key), value in self._counters.items()
+                       if metric == name and wanted <= set(key))
+
+    def histogram(self, name, **labels):
+        """
+        Merge a histogram over every label set that includes labels
+
+        Returns:
+            Dictionary with count, sum, mean and p50/p95 (upper bounds of
+            the buckets holding those percentiles)
+        """
+        wanted = set(labels.items())
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        with self._lock:
+            for (metric, key), histogram in self._histograms.items():
+                if metric == name and wanted <= set(key):
+                    counts = [a + b for a, b in zip(counts, histogram[0])]
+                    total += histogram[1]
+        count = sum(counts)
+        summary = {"count": count, "sum": total, "mean": total / count if count else None}
+        for percentile, fraction in (("p50", 0.50), ("p95", 0.95)):
+            cumulative, summary[percentile] = 0, None
+            for bound, bucket_count in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += bucket_count
+                if count and cumulative >= fraction * count:
+                    summary[percentile] = bound
+                    break
+        return summary
+
+    def render(self):
+        """
+        Export every metric in Prometheus text format
+
+        Returns:
+            The exposition text
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self._histograms.items())
+
+        lines = []
+        last = None
+        for (name, labels), value in counters:
+            if name != last:
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+                last = name
+            lines.append(f"{METRIC_PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in histograms:
+            if name != last:
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                last = name
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+class Span:
+    """
+    One timed operation; attributes can be added while it runs
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "start", "attributes")
+
+    def __init__(self, name, trace_id, span_id, parent_id, sampled, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.time()
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class Tracer:
+    """
+    Times operations as spans and writes sampled spans as JSON lines
+
+    Every span updates the span_seconds histogram and, when it ends in an
+    exception, span_errors_total with the exception class. Whether a span is
+    written is decided once per trace (the outermost span of a thread), so
+    unsampled requests cost a few dictionary updates. Spans are written by a
+    background thread; when it falls behind, spans are dropped.
+
+    Args:
+        metrics: Metrics receiving span durations and errors
+        path: JSON lines file for spans (None to keep none)
+        sample_rate: Share of traces written
+    """
+
+    def __init__(self, metrics, path=None, sample_rate=SPAN_SAMPLE_RATE, queue_size=SPAN_QUEUE_SIZE, seed=None):
+        self.metrics = metrics
+        self.path = path
+        self.sample_rate = sample_rate
+        self._random = random.Random(seed)
+        self._local = threading.local()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the enclosed block as a span
+
+        Args:
+            name: Span name, also the "span" label of its metrics
+            **attributes: Initial span attributes
+
+        Yields:
+            The Span, to add attributes with span.set()
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1] if stack else None
+        span_id = f"{self._random.getrandbits(64):016x}"
+        if parent is not None:
+            span = Span(name, parent.trace_id, span_id, parent.span_id, parent.sampled, attributes)
+        else:
+            sampled = self.path is not None and self._random.random() < self.sample_rate
+            span = Span(name, f"{self._random.getrandbits(128):032x}", span_id, None, sampled, attributes)
+
+        stack.append(span)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield span
+        except GeneratorExit:
+            # A stream closed early by its reader is not a failure
+            raise
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            # Generators may close their spans out of order
+            if stack and stack[-1] is span:
+                stack.pop()
+            elif span in stack:
+                stack.remove(span)
+            if error is None and isinstance(span.attributes.get("error"), str):
+                error = span.attributes["error"]
+            self.metrics.observe("span_seconds", duration, span=name)
+            if error is not None:
+                self.metrics.inc("span_errors_total", span=name, error=error)
+            if self.path is not None and (span.sampled or error is not None):
+                self._write(span, duration, error)
+
+    def _write(self, span, duration, error):
+        record = {
+            "trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id,
+            "name": span.name, "start": span.start, "duration": duration, "error": error,
+            "attributes": span.attributes
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.metrics.inc("spans_dropped_total")
+            return
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_spans, daemon=True)
+                    self._writer.start()
+
+    def _write_spans(self):
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, "a") as f:
+                    for record in records:
+                        f.write(json.dumps(record, default=str) + "\n")
+            except OSError:
+                self.metrics.inc("spans_dropped_total", len(records))
+            for _ in records:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until every queued span has been written
+        """
+        if self._writer is not None:
+            self._queue.join()
+
+_metrics = Metrics()
+_tracer = Tracer(_metrics, SPANS_PATH or None)
+
+def get_metrics():
+    """
+    Return the process-wide metrics
+    """
+    return _metrics
+
+def get_tracer():
+    """
+    Return the process-wide tracer
+    """
+    return _tracer
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serve /metrics in Prometheus text format from a background thread
+
+    Args:
+        port: Port to listen on (0 disables the endpoint)
+        host: Interface to bind (localhost by default)
+
+    Returns:
+        The running server, or None if disabled or the port is taken
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError:
+        # Another server process on this host already exports its metrics there
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
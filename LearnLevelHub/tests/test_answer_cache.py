@@ -0,0 +1,22 @@
+import pytest
+
+from answer_cache import AnswerCache
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Is Python faster than Java?", "Is Java faster than Python?"),
+    ("Should I use Python 3 instead of Python 2?", "Should I use Python 2 instead of Python 3?"),
+])
+def test_reversed_comparison_misses(cached, asked):
+    cache = AnswerCache()
+    cache.put("lesson", cached, "answer")
+
+    assert cache.get("lesson", asked) is None
+
+
+def test_reworded_question_hits():
+    cache = AnswerCache()
+    cache.put("lesson", "How do decorators work?", "answer")
+
+    assert cache.get("lesson", "How does a decorator work") == "answer"
+    assert cache.stats()["similar_hits"] == 1
@@ -0,0 +1,44 @@
+import copy
+
+import pytest
+
+from course_cache import CourseCache, set_course_cache
+from course_generator import course_cache_key, generate_course_content, regenerate_lesson
+from llm_backends import FakeBackend, set_backend
+
+
+@pytest.mark.parametrize("difficulty", ["Beginner", "Advanced"])
+def test_rewriting_a_lesson_of_a_restored_course_keeps_the_cached_bodies(tmp_path, difficulty):
+    set_backend(FakeBackend(latency=0))
+    cache = CourseCache(path=str(tmp_path / "courses.sqlite3"))
+    set_course_cache(cache)
+    try:
+        # The fake model always reports a Beginner course
+        course = generate_course_content("Rust", difficulty)
+        key = course_cache_key("Rust", difficulty)
+
+        # A restored session holds the outline and loads bodies on demand
+        restored = copy.deepcopy(course)
+        for module in restored["modules"]:
+            for lesson in module["lessons"]:
+                lesson["content"] = None
+        content = regenerate_lesson(restored, 0, 1)
+
+        cached = cache.get(key)
+        for m, module in enumerate(cached["modules"]):
+            for l, lesson in enumerate(module["lessons"]):
+                expected = content if (m, l) == (0, 1) else course["modules"][m]["lessons"][l]["content"]
+                assert lesson["content"] == expected
+    finally:
+        set_course_cache(None)
+        set_backend(None)
+
+
+def test_contains_leaves_the_hit_and_miss_counts_alone(tmp_path):
+    cache = CourseCache(path=str(tmp_path / "courses.sqlite3"))
+    cache.put("key", {"title": "Rust", "modules": []})
+
+    assert cache.contains("key")
+    assert not cache.contains("other")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 0)
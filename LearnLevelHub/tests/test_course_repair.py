@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import course_generator
+from llm_backends import FakeBackend, set_backend
+
+OUTLINE = {
+    "title": "Python Basics",
+    "difficulty": "Beginner",
+    "modules": [
+        {"title": f"Module {m}", "description": "About it",
+         "lessons": [{"title": f"Lesson {m}.{l}"} for l in range(1, 4)]}
+        for m in range(1, 4)
+    ]
+}
+
+
+@pytest.fixture
+def first_response(monkeypatch):
+    """
+    Make the first model call return the given text; later calls go to the fake backend
+    """
+    set_backend(FakeBackend(latency=0))
+    responses = []
+    generate_text = course_generator._generate_text
+
+    def fake_generate_text(prompt, task, response_schema=None):
+        return responses.pop(0) if responses else generate_text(prompt, task, response_schema)
+
+    monkeypatch.setattr(course_generator, "_generate_text", fake_generate_text)
+    yield responses.append
+    set_backend(None)
+
+
+def test_outline_cut_off_in_its_first_module_is_topped_up(first_response):
+    text = json.dumps(OUTLINE)
+    first_response(text[:text.index("Lesson 1.3") + len('Lesson 1.3"}')])
+
+    outline = course_generator.generate_course_outline("Python", "Beginner")
+
+    assert outline["title"] == "Python Basics"
+    assert len(outline["modules"]) >= course_generator.MIN_MODULES
+    assert outline["modules"][0]["title"] == "Module 1"
+    assert [lesson["title"] for lesson in outline["modules"][0]["lessons"]] == ["Lesson 1.1", "Lesson 1.2", "Lesson 1.3"]
+    assert "incomplete" not in outline
+
+
+def test_malformed_module_of_an_outline_is_outlined_again(first_response):
+    first_response(json.dumps(OUTLINE).replace('"Module 2"', '"Module "two" 2"'))
+
+    outline = course_generator.generate_course_outline("Python", "Beginner")
+
+    assert [module["title"] for module in outline["modules"]][::2] == ["Module 1", "Module 3"]
+    assert outline["modules"][1]["title"] != "Module 1"
+    assert outline["modules"][1]["lessons"]
+    assert "incomplete" not in outline
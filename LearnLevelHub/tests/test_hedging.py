@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from hedging import Hedger
+from resilience import DeadlineExceeded
+
+
+def test_unhedged_calls_leave_hedge_delay_and_rate_alone():
+    hedger = Hedger(default_delay=1.0, min_delay=0.0, min_samples=3)
+    for _ in range(5):
+        hedger.run(lambda: time.sleep(0.05), deadline=time.monotonic() + 5)
+        hedger.run(lambda: None)
+    for _ in range(3):
+        hedger.run(lambda: None, hedge=True, kind="tutor.stream")
+
+    stats = hedger.stats()
+    assert stats["requests"] == 3
+    assert stats["hedge_rate"] == 0.0
+    assert hedger.hedge_delay("tutor.stream") < 0.05
+    assert hedger.hedge_delay("course.generate") == 1.0
+
+
+def test_latency_windows_are_kept_per_kind():
+    hedger = Hedger(default_delay=1.0, min_delay=0.0, min_samples=3)
+    for _ in range(3):
+        hedger.run(lambda: time.sleep(0.05), hedge=True, kind="lesson.generate")
+        hedger.run(lambda: None, hedge=True, kind="tutor_simple.stream")
+
+    assert hedger.hedge_delay("lesson.generate") >= 0.05
+    assert hedger.hedge_delay("tutor_simple.stream") < 0.05
+
+
+def test_unhedged_calls_under_a_deadline_run_in_the_calling_thread():
+    hedger = Hedger()
+    assert hedger.run(threading.current_thread, deadline=time.monotonic() + 5) is threading.current_thread()
+
+
+def test_unhedged_request_timing_out_at_the_deadline_is_reported_as_deadline_exceeded():
+    hedger = Hedger()
+    deadline = time.monotonic() + 0.05
+
+    def attempt():
+        time.sleep(max(0.0, deadline - time.monotonic()))
+        raise TimeoutError("request timed out")
+
+    with pytest.raises(DeadlineExceeded):
+        hedger.run(attempt, deadline=deadline)
+    assert hedger.stats()["deadline_exceeded"] == 1
@@ -0,0 +1,36 @@
+from json_stream import IncrementalCourseParser, salvage_course
+
+
+def feed(parser, text, size=3):
+    events = []
+    for start in range(0, len(text), size):
+        events += parser.feed(text[start:start + size])
+    return events
+
+
+def test_field_cut_short_by_an_unescaped_quote_is_not_reported():
+    parser = IncrementalCourseParser(tolerant=True)
+    events = feed(parser, '{"title": "the "quoted" Fake Course", "difficulty": "Advanced", "modules": []}')
+
+    fields = [event for event in events if event[0] == "field"]
+    assert fields == [("field", "difficulty", "Advanced")]
+    assert parser.fields == {"difficulty": "Advanced"}
+
+
+def test_intact_fields_are_reported_as_they_end():
+    parser = IncrementalCourseParser(tolerant=True)
+    events = feed(parser, '{"title": "Python", "difficulty": "Beginner", "modules": [')
+
+    assert [event for event in events if event[0] == "field"] == [
+        ("field", "title", "Python"), ("field", "difficulty", "Beginner")
+    ]
+
+
+def test_salvage_keeps_the_whole_lessons_of_an_unfinished_module():
+    course, unfinished, complete = salvage_course(
+        '{"title": "Python", "modules": [{"title": "Basics", "lessons": [{"title": "Variables"}, {"title": "Loo'
+    )
+
+    assert not complete
+    assert course == {"title": "Python", "modules": []}
+    assert unfinished == (0, {"title": "Basics", "lessons": [{"title": "Variables"}]})
@@ -0,0 +1,40 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import course_generator
+
+
+def lazy_course(lessons):
+    return {
+        "title": "Loops", "topic": "Loops", "requested_difficulty": "Beginner", "lazy": True,
+        "modules": [{"title": "Basics", "lessons": [{"title": f"Lesson {i}", "content": None} for i in range(lessons)]}]
+    }
+
+
+def test_opened_lesson_does_not_queue_behind_prefetches(monkeypatch):
+    release = threading.Event()
+
+    def write(course, module_index, lesson_index, *request):
+        # Prefetches hold the only worker until released
+        if threading.current_thread() is not threading.main_thread():
+            release.wait(5)
+        return f"Lesson {module_index}.{lesson_index}"
+
+    prefetch_executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(course_generator, "generate_lesson_content", write)
+    monkeypatch.setattr(course_generator, "_prefetch_executor", prefetch_executor)
+    course = lazy_course(4)
+    try:
+        assert course_generator.ensure_lesson_content(course, 0, 0, prefetch=3) == "Lesson 0.0"
+
+        # Lesson 2 is still queued for a prefetch worker and is written here instead
+        start = time.monotonic()
+        assert course_generator.ensure_lesson_content(course, 0, 2, prefetch=0) == "Lesson 0.2"
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        prefetch_executor.shutdown(wait=True)
+
+    assert course_generator.ensure_lesson_content(course, 0, 1, prefetch=0) == "Lesson 0.1"
+    assert course_generator.ensure_lesson_content(course, 0, 3, prefetch=0) == "Lesson 0.3"
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from llm_backends import FakeRateLimitError, FakeTimeoutError
+from resilience import DeadlineExceeded, Resilience
+
+
+def fail_with(error):
+    def call():
+        raise error
+    return call
+
+
+def open_circuit(resilience):
+    with pytest.raises(FakeTimeoutError):
+        resilience.call(fail_with(FakeTimeoutError("down")))
+    assert resilience.breaker.state == "open"
+
+
+def test_throttled_half_open_trial_reopens_and_recovers():
+    resilience = Resilience(max_retries=0, failure_threshold=1, reset_timeout=0.05, seed=0)
+    open_circuit(resilience)
+
+    time.sleep(0.06)
+    with pytest.raises(FakeRateLimitError):
+        resilience.call(fail_with(FakeRateLimitError("busy")))
+    assert resilience.breaker.state == "open"
+
+    time.sleep(0.06)
+    assert resilience.call(lambda: "ok") == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_half_open_trial_past_its_deadline_reopens_and_recovers():
+    resilience = Resilience(max_retries=0, failure_threshold=1, reset_timeout=0.05, seed=0)
+    open_circuit(resilience)
+
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded):
+        resilience.call(fail_with(DeadlineExceeded("too slow")))
+    assert resilience.breaker.state == "open"
+
+    time.sleep(0.06)
+    assert resilience.call(lambda: "ok") == "ok"
+    assert resilience.breaker.state == "closed"
@@ -0,0 +1,65 @@
+import time
+
+from chat_memory import ChatMemory
+from llm_backends import FakeBackend, set_backend
+from session_store import SessionStore
+
+
+def message(role, words):
+    return {"role": role, "content": " ".join(["word"] * words)}
+
+
+def test_restored_chat_resumes_from_the_stored_summary(tmp_path):
+    set_backend(FakeBackend(latency=0, answer_words=20))
+    store = SessionStore(path=str(tmp_path / "sessions.sqlite3"))
+    try:
+        store.record_position("s1", None, {})
+        memory = ChatMemory(recent_tokens=100)
+        chat = []
+        for i in range(6):
+            msg = message("user" if i % 2 == 0 else "assistant", 60)
+            chat.append(msg)
+            store.record_message("s1", msg)
+            memory.fold(chat)
+
+        deadline = time.monotonic() + 5
+        while not memory.fold(chat):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        store.record_summary("s1", memory.summary, memory.folded_messages)
+
+        saved = store.load_session("s1")
+        assert memory.folded_messages > 0
+        assert saved["chat_summary"] == memory.summary
+        assert saved["chat_folded"] == memory.folded_messages
+        assert saved["chat_history"] == chat
+    finally:
+        set_backend(None)
+
+
+def test_clearing_the_chat_drops_its_summary(tmp_path):
+    store = SessionStore(path=str(tmp_path / "sessions.sqlite3"))
+    store.record_position("s1", None, {})
+    store.record_message("s1", message("user", 3))
+    store.record_summary("s1", "Earlier questions about loops", 1)
+    store.clear_chat("s1")
+
+    saved = store.load_session("s1")
+    assert (saved["chat_summary"], saved["chat_folded"], saved["chat_history"]) == ("", 0, [])
+
+
+def test_sessions_with_the_same_outline_keep_their_own_lessons(tmp_path):
+    store = SessionStore(path=str(tmp_path / "sessions.sqlite3"))
+    course = {"title": "Loops", "difficulty": "Beginner",
+              "modules": [{"title": "Basics", "lessons": [{"title": "For loops", "content": None}]}]}
+    first = store.save_course("s1", course)
+    second = store.save_course("s2", course)
+    assert first == second
+
+    store.save_lesson("s1", first, 0, 0, "Written for the first learner")
+    store.save_lesson("s2", second, 0, 0, "Written for the second learner")
+    store.save_lesson("s2", second, 0, 0, "Rewritten for the second learner")
+
+    assert store.load_lesson("s1", first, 0, 0) == "Written for the first learner"
+    assert store.load_lesson("s2", second, 0, 0) == "Rewritten for the second learner"
+    assert store.load_lesson("s3", first, 0, 0) is None
@@ -1,5 +1,16 @@
 import streamlit as st
+import os
 import re
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from session_store import get_session_store
+from course_model import compact_course
+from chat_memory import ChatMemory
+from telemetry import get_metrics, get_tracer
 
 def initialize_session_state():
     """
@@ -14,6 +25,9 @@ def initialize_session_state():
     if "course_data" not in st.session_state:
         st.session_state.course_data = None
     
+    if "course_index" not in st.session_state:
+        st.session_state.course_index = None
+    
     if "current_module" not in st.session_state:
         st.session_state.current_module = 1
     
@@ -37,29 +51,254 @@ def initialize_session_state():
     
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
+    
+    if "chat_memory" not in st.session_state:
+        st.session_state.chat_memory = ChatMemory()
+    
+    if "pending_question" not in st.session_state:
+        st.session_state.pending_question = None
+    
+    if "render_timings" not in st.session_state:
+        st.session_state.render_timings = {}
+    
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = None
+    
+    if "course_id" not in st.session_state:
+        st.session_state.course_id = None
+    
+    if "stored_lesson_ids" not in st.session_state:
+        st.session_state.stored_lesson_ids = set()
 
-def format_lesson_content(content):
+def restore_session():
     """
-    Format lesson content with proper markdown and styling
+    Attach the browser session to its stored progress
+
+    The session id is kept in the "sid" query parameter, so a reload or a
+    restarted worker finds the same learner again. A returning session gets
+    its course outline, position, completed lessons and chat (the summary
+    of older messages and the messages after it) back without regenerating
+    anything; lesson bodies are read from the store as they are opened.
+    """
+    if st.session_state.session_id is not None:
+        return
     
-    Args:
-        content: Raw lesson content text
+    session_id = st.query_params.get("sid")
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        st.query_params["sid"] = session_id
+    st.session_state.session_id = session_id
     
+    saved = get_session_store().load_session(session_id)
+    if saved is None or saved["course"] is None:
+        return
+    
+    state = saved["state"]
+    course_data = compact_course(saved["course"])
+    st.session_state.course_data = course_data
+    st.session_state.course_id = saved["course_id"]
+    st.session_state.current_page = state.get("current_page", "course")
+    st.session_state.current_module = state.get("current_module", 1)
+    st.session_state.current_lesson = state.get("current_lesson", 1)
+    st.session_state.difficulty = state.get("difficulty", course_data.get("difficulty", "Beginner"))
+    st.session_state.completed_lesson_ids = saved["completed_lesson_ids"]
+    st.session_state.completed_lessons = len(saved["completed_lesson_ids"])
+    st.session_state.total_lessons = sum(len(module["lessons"]) for module in course_data["modules"])
+    st.session_state.chat_history = saved["chat_history"]
+    st.session_state.chat_memory = ChatMemory(summary=saved["chat_summary"], folded_messages=saved["chat_folded"])
+
+def remember_course(course_data):
+    """
+    Store a finished course and make it the session's stored course
+
+    Args:
+        course_data: Course dictionary (lazy courses are stored as outlines)
+    """
+    st.session_state.course_id = get_session_store().save_course(st.session_state.session_id, course_data)
+    st.session_state.stored_lesson_ids = set()
+
+def load_stored_lesson(module_index, lesson_index):
+    """
+    Read a lesson body that is not in memory from the session store
+
+    Args:
+        module_index: Zero-based index of the module
+        lesson_index: Zero-based index of the lesson within the module
+
     Returns:
-        Formatted HTML/markdown content
+        The lesson content, or None if it has not been stored
+    """
+    if st.session_state.course_id is None:
+        return None
+    content = get_session_store().load_lesson(
+        st.session_state.session_id, st.session_state.course_id, module_index, lesson_index
+    )
+    if content is not None:
+        st.session_state.stored_lesson_ids.add(f"{module_index}_{lesson_index}")
+    return content
+
+def remember_lesson(module_index, lesson_index, content):
+    """
+    Store a lesson body written after its course was stored (lazy courses)
+
+    Args:
+        module_index: Zero-based index of the module
+        lesson_index: Zero-based index of the lesson within the module
+        content: The lesson content
+    """
+    position = f"{module_index}_{lesson_index}"
+    if st.session_state.course_id is None or content is None or position in st.session_state.stored_lesson_ids:
+        return
+    get_session_store().save_lesson(
+        st.session_state.session_id, st.session_state.course_id, module_index, lesson_index, content
+    )
+    st.session_state.stored_lesson_ids.add(position)
+
+def fold_chat():
+    """
+    Summarize older chat turns once the chat gets long, storing each new summary with the session
+    """
+    memory = st.session_state.chat_memory
+    if memory.fold(st.session_state.chat_history):
+        get_session_store().record_summary(st.session_state.session_id, memory.summary, memory.folded_messages)
+
+def remember_position():
+    """
+    Record the current page and lesson of the session (written in the background)
+    """
+    get_session_store().record_position(st.session_state.session_id, st.session_state.course_id, {
+        "current_page": st.session_state.current_page,
+        "current_module": st.session_state.current_module,
+        "current_lesson": st.session_state.current_lesson,
+        "difficulty": st.session_state.difficulty
+    })
+
+@contextmanager
+def timed_section(name):
+    """
+    Record how long a part of the page took to render on the server
+    
+    The latest duration in seconds is kept in st.session_state.render_timings[name],
+    and every render is traced as a "render.<name>" span.
+    
+    Args:
+        name: Name of the page section
     """
+    start = time.perf_counter()
+    try:
+        with get_tracer().span(f"render.{name}", page=st.session_state.current_page):
+            yield
+    finally:
+        st.session_state.render_timings[name] = time.perf_counter() - start
+
+# Lesson formatter: "regex" applies the formatting passes one after another,
+# "single_pass" renders headings, code, bullets and paragraphs in one scan
+LESSON_FORMATTER = os.getenv("LESSON_FORMATTER", "regex")
+
+# Number of formatted lessons kept in memory
+FORMAT_CACHE_SIZE = int(os.getenv("LESSON_FORMAT_CACHE_SIZE", "256"))
+
+_H1_PATTERN = re.compile(r'^# (.*?)$', re.MULTILINE)
+_H2_PATTERN = re.compile(r'^## (.*?)$', re.MULTILINE)
+_CODE_PATTERN = re.compile(r'```(.*?)```', re.DOTALL)
+_CODE_REPLACEMENT = r'<pre><code>\1</code></pre>'
+_STAR_BULLET_PATTERN = re.compile(r'^\* (.*?)$', re.MULTILINE)
+_DASH_BULLET_PATTERN = re.compile(r'^- (.*?)$', re.MULTILINE)
+_PARAGRAPH_PATTERN = re.compile(r'\n\n')
+
+_TOKEN_PATTERN = re.compile(
+    r'(?P<code>```(?s:.*?)```)'
+    r'|^# (?P<h1>.*?)$'
+    r'|^## (?P<h2>.*?)$'
+    r'|^[*-] (?P<bullet>.*?)$'
+    r'|(?P<paragraph>\n\n)',
+    re.MULTILINE
+)
+
+_format_cache = OrderedDict()
+_format_cache_lock = threading.Lock()
+
+def _format_with_regex(content):
     # Handle headings - make sure h3 and h4 are used (not h1/h2)
-    content = re.sub(r'^# (.*?)$', r'### \1', content, flags=re.MULTILINE)
-    content = re.sub(r'^## (.*?)$', r'#### \1', content, flags=re.MULTILINE)
+    content = _H1_PATTERN.sub(r'### \1', content)
+    content = _H2_PATTERN.sub(r'#### \1', content)
     
     # Ensure code blocks are properly formatted
-    content = re.sub(r'```(.*?)```', r'<pre><code>\1</code></pre>', content, flags=re.DOTALL)
+    content = _CODE_PATTERN.sub(_CODE_REPLACEMENT, content)
     
     # Enhance bullet points with better spacing
-    content = re.sub(r'^\* (.*?)$', r'• \1<br>', content, flags=re.MULTILINE)
-    content = re.sub(r'^- (.*?)$', r'• \1<br>', content, flags=re.MULTILINE)
+    content = _STAR_BULLET_PATTERN.sub(r'• \1<br>', content)
+    content = _DASH_BULLET_PATTERN.sub(r'• \1<br>', content)
     
     # Add paragraph breaks for readability
-    content = re.sub(r'\n\n', r'<br><br>', content)
+    return _PARAGRAPH_PATTERN.sub('<br><br>', content)
+
+def _inline_code(text):
+    # Code spans that open and close on a heading or bullet line
+    return _CODE_PATTERN.sub(_CODE_REPLACEMENT, text)
+
+def _render_token(match):
+    kind = match.lastgroup
+    if kind == "code":
+        return f"<pre><code>{match.group('code')[3:-3]}</code></pre>"
+    if kind == "h1":
+        return f"### {_inline_code(match.group('h1'))}"
+    if kind == "h2":
+        return f"#### {_inline_code(match.group('h2'))}"
+    if kind == "bullet":
+        return f"• {_inline_code(match.group('bullet'))}<br>"
+    return "<br><br>"
+
+def render_lesson_single_pass(content):
+    """
+    Format lesson content in a single scan over the text
     
-    return content
+    Produces the same output as the pass-by-pass formatter for lessons whose
+    code fences are closed on the same or a later line, except that the
+    inside of code blocks is left verbatim instead of having headings,
+    bullets and blank lines rewritten.
+    
+    Args:
+        content: Raw lesson content text
+    
+    Returns:
+        Formatted HTML/markdown content
+    """
+    return _TOKEN_PATTERN.sub(_render_token, content)
+
+def format_lesson_content(content):
+    """
+    Format lesson content with proper markdown and styling
+    
+    Results are cached by a hash of the content, so reruns showing the same
+    lesson do not format it again.
+    
+    Args:
+        content: Raw lesson content text
+    
+    Returns:
+        Formatted HTML/markdown content
+    """
+    key = (LESSON_FORMATTER, hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest())
+    with _format_cache_lock:
+        if key in _format_cache:
+            _format_cache.move_to_end(key)
+            formatted = _format_cache[key]
+        else:
+            formatted = None
+    get_metrics().inc("cache_lookups_total", cache="format", result="miss" if formatted is None else "hit")
+    if formatted is not None:
+        return formatted
+    
+    with get_tracer().span("format_lesson", formatter=LESSON_FORMATTER, characters=len(content)):
+        if LESSON_FORMATTER == "single_pass":
+            formatted = render_lesson_single_pass(content)
+        else:
+            formatted = _format_with_regex(content)
+    
+    with _format_cache_lock:
+        _format_cache[key] = formatted
+        while len(_format_cache) > FORMAT_CACHE_SIZE:
+            _format_cache.popitem(last=False)
+    
+    return formatted